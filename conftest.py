@@ -0,0 +1,42 @@
+"""
+pytest setup: src imports the local config.py (API keys, not in git). When it
+is missing, register a config module with the models the tests use.
+"""
+
+import os
+import sys
+import types
+
+sys.path.append(os.path.dirname(__file__))
+
+TEST_MODEL_CONFIGS = {
+    "test-llm": {
+        "type": "llm_api",
+        "model": "test-llm",
+        "api_base": "http://llm.test/v1",
+        "api_key": "EMPTY",
+        "provider": "test",
+    },
+    "test-embedding": {
+        "type": "embedding_api",
+        "model": "test-embedding",
+        "api_base": "http://llm.test/v1",
+        "api_key": "EMPTY",
+        "provider": "test",
+        "encoding_format": "float",
+    },
+}
+
+try:
+    import config  # noqa: F401
+except ImportError:
+    config = types.ModuleType("config")
+    config.MODEL_CONFIGS = TEST_MODEL_CONFIGS  # type: ignore
+
+    def get_model_config(model_name):
+        if model_name not in TEST_MODEL_CONFIGS:
+            raise ValueError(f"Unknown model {model_name}")
+        return TEST_MODEL_CONFIGS[model_name]
+
+    config.get_model_config = get_model_config  # type: ignore
+    sys.modules["config"] = config
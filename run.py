@@ -7,16 +7,14 @@ warnings.filterwarnings("ignore")
 
 import os
 import sys
-import time
 import json
 from datetime import datetime
-from typing import Dict
+from typing import Dict, Optional
 
 import orjson
 import typer
 from dotenv import load_dotenv
 from loguru import logger
-from pydantic import PositiveInt
 from rich import progress
 import pandas as pd
 import pickle
@@ -26,13 +24,20 @@ import numpy as np
 from pathlib import Path
 
 from src import (
+    Cassette,
+    EmbeddingProjection,
     FinMemAgent,
     MarketEnv,
+    NewsDeduplicator,
+    PreEmbeddingStore,
     RunMode,
     TaskType,
+    collect_news,
     ensure_path,
     output_metric_summary_multi,
     output_metrics_summary_single,
+    retrieval_agreement,
+    transport_registry,
 )
 
 app = typer.Typer()
@@ -729,16 +734,59 @@ def save_trading_results_csv(config: Dict) -> None:
         logger.info(f"⚠️ 保存了基础CSV文件: {csv_path}")
 
 
-class RequestTimeSleep:
-    def __init__(self, sleep_time: PositiveInt, sleep_every_count: PositiveInt) -> None:
-        self.sleep_time = sleep_time
-        self.sleep_every_count = sleep_every_count
-        self.count = 0
+def save_memory_db_stats(agent: FinMemAgent, config: Dict, phase: str) -> None:
+    """Write memory store, HTTP transport, cassette, chat usage and response cache instrumentation into the run's metrics folder"""
+    metrics_path = os.path.join(
+        os.path.dirname(config["meta_config"]["result_save_path"]), "metrics"
+    )
+    agent.memory_db.stats.save(metrics_path, f"memory_db_{phase}.json")
+    transport_registry.save(metrics_path, f"transport_{phase}.json")
+    if transport_registry.cassette is not None:
+        transport_registry.cassette.save(metrics_path, f"cassette_{phase}.json")
+    usage_report = agent.chat_endpoint.usage_report()
+    if usage_report:
+        ensure_path(metrics_path)
+        with open(os.path.join(metrics_path, f"chat_usage_{phase}.json"), "w") as f:
+            f.write(orjson.dumps(usage_report, option=orjson.OPT_INDENT_2).decode())
+    response_cache = getattr(agent.chat_endpoint, "response_cache", None)
+    if response_cache is not None:
+        response_cache.save(metrics_path, f"response_cache_{phase}.json")
+
+
+def use_cassette(record: Optional[str], replay: Optional[str]) -> None:
+    """Route every pooled HTTP client through a record or replay cassette"""
+    if record and replay:
+        raise typer.BadParameter("--record and --replay are mutually exclusive")
+    if record:
+        transport_registry.use_cassette(Cassette(record, mode="record"))
+    elif replay:
+        transport_registry.use_cassette(Cassette(replay, mode="replay"))
+
+
+def convert_request_sleep(chat_config: Dict) -> None:
+    """Turn the legacy fixed chat_request_sleep into a rate limit on the chat transport"""
+    request_sleep = chat_config.pop("chat_request_sleep", None)
+    if not request_sleep:
+        return
+    chat_http = chat_config.setdefault("chat_http", {})
+    if "rate_limit" in chat_http:
+        logger.warning("CONFIG-chat_request_sleep ignored, chat_http.rate_limit is set")
+        return
+    # one chat request per step, at most sleep_every_count steps per sleep_time seconds
+    chat_http["rate_limit"] = {
+        "requests_per_minute": 60
+        * request_sleep["sleep_every_count"]
+        / request_sleep["sleep_time"]
+    }
+    logger.warning(
+        f"CONFIG-chat_request_sleep is deprecated, using chat_http.rate_limit {chat_http['rate_limit']}"
+    )
+
 
-    def step(self) -> None:
-        self.count += 1
-        if self.count % self.sleep_every_count == 0:
-            time.sleep(self.sleep_time)
+def mark_rate_limit_step(step) -> None:
+    waited = transport_registry.mark_step(step)
+    if waited > 0:
+        logger.info(f"SYS-Step waited {waited:.2f}s on rate limits")
 
 
 @app.command(name="warmup")
@@ -746,6 +794,12 @@ def warmup_up_func(
     config_path: str = typer.Option(
         os.path.join("configs", "main.json"), "--config-path", "-c"
     ),
+    record: Optional[str] = typer.Option(
+        None, "--record", help="Record every LLM and embedding request into this cassette"
+    ),
+    replay: Optional[str] = typer.Option(
+        None, "--replay", help="Serve LLM and embedding requests from this cassette"
+    ),
 ):  # sourcery skip: low-code-quality
     # load config
     config = load_config(path=config_path)
@@ -774,14 +828,11 @@ def warmup_up_func(
     )
     logger.add(sys.stdout, level="INFO", format="{time} {level} {message}")
 
-    # chat request sleep
-    if "chat_request_sleep" in config["chat_config"]:
-        request_sleep = RequestTimeSleep(
-            sleep_time=config["chat_config"]["chat_request_sleep"]["sleep_time"],
-            sleep_every_count=config["chat_config"]["chat_request_sleep"][
-                "sleep_every_count"
-            ],
-        )
+    # record / replay model traffic
+    use_cassette(record, replay)
+
+    # rate limits, replaces the fixed chat request sleep
+    convert_request_sleep(config["chat_config"])
 
     # log
     logger.info("SYS-Warmup function started")
@@ -815,64 +866,73 @@ def warmup_up_func(
 
     # env + agent loop
     total_steps = env.simulation_length
-    with progress.Progress() as progress_bar:
-        task_id = progress_bar.add_task("Warmup", total=total_steps)
-        task = progress_bar.tasks[task_id]
-        progress_bar.update(
-            task_id, description=f"Warmup remaining: {task.remaining} steps"
-        )
+    try:
+        with progress.Progress() as progress_bar:
+            task_id = progress_bar.add_task("Warmup", total=total_steps)
+            task = progress_bar.tasks[task_id]
+            progress_bar.update(
+                task_id, description=f"Warmup remaining: {task.remaining} steps"
+            )
 
-        while True:
-            logger.info("*" * 50)
-
-            # get obs or terminate
-            obs = env.step()
-            if obs.termination_flag:
-                logger.info("SYS-Environment exhausted.")
-                break
-
-            # log
-            logger.info("ENV-new info from env")
-            logger.info(f"ENV-date: {obs.cur_date}")
-            logger.info(f"ENV-price: {obs.cur_price}")
-            if obs.cur_news:
-                for cur_symbol in obs.cur_news:
-                    if obs.cur_news[cur_symbol]:
-                        for i, n in enumerate(obs.cur_news[cur_symbol]):  # type: ignore
-                            logger.info(f"ENV-news-{cur_symbol}-{i}: {n}")
-                            logger.info("-" * 50)
-            logger.info(f"ENV-momentum: {obs.cur_momentum}")
-            logger.info(f"ENV-symbol: {obs.cur_symbol}")
-            logger.info("=" * 50)
-
-            # agent one step
-            agent.step(market_info=obs, run_mode=RunMode.WARMUP, task_type=task_type)
-
-            # save checkpoint
-            agent.save_checkpoint(
-                path=os.path.join(
-                    config["meta_config"]["warmup_checkpoint_save_path"], "agent"
+            while True:
+                logger.info("*" * 50)
+
+                # get obs or terminate
+                obs = env.step()
+                if obs.termination_flag:
+                    logger.info("SYS-Environment exhausted.")
+                    break
+
+                # log
+                logger.info("ENV-new info from env")
+                logger.info(f"ENV-date: {obs.cur_date}")
+                logger.info(f"ENV-price: {obs.cur_price}")
+                if obs.cur_news:
+                    for cur_symbol in obs.cur_news:
+                        if obs.cur_news[cur_symbol]:
+                            for i, n in enumerate(obs.cur_news[cur_symbol]):  # type: ignore
+                                logger.info(f"ENV-news-{cur_symbol}-{i}: {n}")
+                                logger.info("-" * 50)
+                logger.info(f"ENV-momentum: {obs.cur_momentum}")
+                logger.info(f"ENV-symbol: {obs.cur_symbol}")
+                logger.info("=" * 50)
+
+                # agent one step
+                agent.step(
+                    market_info=obs,
+                    run_mode=RunMode.WARMUP,
+                    task_type=task_type,
+                    next_news=env.peek_news(),
                 )
-            )
 
-            env.save_checkpoint(
-                path=os.path.join(
-                    config["meta_config"]["warmup_checkpoint_save_path"], "env"
+                # save checkpoint
+                agent.save_checkpoint(
+                    path=os.path.join(
+                        config["meta_config"]["warmup_checkpoint_save_path"], "agent"
+                    )
                 )
-            )
 
-            # request time sleep
-            if "chat_request_sleep" in config["chat_config"]:
-                request_sleep.step()
+                env.save_checkpoint(
+                    path=os.path.join(
+                        config["meta_config"]["warmup_checkpoint_save_path"], "env"
+                    )
+                )
 
-            # for next iteration
-            progress_bar.update(
-                task_id,
-                advance=1,
-                description=f"Warmup remaining steps: {task.remaining}",
-            )
+                # time spent waiting on rate limits
+                mark_rate_limit_step(obs.cur_date)
+
+                # for next iteration
+                progress_bar.update(
+                    task_id,
+                    advance=1,
+                    description=f"Warmup remaining steps: {task.remaining}",
+                )
 
-    # save warmup results
+        # save warmup results
+        save_memory_db_stats(agent, config, "warmup")
+    finally:
+        # always stop the prefetch and filing workers, even on errors
+        agent.close()
     agent.save_checkpoint(
         path=os.path.join(config["meta_config"]["warmup_output_save_path"], "agent")
     )
@@ -886,6 +946,12 @@ def warmup_checkpoint_func(
     config_path: str = typer.Option(
         os.path.join("configs", "main.json"), "--config-path", "-c"
     ),
+    record: Optional[str] = typer.Option(
+        None, "--record", help="Record every LLM and embedding request into this cassette"
+    ),
+    replay: Optional[str] = typer.Option(
+        None, "--replay", help="Serve LLM and embedding requests from this cassette"
+    ),
 ):  # sourcery skip: low-code-quality
     # load config
     config = load_config(path=config_path)
@@ -919,14 +985,11 @@ def warmup_checkpoint_func(
     )
     logger.add(sys.stdout, level="INFO", format="{time} {level} {message}")
 
-    # chat request sleep
-    if "chat_request_sleep" in config["chat_config"]:
-        request_sleep = RequestTimeSleep(
-            sleep_time=config["chat_config"]["chat_request_sleep"]["sleep_time"],
-            sleep_every_count=config["chat_config"]["chat_request_sleep"][
-                "sleep_every_count"
-            ],
-        )
+    # record / replay model traffic
+    use_cassette(record, replay)
+
+    # rate limits, replaces the fixed chat request sleep
+    convert_request_sleep(config["chat_config"])
 
     # log
     logger.info("SYS-Warmup checkpoint function started")
@@ -945,63 +1008,70 @@ def warmup_checkpoint_func(
 
     # env + agent loop
     total_steps = env.simulation_length
-    with progress.Progress() as progress_bar:
-        task_id = progress_bar.add_task("Warmup", total=total_steps)
-        task = progress_bar.tasks[task_id]
-        progress_bar.update(
-            task_id, description=f"Warmup remaining: {task.remaining} steps"
-        )
-
-        while True:
-            logger.info("*" * 50)
-
-            # get obs or terminate
-            obs = env.step()
-            if obs.termination_flag:
-                break
-
-            # log
-            logger.info("ENV-new info from env")
-            logger.info(f"ENV-date: {obs.cur_date}")
-            logger.info(f"ENV-price: {obs.cur_price}")
-            if obs.cur_news:
-                for cur_symbol in obs.cur_news:
-                    if obs.cur_news[cur_symbol]:
-                        for i, n in enumerate(obs.cur_news[cur_symbol]):  # type: ignore
-                            logger.info(f"ENV-news-{cur_symbol}-{i}: {n}")
-                            logger.info("-" * 50)
-            logger.info(f"ENV-momentum: {obs.cur_momentum}")
-            logger.info(f"ENV-symbol: {obs.cur_symbol}")
-            logger.info("=" * 50)
-
-            # agent one step
-            agent.step(
-                market_info=obs, run_mode=RunMode.WARMUP, task_type=agent.task_type
+    try:
+        with progress.Progress() as progress_bar:
+            task_id = progress_bar.add_task("Warmup", total=total_steps)
+            task = progress_bar.tasks[task_id]
+            progress_bar.update(
+                task_id, description=f"Warmup remaining: {task.remaining} steps"
             )
 
-            # save checkpoint
-            agent.save_checkpoint(
-                path=os.path.join(
-                    config["meta_config"]["warmup_checkpoint_save_path"], "agent"
+            while True:
+                logger.info("*" * 50)
+
+                # get obs or terminate
+                obs = env.step()
+                if obs.termination_flag:
+                    break
+
+                # log
+                logger.info("ENV-new info from env")
+                logger.info(f"ENV-date: {obs.cur_date}")
+                logger.info(f"ENV-price: {obs.cur_price}")
+                if obs.cur_news:
+                    for cur_symbol in obs.cur_news:
+                        if obs.cur_news[cur_symbol]:
+                            for i, n in enumerate(obs.cur_news[cur_symbol]):  # type: ignore
+                                logger.info(f"ENV-news-{cur_symbol}-{i}: {n}")
+                                logger.info("-" * 50)
+                logger.info(f"ENV-momentum: {obs.cur_momentum}")
+                logger.info(f"ENV-symbol: {obs.cur_symbol}")
+                logger.info("=" * 50)
+
+                # agent one step
+                agent.step(
+                    market_info=obs,
+                    run_mode=RunMode.WARMUP,
+                    task_type=agent.task_type,
+                    next_news=env.peek_news(),
                 )
-            )
-            env.save_checkpoint(
-                path=os.path.join(
-                    config["meta_config"]["warmup_checkpoint_save_path"], "env"
+
+                # save checkpoint
+                agent.save_checkpoint(
+                    path=os.path.join(
+                        config["meta_config"]["warmup_checkpoint_save_path"], "agent"
+                    )
+                )
+                env.save_checkpoint(
+                    path=os.path.join(
+                        config["meta_config"]["warmup_checkpoint_save_path"], "env"
+                    )
                 )
-            )
 
-            # request time sleep
-            if "chat_request_sleep" in config["chat_config"]:
-                request_sleep.step()
+                # time spent waiting on rate limits
+                mark_rate_limit_step(obs.cur_date)
 
-            # for next iteration
-            progress_bar.update(
-                task_id,
-                advance=1,
-                description=f"Warmup remaining steps: {task.remaining}",
-            )
-    # save warmup results
+                # for next iteration
+                progress_bar.update(
+                    task_id,
+                    advance=1,
+                    description=f"Warmup remaining steps: {task.remaining}",
+                )
+        # save warmup results
+        save_memory_db_stats(agent, config, "warmup")
+    finally:
+        # always stop the prefetch and filing workers, even on errors
+        agent.close()
     agent.save_checkpoint(
         path=os.path.join(config["meta_config"]["warmup_output_save_path"], "agent")
     )
@@ -1015,6 +1085,12 @@ def test_func(
     config_path: str = typer.Option(
         os.path.join("configs", "main.json"), "--config-path", "-c"
     ),
+    record: Optional[str] = typer.Option(
+        None, "--record", help="Record every LLM and embedding request into this cassette"
+    ),
+    replay: Optional[str] = typer.Option(
+        None, "--replay", help="Serve LLM and embedding requests from this cassette"
+    ),
 ):  # sourcery skip: low-code-quality
     # load config
     config = load_config(path=config_path)
@@ -1048,14 +1124,11 @@ def test_func(
     )
     logger.add(sys.stdout, level="INFO", format="{time} {level} {message}")
 
-    # chat request sleep
-    if "chat_request_sleep" in config["chat_config"]:
-        request_sleep = RequestTimeSleep(
-            sleep_time=config["chat_config"]["chat_request_sleep"]["sleep_time"],
-            sleep_every_count=config["chat_config"]["chat_request_sleep"][
-                "sleep_every_count"
-            ],
-        )
+    # record / replay model traffic
+    use_cassette(record, replay)
+
+    # rate limits, replaces the fixed chat request sleep
+    convert_request_sleep(config["chat_config"])
 
     # log
     logger.info("SYS-test function started")
@@ -1085,61 +1158,70 @@ def test_func(
 
     # env + agent loop
     total_steps = env.simulation_length
-    with progress.Progress() as progress_bar:
-        task_id = progress_bar.add_task("Warmup", total=total_steps)
-        task = progress_bar.tasks[task_id]
-        progress_bar.update(
-            task_id, description=f"Warmup remaining: {task.remaining} steps"
-        )
+    try:
+        with progress.Progress() as progress_bar:
+            task_id = progress_bar.add_task("Warmup", total=total_steps)
+            task = progress_bar.tasks[task_id]
+            progress_bar.update(
+                task_id, description=f"Warmup remaining: {task.remaining} steps"
+            )
 
-        while True:
-            logger.info("*" * 50)
-
-            # get obs or terminate
-            obs = env.step()
-            if obs.termination_flag:
-                break
-
-            # log
-            logger.info("ENV-new info from env")
-            logger.info(f"ENV-date: {obs.cur_date}")
-            logger.info(f"ENV-price: {obs.cur_price}")
-            if obs.cur_news:
-                for cur_symbol in obs.cur_news:
-                    if obs.cur_news[cur_symbol]:
-                        for i, n in enumerate(obs.cur_news[cur_symbol]):  # type: ignore
-                            logger.info(f"ENV-news-{cur_symbol}-{i}: {n}")
-                            logger.info("-" * 50)
-            logger.info(f"ENV-momentum: {obs.cur_momentum}")
-            logger.info(f"ENV-symbol: {obs.cur_symbol}")
-            logger.info("=" * 50)
-
-            # agent one step
-            agent.step(market_info=obs, run_mode=RunMode.TEST, task_type=task_type)
-
-            # save checkpoint
-            agent.save_checkpoint(
-                path=os.path.join(
-                    config["meta_config"]["test_checkpoint_save_path"], "agent"
+            while True:
+                logger.info("*" * 50)
+
+                # get obs or terminate
+                obs = env.step()
+                if obs.termination_flag:
+                    break
+
+                # log
+                logger.info("ENV-new info from env")
+                logger.info(f"ENV-date: {obs.cur_date}")
+                logger.info(f"ENV-price: {obs.cur_price}")
+                if obs.cur_news:
+                    for cur_symbol in obs.cur_news:
+                        if obs.cur_news[cur_symbol]:
+                            for i, n in enumerate(obs.cur_news[cur_symbol]):  # type: ignore
+                                logger.info(f"ENV-news-{cur_symbol}-{i}: {n}")
+                                logger.info("-" * 50)
+                logger.info(f"ENV-momentum: {obs.cur_momentum}")
+                logger.info(f"ENV-symbol: {obs.cur_symbol}")
+                logger.info("=" * 50)
+
+                # agent one step
+                agent.step(
+                    market_info=obs,
+                    run_mode=RunMode.TEST,
+                    task_type=task_type,
+                    next_news=env.peek_news(),
                 )
-            )
-            env.save_checkpoint(
-                path=os.path.join(
-                    config["meta_config"]["test_checkpoint_save_path"], "env"
+
+                # save checkpoint
+                agent.save_checkpoint(
+                    path=os.path.join(
+                        config["meta_config"]["test_checkpoint_save_path"], "agent"
+                    )
+                )
+                env.save_checkpoint(
+                    path=os.path.join(
+                        config["meta_config"]["test_checkpoint_save_path"], "env"
+                    )
                 )
-            )
 
-            # request time sleep
-            if "chat_request_sleep" in config["chat_config"]:
-                request_sleep.step()
+                # time spent waiting on rate limits
+                mark_rate_limit_step(obs.cur_date)
 
-            # for next iteration
-            progress_bar.update(
-                task_id,
-                advance=1,
-                description=f"Warmup remaining steps: {task.remaining}",
-            )
-    # save results
+                # for next iteration
+                progress_bar.update(
+                    task_id,
+                    advance=1,
+                    description=f"Warmup remaining steps: {task.remaining}",
+                )
+        # save results
+        save_memory_db_stats(agent, config, "test")
+    finally:
+        # always stop the prefetch and filing workers, even on errors
+        agent.close()
     agent.save_checkpoint(
         path=os.path.join(config["meta_config"]["test_output_save_path"], "agent")
     )
@@ -1162,6 +1244,12 @@ def test_checkpoint_func(
     config_path: str = typer.Option(
         os.path.join("configs", "main.json"), "--config-path", "-c"
     ),
+    record: Optional[str] = typer.Option(
+        None, "--record", help="Record every LLM and embedding request into this cassette"
+    ),
+    replay: Optional[str] = typer.Option(
+        None, "--replay", help="Serve LLM and embedding requests from this cassette"
+    ),
 ):  # sourcery skip: low-code-quality
     # load config
     config = load_config(path=config_path)
@@ -1203,14 +1291,11 @@ def test_checkpoint_func(
         path=os.path.join(config["meta_config"]["test_checkpoint_save_path"], "env"),
     )
 
-    # chat request sleep
-    if "chat_request_sleep" in config["chat_config"]:
-        request_sleep = RequestTimeSleep(
-            sleep_time=config["chat_config"]["chat_request_sleep"]["sleep_time"],
-            sleep_every_count=config["chat_config"]["chat_request_sleep"][
-                "sleep_every_count"
-            ],
-        )
+    # record / replay model traffic
+    use_cassette(record, replay)
+
+    # rate limits, replaces the fixed chat request sleep
+    convert_request_sleep(config["chat_config"])
 
     logger.info("SYS-test checkpoint function started")
     logger.info(f"CONFIG-Config path: {config_path}")
@@ -1218,63 +1303,70 @@ def test_checkpoint_func(
 
     # env + agent loop
     total_steps = env.simulation_length
-    with progress.Progress() as progress_bar:
-        task_id = progress_bar.add_task("Warmup", total=total_steps)
-        task = progress_bar.tasks[task_id]
-        progress_bar.update(
-            task_id, description=f"Warmup remaining: {task.remaining} steps"
-        )
-
-        while True:
-            logger.info("*" * 50)
-
-            # get obs or terminate
-            obs = env.step()
-            if obs.termination_flag:
-                break
-
-            # log
-            logger.info("ENV-new info from env")
-            logger.info(f"ENV-date: {obs.cur_date}")
-            logger.info(f"ENV-price: {obs.cur_price}")
-            if obs.cur_news:
-                for cur_symbol in obs.cur_news:
-                    if obs.cur_news[cur_symbol]:
-                        for i, n in enumerate(obs.cur_news[cur_symbol]):  # type: ignore
-                            logger.info(f"ENV-news-{cur_symbol}-{i}: {n}")
-                            logger.info("-" * 50)
-            logger.info(f"ENV-momentum: {obs.cur_momentum}")
-            logger.info(f"ENV-symbol: {obs.cur_symbol}")
-            logger.info("=" * 50)
-
-            # agent one step
-            agent.step(
-                market_info=obs, run_mode=RunMode.TEST, task_type=agent.task_type
+    try:
+        with progress.Progress() as progress_bar:
+            task_id = progress_bar.add_task("Warmup", total=total_steps)
+            task = progress_bar.tasks[task_id]
+            progress_bar.update(
+                task_id, description=f"Warmup remaining: {task.remaining} steps"
             )
 
-            # save checkpoint
-            agent.save_checkpoint(
-                path=os.path.join(
-                    config["meta_config"]["test_checkpoint_save_path"], "agent"
+            while True:
+                logger.info("*" * 50)
+
+                # get obs or terminate
+                obs = env.step()
+                if obs.termination_flag:
+                    break
+
+                # log
+                logger.info("ENV-new info from env")
+                logger.info(f"ENV-date: {obs.cur_date}")
+                logger.info(f"ENV-price: {obs.cur_price}")
+                if obs.cur_news:
+                    for cur_symbol in obs.cur_news:
+                        if obs.cur_news[cur_symbol]:
+                            for i, n in enumerate(obs.cur_news[cur_symbol]):  # type: ignore
+                                logger.info(f"ENV-news-{cur_symbol}-{i}: {n}")
+                                logger.info("-" * 50)
+                logger.info(f"ENV-momentum: {obs.cur_momentum}")
+                logger.info(f"ENV-symbol: {obs.cur_symbol}")
+                logger.info("=" * 50)
+
+                # agent one step
+                agent.step(
+                    market_info=obs,
+                    run_mode=RunMode.TEST,
+                    task_type=agent.task_type,
+                    next_news=env.peek_news(),
                 )
-            )
-            env.save_checkpoint(
-                path=os.path.join(
-                    config["meta_config"]["test_checkpoint_save_path"], "env"
+
+                # save checkpoint
+                agent.save_checkpoint(
+                    path=os.path.join(
+                        config["meta_config"]["test_checkpoint_save_path"], "agent"
+                    )
+                )
+                env.save_checkpoint(
+                    path=os.path.join(
+                        config["meta_config"]["test_checkpoint_save_path"], "env"
+                    )
                 )
-            )
 
-            # request time sleep
-            if "chat_request_sleep" in config["chat_config"]:
-                request_sleep.step()
+                # time spent waiting on rate limits
+                mark_rate_limit_step(obs.cur_date)
 
-            # for next iteration
-            progress_bar.update(
-                task_id,
-                advance=1,
-                description=f"Warmup remaining steps: {task.remaining}",
-            )
-    # save results
+                # for next iteration
+                progress_bar.update(
+                    task_id,
+                    advance=1,
+                    description=f"Warmup remaining steps: {task.remaining}",
+                )
+        # save results
+        save_memory_db_stats(agent, config, "test")
+    finally:
+        # always stop the prefetch and filing workers, even on errors
+        agent.close()
     agent.save_checkpoint(
         path=os.path.join(config["meta_config"]["test_output_save_path"], "agent")
     )
@@ -1296,20 +1388,29 @@ def test_checkpoint_func(
 def run_all_func(
     config_path: str = typer.Option(
         ..., "--config-path", "-c", help="Path to config file"
-    )
+    ),
+    record: Optional[str] = typer.Option(
+        None, "--record", help="Record every LLM and embedding request into this cassette"
+    ),
+    replay: Optional[str] = typer.Option(
+        None, "--replay", help="Serve LLM and embedding requests from this cassette"
+    ),
 ) -> None:
     """Run complete pipeline: warmup -> test -> eval"""
     logger.info("🚀 Starting complete INVESTOR-BENCH pipeline")
     
     try:
+        # one cassette for both phases
+        use_cassette(record, replay)
+
         # Step 1: Warmup
         logger.info("📚 Step 1/3: Starting warmup phase")
-        warmup_up_func(config_path)
+        warmup_up_func(config_path, record=None, replay=None)
         logger.info("✅ Warmup phase completed")
         
         # Step 2: Test  
         logger.info("🧪 Step 2/3: Starting test phase")
-        test_func(config_path)
+        test_func(config_path, record=None, replay=None)
         logger.info("✅ Test phase completed")
         
         # Step 3: Eval
@@ -1334,6 +1435,146 @@ def run_all_func(
         raise typer.Exit(1)
 
 
+@app.command(name="pre-embed")
+def pre_embed_func(
+    config_path: str = typer.Option(
+        os.path.join("configs", "main.json"), "--config-path", "-c"
+    ),
+    output_dir: str = typer.Option(
+        None, "--output-dir", "-o", help="Defaults to emb_config.pre_embedding_dir"
+    ),
+    start_date: str = typer.Option(
+        None, "--start-date", help="Defaults to env_config.warmup_start_time"
+    ),
+    end_date: str = typer.Option(
+        None, "--end-date", help="Defaults to env_config.test_end_time"
+    ),
+) -> None:
+    """Embed all news of the configured symbols and date range ahead of a run"""
+    config = load_config(path=config_path)
+    output_dir = output_dir or config["emb_config"].get("pre_embedding_dir")
+    if not output_dir:
+        logger.error("SYS-No output dir given and emb_config.pre_embedding_dir not set")
+        raise typer.Exit(1)
+    # same near-duplicate filter as the agent, so dropped news is never embedded
+    deduplicator = (
+        NewsDeduplicator(config["agent_config"]["news_dedup"])
+        if config["agent_config"].get("news_dedup")
+        else None
+    )
+    items = collect_news(
+        env_data_path=config["env_config"]["env_data_path"],
+        start_date=start_date or config["env_config"]["warmup_start_time"],
+        end_date=end_date or config["env_config"]["test_end_time"],
+        deduplicator=deduplicator,
+    )
+    if deduplicator is not None:
+        logger.info(
+            f"SYS-News dedup dropped {deduplicator.num_dropped} of {deduplicator.num_seen} items"
+        )
+    logger.info(f"SYS-Pre-embedding {len(items)} news items into {output_dir}")
+    PreEmbeddingStore.build(
+        items=items, emb_config=config["emb_config"], path=output_dir
+    )
+    logger.info(f"SYS-Pre-embedding saved to {output_dir}")
+
+
+def load_pre_embedding_groups(config: Dict, pre_embedding_dir: str):
+    store = PreEmbeddingStore.load(pre_embedding_dir, config["emb_config"])
+    groups = [""] * len(store.index)
+    for key, row in store.index.items():
+        groups[row] = key.split("|")[0]
+    return store, groups
+
+
+@app.command(name="fit-projection")
+def fit_projection_func(
+    config_path: str = typer.Option(
+        os.path.join("configs", "main.json"), "--config-path", "-c"
+    ),
+    method: str = typer.Option("pca", "--method", help="pca or truncate"),
+    dim: int = typer.Option(768, "--dim"),
+    output_dir: str = typer.Option(..., "--output-dir", "-o"),
+    pre_embedding_dir: str = typer.Option(
+        None, "--pre-embedding-dir", help="Defaults to emb_config.pre_embedding_dir"
+    ),
+) -> None:
+    """Fit an embedding projection on a pre-embedded corpus"""
+    config = load_config(path=config_path)
+    store, _ = load_pre_embedding_groups(
+        config, pre_embedding_dir or config["emb_config"]["pre_embedding_dir"]
+    )
+    projection = EmbeddingProjection.fit(store.embeddings, method=method, dim=dim)  # type: ignore
+    projection.save(output_dir)
+    logger.info(
+        f'SYS-Set emb_config.emb_projection to {{"method": "{method}", "dim": {dim}, "path": "{output_dir}"}} to use it'
+    )
+
+
+@app.command(name="projection-report")
+def projection_report_func(
+    config_path: str = typer.Option(
+        os.path.join("configs", "main.json"), "--config-path", "-c"
+    ),
+    dims: str = typer.Option("256,512,768,1024", "--dims"),
+    k: int = typer.Option(5, "--k"),
+    num_queries: int = typer.Option(200, "--num-queries"),
+    output_path: str = typer.Option(
+        None, "--output-path", "-o", help="Optional JSON file for the report"
+    ),
+    pre_embedding_dir: str = typer.Option(
+        None, "--pre-embedding-dir", help="Defaults to emb_config.pre_embedding_dir"
+    ),
+) -> None:
+    """Compare top-k retrieval of truncated / PCA embeddings with full size"""
+    config = load_config(path=config_path)
+    store, groups = load_pre_embedding_groups(
+        config, pre_embedding_dir or config["emb_config"]["pre_embedding_dir"]
+    )
+    dim_list = [int(d) for d in dims.split(",")]
+    max_dim = {
+        method: EmbeddingProjection.max_dim(store.embeddings, method)  # type: ignore
+        for method in ("truncate", "pca")
+    }
+    # one SVD, smaller PCA sizes are prefixes of the largest basis
+    full_pca = EmbeddingProjection.fit(
+        store.embeddings,  # type: ignore
+        method="pca",
+        dim=min(max(dim_list), max_dim["pca"]),
+    )
+    projections = {}
+    for cur_dim in dim_list:
+        if cur_dim <= max_dim["truncate"]:
+            projections[f"truncate_{cur_dim}"] = EmbeddingProjection(
+                method="truncate", dim=cur_dim
+            )
+        if cur_dim <= max_dim["pca"]:
+            projections[f"pca_{cur_dim}"] = EmbeddingProjection(
+                method="pca",
+                dim=cur_dim,
+                mean=full_pca.mean,
+                components=full_pca.components[:cur_dim],  # type: ignore
+            )
+        for method in ("truncate", "pca"):
+            if cur_dim > max_dim[method]:
+                logger.warning(
+                    f"SYS-Skipping {method}_{cur_dim}, the corpus supports at most {max_dim[method]} dims"
+                )
+    report = retrieval_agreement(
+        embeddings=store.embeddings,
+        groups=groups,
+        projections=projections,
+        k=k,
+        num_queries=num_queries,
+    )
+    for name, cur_report in report.items():
+        logger.info(f"SYS-{name}: {cur_report}")
+    if output_path:
+        ensure_path(os.path.dirname(output_path) or ".")
+        with open(output_path, "w") as f:
+            f.write(orjson.dumps(report, option=orjson.OPT_INDENT_2).decode())
+
+
 @app.command(name="eval")
 def eval_func(
     config_path: str = typer.Option(
@@ -0,0 +1,105 @@
+"""
+Compare per-request httpx clients with one pooled client against a local stub
+of the vLLM OpenAI server, the way the vLLM endpoints call it.
+
+    python scripts/bench_vllm_client.py --requests 200 --latency-ms 5
+"""
+
+import argparse
+import json
+import statistics
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import httpx
+
+RESPONSE = json.dumps(
+    {
+        "choices": [
+            {
+                "message": {
+                    "content": json.dumps(
+                        {"investment_decision": "hold", "summary_reason": "stub"}
+                    )
+                }
+            }
+        ]
+    }
+).encode()
+
+
+def make_handler(latency: float):
+    class StubHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def _reply(self, body: bytes) -> None:
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            self._reply(b"{}")
+
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            time.sleep(latency)
+            self._reply(RESPONSE)
+
+        def log_message(self, *args):
+            pass
+
+    return StubHandler
+
+
+def run(mode: str, url: str, num_requests: int, payload: dict) -> list:
+    latencies = []
+    pooled = httpx.Client(
+        timeout=httpx.Timeout(60, connect=10.0),
+        limits=httpx.Limits(max_connections=10, max_keepalive_connections=10),
+    )
+    try:
+        for _ in range(num_requests):
+            start = time.perf_counter()
+            if mode == "per-request":
+                with httpx.Client(timeout=60) as client:
+                    client.post(url, json=payload)
+            else:
+                pooled.post(url, json=payload)
+            latencies.append(time.perf_counter() - start)
+    finally:
+        pooled.close()
+    return latencies
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), make_handler(args.latency_ms / 1000))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}/v1/chat/completions"
+    payload = {
+        "model": "stub",
+        "max_tokens": 1000,
+        "messages": [{"role": "user", "content": "x" * 8000}],
+    }
+    try:
+        for mode in ["per-request", "pooled"]:
+            run(mode, url, 5, payload)  # warm up
+            latencies = sorted(run(mode, url, args.requests, payload))
+            print(
+                f"{mode:>12}: mean {statistics.mean(latencies) * 1000:.2f} ms, "
+                f"p50 {latencies[len(latencies) // 2] * 1000:.2f} ms, "
+                f"p95 {latencies[int(len(latencies) * 0.95)] * 1000:.2f} ms"
+            )
+    finally:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,289 @@
+"""
+OpenAI-compatible stub of a vLLM server for load and throughput testing on a
+CPU-only box. Chat and completion responses are random JSON that satisfies the
+``guided_json`` schema of the request (or a single-asset decision when there is
+none); embeddings are deterministic unit vectors derived from the input text.
+
+    python scripts/stub_llm_server.py --port 8000 --latency-ms 200 \\
+        --latency-dist lognormal --tokens-per-sec 50 --error-rate 0.05
+
+Point ``chat_vllm_endpoint`` (vllm engine) or ``api_base`` (openai_compatible,
+use http://127.0.0.1:8000/v1) at it.
+"""
+
+import argparse
+import base64
+import hashlib
+import json
+import math
+import random
+import signal
+import struct
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List
+
+WORDS = (
+    "revenue guidance margin demand momentum earnings outlook volatility "
+    "analyst upgrade downgrade supply chain growth risk sentiment quarter "
+    "market share pricing cost buyback dividend valuation"
+).split()
+
+
+def random_text(rng: random.Random, num_words: int) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(num_words)).capitalize() + "."
+
+
+def generate(schema: Dict[str, Any], rng: random.Random, num_words: int) -> Any:
+    """Random instance of the JSON schema subset produced by the schema classes."""
+    for combinator in ("anyOf", "oneOf", "allOf"):
+        if combinator in schema:
+            return generate(schema[combinator][0], rng, num_words)
+    if "enum" in schema:
+        return rng.choice(schema["enum"])
+    schema_type = schema.get("type", "object")
+    if schema_type == "object":
+        return {
+            name: generate(sub_schema, rng, num_words)
+            for name, sub_schema in schema.get("properties", {}).items()
+        }
+    if schema_type == "array":
+        items = schema.get("items", {})
+        min_items = schema.get("minItems", 0)
+        if "enum" in items:
+            # memory ids: a distinct subset of the allowed values
+            choices = items["enum"]
+            size = rng.randint(min(min_items, len(choices)), len(choices))
+            return rng.sample(choices, size)
+        size = rng.randint(min_items, schema.get("maxItems", max(min_items, 3)))
+        return [generate(items, rng, num_words) for _ in range(size)]
+    if schema_type == "integer":
+        return rng.randint(schema.get("minimum", 0), schema.get("maximum", 100))
+    if schema_type == "number":
+        return rng.uniform(schema.get("minimum", 0.0), schema.get("maximum", 1.0))
+    if schema_type == "boolean":
+        return rng.random() < 0.5
+    return random_text(rng, num_words)
+
+
+def embed(text: str, dim: int) -> List[float]:
+    seed = hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest()
+    rng = random.Random(struct.unpack("<Q", seed)[0])
+    vector = [rng.gauss(0.0, 1.0) for _ in range(dim)]
+    norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+    return [v / norm for v in vector]
+
+
+def estimate_tokens(text: str) -> int:
+    return len(text.encode("utf-8")) // 4 + 1
+
+
+class StubState:
+    def __init__(self, args: argparse.Namespace) -> None:
+        self.args = args
+        self.rng = random.Random(args.seed)
+        self.rng_lock = threading.Lock()
+        self.slots = threading.BoundedSemaphore(args.max_concurrency)
+        self.stats_lock = threading.Lock()
+        self.status_codes: Counter = Counter()
+        self.num_requests = 0
+        self.completion_tokens = 0
+
+    def draw(self, fn, *args):
+        with self.rng_lock:
+            return fn(*args)
+
+    def latency(self) -> float:
+        mean = self.args.latency_ms / 1000
+        if self.args.latency_dist == "uniform":
+            return self.draw(self.rng.uniform, 0.0, 2 * mean)
+        if self.args.latency_dist == "exponential":
+            return self.draw(self.rng.expovariate, 1 / mean) if mean > 0 else 0.0
+        if self.args.latency_dist == "lognormal" and mean > 0:
+            sigma = self.args.latency_sigma
+            # mu chosen so that the distribution mean equals --latency-ms
+            return self.draw(self.rng.lognormvariate, math.log(mean) - sigma**2 / 2, sigma)
+        return mean
+
+    def record(self, status_code: int, completion_tokens: int = 0) -> None:
+        with self.stats_lock:
+            self.num_requests += 1
+            self.status_codes[status_code] += 1
+            self.completion_tokens += completion_tokens
+
+
+def make_handler(state: StubState):
+    args = state.args
+
+    class StubHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def _reply(self, status_code: int, body: Dict[str, Any], headers=None) -> None:
+            data = json.dumps(body).encode()
+            self.send_response(status_code)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            for key, value in (headers or {}).items():
+                self.send_header(key, value)
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            if self.path.rstrip("/") in ("/health", "/v1/health"):
+                self._reply(200, {})
+            elif self.path.rstrip("/") == "/v1/models":
+                self._reply(
+                    200, {"object": "list", "data": [{"id": args.model, "object": "model"}]}
+                )
+            else:
+                self._reply(404, {"error": {"message": f"unknown path {self.path}"}})
+
+        def do_POST(self):
+            request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+            path = self.path.rstrip("/")
+            if path.endswith("/embeddings"):
+                return self._embeddings(request)
+            if not (path.endswith("/chat/completions") or path.endswith("/completions")):
+                return self._reply(404, {"error": {"message": f"unknown path {self.path}"}})
+            roll = state.draw(state.rng.random)
+            if roll < args.error_rate:
+                headers = {"Retry-After": str(args.retry_after)} if args.retry_after else None
+                state.record(args.error_status)
+                return self._reply(
+                    args.error_status, {"error": {"message": "injected error"}}, headers
+                )
+            if roll < args.error_rate + args.hang_rate:
+                # longer than any sane client timeout
+                time.sleep(args.hang_s)
+            with state.slots:
+                self._generate(request, chat=path.endswith("/chat/completions"))
+
+        def _generate(self, request: Dict[str, Any], chat: bool) -> None:
+            schema = request.get("guided_json")
+            if schema is None and request.get("response_format", {}).get("type") == "json_schema":
+                schema = request["response_format"]["json_schema"].get("schema")
+            if isinstance(schema, str):
+                schema = json.loads(schema)
+            if schema is None:
+                schema = {
+                    "type": "object",
+                    "properties": {
+                        "investment_decision": {"enum": ["buy", "sell", "hold"]},
+                        "summary_reason": {"type": "string"},
+                    },
+                }
+            content = json.dumps(state.draw(generate, schema, state.rng, args.words))
+            if chat:
+                prompt = "".join(str(m.get("content", "")) for m in request.get("messages", []))
+            else:
+                prompt = "".join(request.get("prompt") or [])
+            prompt_tokens = estimate_tokens(prompt)
+            completion_tokens = estimate_tokens(content)
+            delay = state.latency()
+            if args.tokens_per_sec > 0:
+                delay += completion_tokens / args.tokens_per_sec
+            time.sleep(delay)
+            choice = (
+                {"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}
+                if chat
+                else {"index": 0, "text": content, "finish_reason": "stop"}
+            )
+            state.record(200, completion_tokens)
+            self._reply(
+                200,
+                {
+                    "id": f"stub-{time.time_ns()}",
+                    "object": "chat.completion" if chat else "text_completion",
+                    "created": int(time.time()),
+                    "model": request.get("model", args.model),
+                    "choices": [choice],
+                    "usage": {
+                        "prompt_tokens": prompt_tokens,
+                        "completion_tokens": completion_tokens,
+                        "total_tokens": prompt_tokens + completion_tokens,
+                    },
+                },
+            )
+
+        def _embeddings(self, request: Dict[str, Any]) -> None:
+            texts = request["input"]
+            if isinstance(texts, str):
+                texts = [texts]
+            data = []
+            for i, text in enumerate(texts):
+                vector = embed(text, args.emb_dim)
+                if request.get("encoding_format") == "base64":
+                    vector = base64.b64encode(struct.pack(f"<{len(vector)}f", *vector)).decode()
+                data.append({"object": "embedding", "index": i, "embedding": vector})
+            num_tokens = sum(estimate_tokens(t) for t in texts)
+            state.record(200)
+            self._reply(
+                200,
+                {
+                    "object": "list",
+                    "data": data,
+                    "model": request.get("model", args.model),
+                    "usage": {"prompt_tokens": num_tokens, "total_tokens": num_tokens},
+                },
+            )
+
+        def log_message(self, *args):
+            pass
+
+    return StubHandler
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--model", default="stub")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="mean base latency")
+    parser.add_argument(
+        "--latency-dist",
+        choices=["fixed", "uniform", "exponential", "lognormal"],
+        default="fixed",
+    )
+    parser.add_argument("--latency-sigma", type=float, default=0.5, help="lognormal sigma")
+    parser.add_argument(
+        "--tokens-per-sec", type=float, default=0.0, help="decode speed, 0 for instant"
+    )
+    parser.add_argument("--max-concurrency", type=int, default=64, help="concurrent generations")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--error-status", type=int, default=503)
+    parser.add_argument("--retry-after", type=float, default=0.0, help="Retry-After on errors")
+    parser.add_argument("--hang-rate", type=float, default=0.0, help="requests that stall")
+    parser.add_argument("--hang-s", type=float, default=600.0)
+    parser.add_argument("--words", type=int, default=40, help="words per generated string")
+    parser.add_argument("--emb-dim", type=int, default=1024)
+    args = parser.parse_args()
+
+    state = StubState(args)
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(state))
+    server.daemon_threads = True
+    print(f"stub LLM server on http://{args.host}:{server.server_address[1]}", flush=True)
+    start = time.perf_counter()
+
+    def stop(*_):
+        raise KeyboardInterrupt
+
+    signal.signal(signal.SIGTERM, stop)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        elapsed = time.perf_counter() - start
+        print(
+            f"{state.num_requests} requests in {elapsed:.1f}s, "
+            f"{state.completion_tokens / elapsed:.1f} completion tokens/s, "
+            f"status codes {dict(state.status_codes)}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,3 +1,4 @@
+from .cassette import Cassette
 from .chat import (
     SingleAssetStructureGenerationFailure,
     MultiAssetsStructureGenerationFailure,
@@ -5,7 +6,8 @@ from .chat import (
     MultiAssetsStructureOutputResponse,
     get_chat_model,
 )
-from .embedding import OpenAIEmbedding
+from .embedding import OpenAIEmbedding, get_embedding_model
+from .embedding_projection import EmbeddingProjection, retrieval_agreement
 from .memory_db import (
     AccessFeedbackMulti,
     AccessFeedback,
@@ -31,6 +33,9 @@ from .portfolio import (
     construct_portfolio,
 )
 from .market_env import MarketEnv
+from .news_dedup import NewsDeduplicator
+from .pre_embedding import PreEmbeddingStore, collect_news
 from .utils import RunMode, TaskType, ensure_path
 from .agent import FinMemAgent
 from .eval_pipeline import output_metrics_summary_single, output_metric_summary_multi
+from .transport import transport_registry
@@ -1,5 +1,7 @@
 import os
-from typing import Any, Dict, Union
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import date
+from typing import Any, Dict, List, Tuple, Union
 
 import orjson
 from loguru import logger
@@ -7,9 +9,11 @@ from pydantic import NonNegativeInt
 
 from .chat import (
     MultiAssetsStructureGenerationFailure,
+    MultiAssetsStructureOutputResponse,
     SingleAssetStructureGenerationFailure,
     get_chat_model,
 )
+from .filing_chunker import chunk_filing
 from .market_env import OneDayMarketInfo
 from .memory_db import (
     ConstantAccessCounterUpdateFunction,
@@ -29,6 +33,9 @@ from .portfolio import (
     TradeAction,
     construct_portfolio,
 )
+from .news_dedup import NewsDeduplicator
+from .pre_embedding import PreEmbeddingStore
+from .token_budget import PromptBudget
 from .utils import RunMode, TaskType
 
 
@@ -55,10 +62,58 @@ class FinMemAgent:
         # memory db
         self.memory_db = MemoryDB(agent_config=agent_config, emb_config=emb_config)
         self.id_generator = IDGenerator(id_init=0)
+        self.step_count = 0
+        # lexical near-duplicate filter in front of news embedding
+        self.news_dedup = (
+            NewsDeduplicator(agent_config["news_dedup"])
+            if agent_config.get("news_dedup")
+            else None
+        )
+        # 10-K / 10-Q ingestion, chunks are embedded off the critical path
+        self.filing_config: Dict[str, Any] = agent_config.get("filing_ingestion", {})
+        self._filing_executor = (
+            ThreadPoolExecutor(max_workers=1, thread_name_prefix="filing")
+            if self.filing_config and self.filing_config.get("background", True)
+            else None
+        )
+        self._pending_filings: List[Tuple[List[Dict[str, Any]], str, Future]] = []
+        # next day's news is embedded while the current LLM call is in flight
+        self._prefetch_executor = (
+            ThreadPoolExecutor(max_workers=1, thread_name_prefix="prefetch")
+            if agent_config.get("prefetch_news", False)
+            else None
+        )
+        self._prefetched: Union[
+            Tuple[date, Dict[str, Tuple[List[str], Future]]], None
+        ] = None
+        # pre-computed news embeddings, see `run.py pre-embed`
+        self.pre_embedding = (
+            PreEmbeddingStore.load(emb_config["pre_embedding_dir"], emb_config)
+            if emb_config.get("pre_embedding_dir")
+            else None
+        )
         # chat endpoint
         self.chat_schema, self.chat_endpoint, self.chat_prompt = get_chat_model(
             chat_config=chat_config, task_type=task_type
         )
+        # token budget for the memories that go into the prompt
+        self.prompt_budget = (
+            PromptBudget(agent_config["prompt_budget"], chat_config["chat_model"])
+            if agent_config.get("prompt_budget")
+            else None
+        )
+        # multi-asset decisions as one request per symbol, see `_multi_assets_trade_action`
+        fan_out_config = chat_config.get("multi_asset_fan_out")
+        self._fan_out_executor = (
+            ThreadPoolExecutor(
+                max_workers=fan_out_config.get(
+                    "max_concurrency", len(agent_config["trading_symbols"])
+                ),
+                thread_name_prefix="fan-out",
+            )
+            if fan_out_config and (task_type == TaskType.MultiAssets)
+            else None
+        )
         # memory functions
         logger.trace("SYS-Configuring memory settings")
         self._config_memory_settings()
@@ -232,13 +287,46 @@ class FinMemAgent:
             },
         }
         logger.trace(f"AGENT-Jump threshold dict: {self.jump_threshold_dict}")
+        # maintenance cadence, clean-up and flow run every step by default
+        self.maintenance_config: Dict[str, Any] = self.agent_config[
+            "memory_db_config"
+        ].get("maintenance", {})
+        logger.trace(f"AGENT-Maintenance config: {self.maintenance_config}")
+        # consolidation, disabled unless configured
+        self.consolidation_config: Dict[str, Any] = self.agent_config[
+            "memory_db_config"
+        ].get("consolidation", {})
+        logger.trace(f"AGENT-Consolidation config: {self.consolidation_config}")
 
     def _handling_new_information(self, market_info: OneDayMarketInfo) -> None:
         # news
         logger.trace("AGENT-Handling news information")
+        prefetched = self._take_prefetched(market_info.cur_date)  # type: ignore
         for symbol, news in market_info.cur_news.items():  # type: ignore
             if news is not None:
                 logger.trace(f"AGENT-Handling news for symbol: {symbol}")
+                if self.news_dedup is not None:
+                    num_news = len(news)
+                    news = self.news_dedup(symbol, market_info.cur_date, news)  # type: ignore
+                    self.memory_db.stats.incr("news_seen", num_news)
+                    self.memory_db.stats.incr("news_dedup_dropped", num_news - len(news))
+                    if num_news != len(news):
+                        logger.info(
+                            f"AGENT-Dropped {num_news - len(news)} of {num_news} news for {symbol} as near-duplicates"
+                        )
+                    if not news:
+                        continue
+                news_embs = None
+                if self.pre_embedding is not None:
+                    news_embs = self.pre_embedding.lookup(
+                        symbol=symbol, cur_date=market_info.cur_date, texts=news  # type: ignore
+                    )
+                    if news_embs is None:
+                        logger.warning(
+                            f"AGENT-News of {symbol} on {market_info.cur_date} not pre-embedded, embedding online"
+                        )
+                if (news_embs is None) and (symbol in prefetched):
+                    news_embs = self._prefetched_embeddings(symbol, news, *prefetched[symbol])
                 self.memory_db.add_memory(
                     memory_input=[
                         {
@@ -252,7 +340,104 @@ class FinMemAgent:
                     layer="short",
                     importance_init_func=self.short_importance_init,
                     recency_init_func=self.short_recency_init,
+                    embeddings=news_embs,
+                )
+
+    def _prefetch_news(
+        self, next_date: date, next_news: Dict[str, Union[List[str], None]]
+    ) -> None:
+        # embed only what dedup would keep, today's news is already recorded
+        prefetched = {}
+        for symbol, news in next_news.items():
+            if news and (self.news_dedup is not None):
+                news = self.news_dedup.peek(symbol, next_date, news)
+            if not news:
+                continue
+            if (self.pre_embedding is not None) and (
+                self.pre_embedding.lookup(symbol=symbol, cur_date=next_date, texts=news)
+                is not None
+            ):
+                continue
+            prefetched[symbol] = (
+                news,
+                self._prefetch_executor.submit(self.memory_db.emb_model, texts=news),  # type: ignore
+            )
+        self._prefetched = (next_date, prefetched)
+        logger.trace(f"AGENT-Prefetching news embeddings for {next_date}: {list(prefetched)}")
+
+    def _take_prefetched(self, cur_date: date) -> Dict[str, Tuple[List[str], Future]]:
+        if self._prefetched is None:
+            return {}
+        prefetched_date, prefetched = self._prefetched
+        self._prefetched = None
+        if prefetched_date != cur_date:
+            logger.warning(
+                f"AGENT-Discarding news prefetched for {prefetched_date}, current date is {cur_date}"
+            )
+            return {}
+        return prefetched
+
+    def _prefetched_embeddings(
+        self, symbol: str, news: List[str], prefetched_news: List[str], future: Future
+    ) -> Any:
+        try:
+            embeddings = future.result()
+        except Exception as e:
+            logger.warning(f"AGENT-News prefetch for {symbol} failed, embedding online: {e}")
+            return None
+        rows = {text: i for i, text in enumerate(prefetched_news)}
+        if any(n not in rows for n in news):
+            return None
+        self.memory_db.stats.incr("news_prefetched", len(news))
+        return embeddings[[rows[n] for n in news]]
+
+    def _submit_filings(self, market_info: OneDayMarketInfo) -> None:
+        # 10-Q goes to mid, 10-K to long, one memory per chunk
+        for filings, layer in [
+            (market_info.cur_filing_q, "mid"),
+            (market_info.cur_filing_k, "long"),
+        ]:
+            for symbol, filing in (filings or {}).items():
+                if not filing:
+                    continue
+                chunks = chunk_filing(
+                    filing,
+                    max_chunk_tokens=self.filing_config.get("max_chunk_tokens", 512),
+                    overlap_tokens=self.filing_config.get("overlap_tokens", 0),
+                )
+                logger.trace(
+                    f"AGENT-Chunked {layer} filing of {symbol} into {len(chunks)} chunks"
                 )
+                memory_input = [
+                    {
+                        "id": self.id_generator(),
+                        "symbol": symbol,
+                        "date": market_info.cur_date,
+                        "text": c,
+                    }
+                    for c in chunks
+                ]
+                if self._filing_executor is not None:
+                    future = self._filing_executor.submit(
+                        self.memory_db.emb_model, texts=chunks
+                    )
+                else:
+                    future = Future()
+                    future.set_result(self.memory_db.emb_model(texts=chunks))
+                self._pending_filings.append((memory_input, layer, future))
+
+    def _ingest_pending_filings(self) -> None:
+        # embeddings come from the worker, the memory db is only touched here
+        for memory_input, layer, future in self._pending_filings:
+            self.memory_db.add_memory(
+                memory_input=memory_input,
+                layer=layer,
+                importance_init_func=getattr(self, f"{layer}_importance_init"),
+                recency_init_func=getattr(self, f"{layer}_recency_init"),
+                embeddings=future.result(),
+            )
+            self.memory_db.stats.incr(f"filing_chunks_to_{layer}", len(memory_input))
+        self._pending_filings = []
 
     def _query_memories(self) -> Dict[str, Dict[str, Union[str, NonNegativeInt, None]]]:
         # sourcery skip: low-code-quality
@@ -393,6 +578,7 @@ class FinMemAgent:
             momentum=market_info.cur_momentum[market_info.cur_symbol[0]],  # type: ignore
         )
         logger.trace("AGENT-Constructed prompt")
+        self._record_prompt_tokens(cur_prompt, [cur_symbol], market_info)
         cur_schema = self.chat_schema(
             run_mode=run_mode,
             short_memory_ids=cur_queried_memories["short_memory_id"],  # type: ignore
@@ -403,6 +589,12 @@ class FinMemAgent:
         logger.trace("AGENT-Constructed schema")
         cur_response = self.chat_endpoint(prompt=cur_prompt, schema=cur_schema)  # type: ignore
         logger.info("~" * 50)
+        self._record_evidence_hits(
+            cur_queried_memories,
+            None
+            if isinstance(cur_response, SingleAssetStructureGenerationFailure)
+            else cur_response,
+        )
         if isinstance(cur_response, SingleAssetStructureGenerationFailure):
             logger.info("AGENT-Structure generation failure")
             self.portfolio.record_action(
@@ -472,13 +664,13 @@ class FinMemAgent:
             evidence=cur_evidence,
         )
 
-    def _multi_assets_trade_action(
+    def _multi_assets_generate(
         self,
+        symbols: List[str],
         queried_memories: Dict[str, Dict[str, Union[str, NonNegativeInt, None]]],
         market_info: OneDayMarketInfo,
         run_mode: RunMode,
-    ):  # sourcery skip: low-code-quality
-        symbols = list(queried_memories.keys())
+    ) -> Union[MultiAssetsStructureGenerationFailure, MultiAssetsStructureOutputResponse]:
         short_memory = {
             symbol: queried_memories[symbol]["short_memory"] for symbol in symbols
         }
@@ -520,7 +712,8 @@ class FinMemAgent:
             reflection_memory_id=reflection_memory_id,  # type: ignore
             momentum=momentum,  # type: ignore
         )
-        logger.trace("AGENT-Constructed prompt")
+        logger.trace(f"AGENT-Constructed prompt for {symbols}")
+        self._record_prompt_tokens(cur_prompt, symbols, market_info)
         cur_schema = self.chat_schema(
             run_mode=run_mode,
             symbols=symbols,  # type: ignore
@@ -529,13 +722,88 @@ class FinMemAgent:
             long_memory_ids=long_memory_id,  # type: ignore
             reflection_memory_ids=reflection_memory_id,  # type: ignore
         )
-        logger.trace("AGENT-Constructed schema")
-        cur_response = self.chat_endpoint(
+        logger.trace(f"AGENT-Constructed schema for {symbols}")
+        return self.chat_endpoint(
             prompt=cur_prompt,  # type: ignore
             schema=cur_schema,
             symbols=symbols,  # type: ignore
         )
+
+    @staticmethod
+    def _merge_multi_assets_responses(
+        responses: Dict[
+            str,
+            Union[
+                MultiAssetsStructureGenerationFailure,
+                MultiAssetsStructureOutputResponse,
+            ],
+        ],
+    ) -> Union[MultiAssetsStructureGenerationFailure, MultiAssetsStructureOutputResponse]:
+        symbols = list(responses.keys())
+        if all(
+            isinstance(r, MultiAssetsStructureGenerationFailure)
+            for r in responses.values()
+        ):
+            return MultiAssetsStructureGenerationFailure(
+                investment_decision={symbol: TradeAction.HOLD for symbol in symbols}
+            )
+        # a failed symbol holds and cites nothing, the others keep their answer
+        merged: Dict[str, Dict[str, Any]] = {
+            field: {}
+            for field in [
+                "investment_decision",
+                "summary_reason",
+                "short_memory_ids",
+                "mid_memory_ids",
+                "long_memory_ids",
+                "reflection_memory_ids",
+            ]
+        }
+        for symbol, response in responses.items():
+            if isinstance(response, MultiAssetsStructureGenerationFailure):
+                merged["investment_decision"][symbol] = TradeAction.HOLD
+                merged["summary_reason"][symbol] = "Structure generation failure"
+                continue
+            for field, values in response.model_dump().items():
+                if symbol in values:
+                    merged[field][symbol] = values[symbol]
+        return MultiAssetsStructureOutputResponse(**merged)
+
+    def _multi_assets_trade_action(
+        self,
+        queried_memories: Dict[str, Dict[str, Union[str, NonNegativeInt, None]]],
+        market_info: OneDayMarketInfo,
+        run_mode: RunMode,
+    ):  # sourcery skip: low-code-quality
+        symbols = list(queried_memories.keys())
+        if self._fan_out_executor is None:
+            cur_response = self._multi_assets_generate(
+                symbols, queried_memories, market_info, run_mode
+            )
+        else:
+            # one smaller request per symbol, in flight together
+            futures = {
+                symbol: self._fan_out_executor.submit(
+                    self._multi_assets_generate,
+                    [symbol],
+                    queried_memories,
+                    market_info,
+                    run_mode,
+                )
+                for symbol in symbols
+            }
+            cur_response = self._merge_multi_assets_responses(
+                {symbol: future.result() for symbol, future in futures.items()}
+            )
         logger.info("~" * 50)
+        for symbol in symbols:
+            self._record_evidence_hits(
+                queried_memories[symbol],
+                None
+                if isinstance(cur_response, MultiAssetsStructureGenerationFailure)
+                else cur_response,
+                symbol=symbol,
+            )
         if isinstance(cur_response, MultiAssetsStructureGenerationFailure):
             logger.info("AGENT-Structure generation failure")
             self.portfolio.record_action(
@@ -573,6 +841,36 @@ class FinMemAgent:
             )
         self._update_feedback_response()
 
+    def _record_prompt_tokens(
+        self, prompt: Any, symbols: List[str], market_info: OneDayMarketInfo
+    ) -> None:
+        if self.prompt_budget is None:
+            return
+        # guardrail prompts come as a tuple of parts
+        prompt_text = " ".join(prompt) if isinstance(prompt, tuple) else str(prompt)
+        num_tokens = self.prompt_budget.counter.count(prompt_text)
+        self.memory_db.stats.record_prompt_tokens(
+            step=str(market_info.cur_date), symbols=symbols, tokens=num_tokens
+        )
+        logger.info(f"AGENT-Prompt tokens for {symbols}: {num_tokens}")
+
+    def _record_evidence_hits(
+        self,
+        queried_memories: Dict[str, Union[str, NonNegativeInt, None]],
+        response: Any,
+        symbol: Union[str, None] = None,
+    ) -> None:
+        for layer in ["short", "mid", "long", "reflection"]:
+            retrieved_ids = queried_memories[f"{layer}_memory_id"] or []
+            cited_ids = None if response is None else getattr(response, f"{layer}_memory_ids")
+            if symbol is not None and cited_ids is not None:
+                cited_ids = cited_ids.get(symbol)
+            self.memory_db.stats.record_evidence(
+                layer=layer,
+                retrieved=len(retrieved_ids),  # type: ignore
+                cited=len(set(cited_ids or []) & set(retrieved_ids)),  # type: ignore
+            )
+
     def _update_feedback_response(self):
         feedback = self.portfolio.get_feedback_response()
         logger.info(f"AGENT-feedback: {feedback.model_dump()}")
@@ -581,8 +879,20 @@ class FinMemAgent:
             access_counter_update_func=self.memory_access_update,
         )
 
+    def _maintenance_due(self, task: str) -> bool:
+        # decay always runs every step, only clean-up and flow can be thinned out
+        every_n_steps = self.maintenance_config.get(f"{task}_every_n_steps", 1)
+        if self.step_count % every_n_steps == 0:
+            return True
+        logger.trace(f"AGENT-Skipping {task} at step {self.step_count}")
+        return False
+
     def step(
-        self, market_info: OneDayMarketInfo, run_mode: RunMode, task_type: TaskType
+        self,
+        market_info: OneDayMarketInfo,
+        run_mode: RunMode,
+        task_type: TaskType,
+        next_news: Union[Tuple[date, Dict[str, Union[List[str], None]]], None] = None,
     ) -> None:
         logger.info(
             f"AGENT-Step, date: {market_info.cur_date}, run mode: {run_mode}, task type: {task_type}"
@@ -590,9 +900,19 @@ class FinMemAgent:
         # handling new information
         logger.info("AGENT-Handling new information")
         self._handling_new_information(market_info=market_info)
+        if self.filing_config:
+            self._submit_filings(market_info=market_info)
+            if self._filing_executor is None:
+                self._ingest_pending_filings()
+        if (self._prefetch_executor is not None) and (next_news is not None):
+            self._prefetch_news(*next_news)
         # query memories
         logger.info("AGENT-Querying memories")
         queried_memories = self._query_memories()
+        if self.prompt_budget is not None:
+            queried_memories = self.prompt_budget(
+                queried_memories, self.memory_db.stats  # type: ignore
+            )
         # talk to chat to send action evidence to portfolio
         if task_type == TaskType.SingleAsset:
             logger.info("AGENT-Single asset task")
@@ -609,6 +929,9 @@ class FinMemAgent:
                 run_mode=run_mode,
             )
         # memory db step
+        self.step_count += 1
+        ## filings embedded in the background during the trade action
+        self._ingest_pending_filings()
         ## decay
         self.memory_db.decay(
             importance_decay_func=self.short_importance_decay,
@@ -631,33 +954,48 @@ class FinMemAgent:
             layer="reflection",
         )
         ## clean up
-        self.memory_db.clean_up(
-            importance_threshold=self.threshold_dict["short"]["importance"],
-            recency_threshold=self.threshold_dict["short"]["recency"],
-            layer="short",
-        )
-        self.memory_db.clean_up(
-            importance_threshold=self.threshold_dict["mid"]["importance"],
-            recency_threshold=self.threshold_dict["mid"]["recency"],
-            layer="mid",
-        )
-        self.memory_db.clean_up(
-            importance_threshold=self.threshold_dict["long"]["importance"],
-            recency_threshold=self.threshold_dict["long"]["recency"],
-            layer="long",
-        )
-        self.memory_db.clean_up(
-            importance_threshold=self.threshold_dict["reflection"]["importance"],
-            recency_threshold=self.threshold_dict["reflection"]["recency"],
-            layer="reflection",
-        )
+        if self._maintenance_due("clean_up"):
+            for cur_layer in ["short", "mid", "long", "reflection"]:
+                self.memory_db.clean_up(
+                    importance_threshold=self.threshold_dict[cur_layer]["importance"],
+                    recency_threshold=self.threshold_dict[cur_layer]["recency"],
+                    layer=cur_layer,
+                )
         ## memory flow
-        self.memory_db.memory_flow(
-            jump_threshold_dict=self.jump_threshold_dict,
-            mid_recency_init_func=self.mid_recency_init,
-            long_recency_init_func=self.long_recency_init,
+        if self._maintenance_due("flow"):
+            self.memory_db.memory_flow(
+                jump_threshold_dict=self.jump_threshold_dict,
+                mid_recency_init_func=self.mid_recency_init,
+                long_recency_init_func=self.long_recency_init,
+            )
+        ## consolidation
+        if self.consolidation_config and (
+            self.step_count % self.consolidation_config["every_n_steps"] == 0
+        ):
+            for cur_layer in self.consolidation_config.get(
+                "layers", ["short", "mid", "long", "reflection"]
+            ):
+                self.memory_db.consolidate(
+                    layer=cur_layer,
+                    similarity_threshold=self.consolidation_config[
+                        "similarity_threshold"
+                    ],
+                )
+        self.memory_db.stats.record_partition_sizes(
+            step=str(market_info.cur_date), sizes=self.memory_db.partition_counts()
         )
 
+    def close(self) -> None:
+        # release pooled connections and worker threads
+        self.chat_endpoint.close()
+        self.memory_db.close()
+        if self._filing_executor is not None:
+            self._filing_executor.shutdown(wait=True)
+        if self._prefetch_executor is not None:
+            self._prefetch_executor.shutdown(wait=True)
+        if self._fan_out_executor is not None:
+            self._fan_out_executor.shutdown(wait=True)
+
     def __eq__(self, another_agent: "FinMemAgent") -> bool:
         return (
             self.agent_config == another_agent.agent_config
@@ -676,11 +1014,14 @@ class FinMemAgent:
             "chat_config": self.chat_config,
             "portfolio_config": self.portfolio_config,
             "id_generator": self.id_generator.save_check_point(),
+            "step_count": self.step_count,
             "task_type": self.task_type,
         }
         with open(os.path.join(path, "state_dict.json"), "w") as f:
             f.write(orjson.dumps(state_dict).decode())
         self.memory_db.save_checkpoint(os.path.join(path, "memory_db"))
+        if self.news_dedup is not None:
+            self.news_dedup.save_checkpoint(path)
 
     @classmethod
     def load_checkpoint(
@@ -696,7 +1037,17 @@ class FinMemAgent:
             task_type=state_dict["task_type"],
         )
         agent.id_generator = IDGenerator.load_checkpoint(state_dict["id_generator"])
+        agent.step_count = state_dict.get("step_count", 0)
+        # the memory db built by __init__ is replaced, give its client back
+        agent.memory_db.close()
         agent.memory_db = MemoryDB.load_checkpoint(os.path.join(path, "memory_db"))
+        if agent.news_dedup is not None:
+            if os.path.exists(os.path.join(path, "news_dedup.json")):
+                agent.news_dedup = NewsDeduplicator.load_checkpoint(path)
+            else:
+                logger.warning(
+                    f"AGENT-No news dedup state in {path}, already seen news may be ingested again"
+                )
         if agent.task_type == TaskType.SingleAsset:
             agent.portfolio = PortfolioSingleAsset.load_checkpoint(path)
         else:
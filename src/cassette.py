@@ -0,0 +1,164 @@
+import base64
+import hashlib
+import os
+import threading
+from typing import Any, Dict, List
+
+import httpx
+import orjson
+from loguru import logger
+
+from .utils import ensure_path
+
+# divergent requests kept in the stats for inspection
+MAX_DIVERGENT_SAMPLES = 20
+
+
+def request_key(request: httpx.Request) -> str:
+    """Hash of method, path and body; JSON bodies are compared key-order independent."""
+    body = request.read()
+    try:
+        body = orjson.dumps(orjson.loads(body), option=orjson.OPT_SORT_KEYS)
+    except orjson.JSONDecodeError:
+        pass
+    digest = hashlib.sha256()
+    digest.update(request.method.encode())
+    digest.update(request.url.raw_path)
+    digest.update(body)
+    return digest.hexdigest()
+
+
+class Cassette:
+    """
+    JSONL file of HTTP exchanges. In ``record`` mode every response that goes
+    through the pooled transports is appended; in ``replay`` mode responses are
+    served from the file without touching the network. Identical requests are
+    replayed in recording order, and the last one is repeated once exhausted.
+    """
+
+    def __init__(self, path: str, mode: str) -> None:
+        if mode not in ("record", "replay"):
+            raise ValueError(f"Unknown cassette mode {mode}")
+        self.path = path
+        self.mode = mode
+        self._lock = threading.Lock()
+        self._entries: Dict[str, List[Dict[str, Any]]] = {}
+        self._cursor: Dict[str, int] = {}
+        self.num_recorded = 0
+        self.num_replayed = 0
+        self.num_divergent = 0
+        self.divergent: List[Dict[str, Any]] = []
+        if mode == "replay":
+            with open(path, "rb") as f:
+                for line in f:
+                    entry = orjson.loads(line)
+                    self._entries.setdefault(entry["key"], []).append(entry)
+            logger.info(
+                f"SYS-Replaying {sum(len(e) for e in self._entries.values())} exchanges from {path}"
+            )
+        else:
+            ensure_path(os.path.dirname(os.path.abspath(path)))
+            if os.path.exists(path):
+                logger.warning(f"SYS-Cassette {path} exists, appending new exchanges")
+            logger.info(f"SYS-Recording HTTP exchanges into {path}")
+
+    def record(self, request: httpx.Request, response: httpx.Response, body: bytes) -> None:
+        entry = {
+            "key": request_key(request),
+            "method": request.method,
+            "url": str(request.url),
+            "status_code": response.status_code,
+            "headers": list(response.headers.multi_items()),
+            "body": base64.b64encode(body).decode("ascii"),
+        }
+        line = orjson.dumps(entry)
+        with self._lock:
+            with open(self.path, "ab") as f:
+                f.write(line + b"\n")
+            self.num_recorded += 1
+
+    def replay(self, request: httpx.Request) -> httpx.Response:
+        key = request_key(request)
+        with self._lock:
+            entries = self._entries.get(key)
+            if not entries:
+                self.num_divergent += 1
+                if len(self.divergent) < MAX_DIVERGENT_SAMPLES:
+                    self.divergent.append(
+                        {
+                            "method": request.method,
+                            "url": str(request.url),
+                            "body": request.content[:200].decode("utf-8", "replace"),
+                        }
+                    )
+                logger.error(
+                    f"SYS-Request {request.method} {request.url} is not in cassette {self.path}"
+                )
+                return httpx.Response(
+                    404,
+                    json={"error": {"message": "request not found in cassette"}},
+                    request=request,
+                )
+            cursor = self._cursor.get(key, 0)
+            entry = entries[min(cursor, len(entries) - 1)]
+            self._cursor[key] = cursor + 1
+            self.num_replayed += 1
+        return httpx.Response(
+            entry["status_code"],
+            headers=[(k, v) for k, v in entry["headers"]],
+            stream=httpx.ByteStream(base64.b64decode(entry["body"])),
+            request=request,
+        )
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "path": self.path,
+                "mode": self.mode,
+                "recorded": self.num_recorded,
+                "replayed": self.num_replayed,
+                "divergent": self.num_divergent,
+                "divergent_samples": list(self.divergent),
+                "unused_keys": sum(
+                    1 for key in self._entries if key not in self._cursor
+                ),
+            }
+
+    def save(self, path: str, file_name: str) -> None:
+        ensure_path(path)
+        with open(os.path.join(path, file_name), "w") as f:
+            f.write(orjson.dumps(self.to_dict(), option=orjson.OPT_INDENT_2).decode())
+        logger.info(f"SYS-Cassette stats saved to {os.path.join(path, file_name)}")
+
+
+class RecordingTransport(httpx.BaseTransport):
+    def __init__(self, transport: httpx.BaseTransport, cassette: Cassette) -> None:
+        self._transport = transport
+        self.cassette = cassette
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        response = self._transport.handle_request(request)
+        # keep the raw (still encoded) body so that replay decodes it the same way
+        try:
+            body = b"".join(response.stream)  # type: ignore
+        finally:
+            response.close()
+        self.cassette.record(request, response, body)
+        return httpx.Response(
+            response.status_code,
+            headers=response.headers,
+            stream=httpx.ByteStream(body),
+            extensions=response.extensions,
+            request=request,
+        )
+
+    def close(self) -> None:
+        self._transport.close()
+
+
+class ReplayTransport(httpx.BaseTransport):
+    def __init__(self, cassette: Cassette) -> None:
+        self.cassette = cassette
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        return self.cassette.replay(request)
@@ -22,6 +22,8 @@ from .prompt import (
     MultiAssetBasePromptConstructor,
     SingleAssetVLLMPromptConstructor,
     MultiAssetsVLLMPromptConstructor,
+    SingleAssetVLLMPrefixCachedPromptConstructor,
+    MultiAssetsVLLMPrefixCachedPromptConstructor,
     GuardrailPromptConstructor,
 )
 
@@ -54,6 +56,18 @@ def get_chat_model(
     logger.trace("SYS-Initializing chat model, prompt, and schema")
     
     inference_engine = chat_config.get("chat_model_inference_engine", "openai_compatible")
+    # static instructions first so that the server can reuse the cached prefix
+    prefix_cached = chat_config.get("prompt_layout", "default") == "prefix_cached"
+    single_asset_vllm_prompt = (
+        SingleAssetVLLMPrefixCachedPromptConstructor
+        if prefix_cached
+        else SingleAssetVLLMPromptConstructor
+    )
+    multi_assets_vllm_prompt = (
+        MultiAssetsVLLMPrefixCachedPromptConstructor
+        if prefix_cached
+        else MultiAssetsVLLMPromptConstructor
+    )
     
     # 新的统一OpenAI兼容接口 (推荐使用)
     if inference_engine == "openai_compatible" or inference_engine == "unified":
@@ -68,7 +82,7 @@ def get_chat_model(
             return (
                 MultiAssetsVLLMStructureGenerationSchema(),  # 使用现有的schema
                 MultiAssetsOpenAICompatibleGeneration(chat_config=chat_config),
-                MultiAssetsVLLMPromptConstructor(),  # 使用现有的prompt构造器
+                multi_assets_vllm_prompt(),  # 使用现有的prompt构造器
             )
     
     # 保留原有的VLLM直接调用方式（向后兼容）
@@ -78,13 +92,13 @@ def get_chat_model(
             return (
                 SingleAssetVLLMStructureGenerationSchema(),
                 SingleAssetVLLMStructureGeneration(chat_config=chat_config),
-                SingleAssetVLLMPromptConstructor(),
+                single_asset_vllm_prompt(),
             )
         else:
             return (
                 MultiAssetsVLLMStructureGenerationSchema(),
                 MultiAssetsVLLMStructureGeneration(chat_config=chat_config),
-                MultiAssetsVLLMPromptConstructor(),
+                multi_assets_vllm_prompt(),
             )
     
     # 保留原有的OpenAI Guardrails方式（向后兼容）
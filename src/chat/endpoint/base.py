@@ -79,6 +79,12 @@ class SingleAssetStructuredGenerationChatEndPoint(ABC):
     ]:
         pass
 
+    def close(self) -> None:
+        pass
+
+    def usage_report(self) -> Dict[str, Any]:
+        return {}
+
 
 class MultiAssetsStructuredGenerationChatEndPoint(ABC):
     @abstractmethod
@@ -92,3 +98,9 @@ class MultiAssetsStructuredGenerationChatEndPoint(ABC):
         MultiAssetsStructureGenerationFailure, MultiAssetsStructureOutputResponse
     ]:
         pass
+
+    def close(self) -> None:
+        pass
+
+    def usage_report(self) -> Dict[str, Any]:
+        return {}
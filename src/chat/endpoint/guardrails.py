@@ -3,9 +3,9 @@ import os
 from typing import Any, Callable, Dict, Tuple, Union
 
 import guardrails as gd
-import httpx
 from loguru import logger
 
+from ...transport import transport_registry
 from .base import (
     SingleAssetStructuredGenerationChatEndPoint as StructuredGenerationChatEndPoint,
 )
@@ -29,9 +29,15 @@ class BaseGuardRailStructureGeneration(StructuredGenerationChatEndPoint):
         self.endpoint = chat_config["chat_endpoint"]
         self.chat_request_timeout = chat_config["chat_request_timeout"]
         self.chat_parameters = chat_config["chat_parameters"]
+        self.http_client = transport_registry.acquire(
+            self.endpoint, chat_config.get("chat_http", {})
+        )
 
         self.chat_end_point_func = self.endpoint_func()
 
+    def close(self) -> None:
+        transport_registry.release(self.endpoint)
+
     def endpoint_func(self) -> Callable[[str], str]:
         raise NotImplementedError("This method should be overridden by subclasses.")
 
@@ -117,10 +123,12 @@ class ClaudeGuardRailStructureGeneration(BaseGuardRailStructureGeneration):
                 **self.chat_parameters,
             }
             logger.info("LLM API Request sent")
-            with httpx.Client(timeout=self.chat_request_timeout) as client:
-                response = client.post(
-                    url=self.endpoint, headers=self.headers, json=request_data
-                )
+            response = self.http_client.post(
+                url=self.endpoint,
+                headers=self.headers,
+                json=request_data,
+                timeout=self.chat_request_timeout,
+            )
             if response.status_code != 200:
                 logger.error(
                     f"LLM API Request failed with status code {response.status_code}"
@@ -167,10 +175,12 @@ class GPTGuardRailStructureGeneration(BaseGuardRailStructureGeneration):
                     ],
                 }
             logger.info("LLM API Request sent")
-            with httpx.Client(timeout=self.chat_request_timeout) as client:
-                response = client.post(
-                    url=self.endpoint, headers=self.headers, json=request_data
-                )
+            response = self.http_client.post(
+                url=self.endpoint,
+                headers=self.headers,
+                json=request_data,
+                timeout=self.chat_request_timeout,
+            )
             if response.status_code != 200:
                 logger.error(
                     f"LLM API Request failed with status code {response.status_code}"
@@ -4,12 +4,15 @@ OpenAI兼容的统一LLM客户端
 """
 
 import json
-from typing import Any, Dict, List, Union
+from typing import Any, Callable, Dict, List, Union
 
 from openai import OpenAI
 from loguru import logger
 
+from ...instrumentation import UsageStats
 from ...portfolio import TradeAction
+from ...response_cache import ResponseCache, get_response_cache
+from ...transport import transport_registry
 
 # 为了避免guardrails导入问题，直接从base导入
 try:
@@ -54,25 +57,40 @@ from config import get_model_config
 class OpenAICompatibleClient:
     """OpenAI兼容的统一客户端"""
     
-    def __init__(self, model_name: str):
+    def __init__(self, 
+                 model_name: str, 
+                 http_config: Dict[str, Any] = None,
+                 response_cache: ResponseCache = None):
         """初始化客户端
         
         Args:
             model_name: 模型名称，必须在config.py中定义
+            http_config: 连接池与重试设置, 同一api_base只在第一次创建时生效
+            response_cache: 可选的磁盘响应缓存, 相同请求直接返回缓存内容
         """
         self.model_config = get_model_config(model_name)
         self.model_name = model_name
+        self.response_cache = response_cache
+        # token usage, prefix cache hits show up as cached_tokens
+        self.usage = UsageStats()
         
-        # 创建OpenAI客户端
+        # 创建OpenAI客户端, 连接池和重试由共享的transport负责
         self.client = OpenAI(
             api_key=self.model_config["api_key"],
-            base_url=self.model_config["api_base"]
+            base_url=self.model_config["api_base"],
+            http_client=transport_registry.acquire(
+                self.model_config["api_base"], http_config
+            ),
+            max_retries=0,
         )
         
         logger.trace(f"OpenAI兼容客户端初始化: {model_name}")
         logger.trace(f"API Base: {self.model_config['api_base']}")
         logger.trace(f"Provider: {self.model_config.get('provider', 'unknown')}")
         
+    def close(self) -> None:
+        transport_registry.release(self.model_config["api_base"])
+        
     def chat_completion(self, 
                        messages: List[Dict[str, str]], 
                        max_tokens: int = 1000,
@@ -107,6 +125,7 @@ class OpenAICompatibleClient:
             
             # 调用API
             response = self.client.chat.completions.create(**request_params)
+            self.usage.record(response.usage.model_dump() if response.usage else None)
             
             # 提取响应内容
             content = response.choices[0].message.content
@@ -123,6 +142,7 @@ class OpenAICompatibleClient:
                                 schema: Dict = None,
                                 max_tokens: int = 1000,
                                 temperature: float = 0.6,
+                                validate: Callable[[Dict], Any] = None,
                                 **kwargs) -> Dict:
         """支持JSON响应格式的聊天完成
         
@@ -131,6 +151,7 @@ class OpenAICompatibleClient:
             schema: JSON schema（如果支持的话）
             max_tokens: 最大生成token数
             temperature: 温度参数
+            validate: 可选的结果校验, 抛出异常表示无效; 只有直接解析成功且通过校验的响应才写入缓存
             **kwargs: 其他参数
             
         Returns:
@@ -177,9 +198,19 @@ class OpenAICompatibleClient:
             logger.trace(f"发送API请求参数: {list(request_params.keys())}")
             logger.trace(f"请求参数详情: {request_params}")
             
-            # 调用API
-            response = self.client.chat.completions.create(**request_params)
-            content = response.choices[0].message.content
+            # 调用API, 命中缓存时跳过请求
+            cache_key = None
+            content = None
+            if self.response_cache is not None:
+                cache_key = self.response_cache.key({**request_params, "schema": schema})
+                cached = self.response_cache.get(cache_key)
+                if cached is not None:
+                    content = cached["content"]
+                    cache_key = None
+            if content is None:
+                response = self.client.chat.completions.create(**request_params)
+                self.usage.record(response.usage.model_dump() if response.usage else None)
+                content = response.choices[0].message.content
             
             # 解析JSON
             try:
@@ -194,6 +225,9 @@ class OpenAICompatibleClient:
                 if "investment_decision" in result and isinstance(result["investment_decision"], str):
                     result["investment_decision"] = result["investment_decision"].lower()
                 
+                # 修复或fallback的响应不缓存, 否则之后每次运行都会重放
+                if cache_key is not None and self._is_valid(result, validate):
+                    self.response_cache.put(cache_key, {"content": content})
                 return result
             except json.JSONDecodeError:
                 logger.warning(f"JSON解析失败，尝试修复: {self.model_name}")
@@ -223,6 +257,18 @@ class OpenAICompatibleClient:
             }
 
 
+    @staticmethod
+    def _is_valid(result: Dict, validate: Callable[[Dict], Any] = None) -> bool:
+        if validate is None:
+            return True
+        try:
+            validate(result)
+        except Exception as e:
+            logger.warning(f"响应未通过校验, 不写入缓存: {e}")
+            return False
+        return True
+
+
 class SingleAssetOpenAICompatibleGeneration(SingleAssetStructuredGenerationChatEndPoint):
     """单资产OpenAI兼容结构化生成"""
     
@@ -237,9 +283,30 @@ class SingleAssetOpenAICompatibleGeneration(SingleAssetStructuredGenerationChatE
         self.system_message = chat_config.get("chat_system_message", "You are a helpful assistant.")
         
         # 初始化OpenAI兼容客户端
-        self.client = OpenAICompatibleClient(self.model_name)
+        self.response_cache = get_response_cache(chat_config)
+        self.client = OpenAICompatibleClient(
+            self.model_name,
+            http_config=chat_config.get("chat_http", {}),
+            response_cache=self.response_cache,
+        )
         
         logger.trace(f"单资产生成器初始化完成: {self.model_name}")
+
+    def close(self) -> None:
+        self.client.close()
+
+    def usage_report(self) -> Dict[str, Any]:
+        return self.client.usage.to_dict()
+    
+    @staticmethod
+    def _to_response(response_dict: Dict[str, Any]) -> SingleAssetStructureOutputResponse:
+        # 处理内存ID去重
+        for memory_type in ["short_memory_ids", "mid_memory_ids", "long_memory_ids", "reflection_memory_ids"]:
+            if memory_type in response_dict and response_dict[memory_type]:
+                response_dict[memory_type] = list(set(response_dict[memory_type]))
+        
+        # 创建Pydantic响应对象
+        return SingleAssetStructureOutputResponse(**response_dict)
     
     def __call__(
         self, prompt: str, schema: Any
@@ -268,16 +335,11 @@ class SingleAssetOpenAICompatibleGeneration(SingleAssetStructuredGenerationChatE
                 messages=messages,
                 schema=schema,
                 max_tokens=self.max_tokens,
+                validate=self._to_response,
                 **self.parameters
             )
             
-            # 处理内存ID去重
-            for memory_type in ["short_memory_ids", "mid_memory_ids", "long_memory_ids", "reflection_memory_ids"]:
-                if memory_type in response_dict and response_dict[memory_type]:
-                    response_dict[memory_type] = list(set(response_dict[memory_type]))
-            
-            # 创建Pydantic响应对象
-            response_pydantic = SingleAssetStructureOutputResponse(**response_dict)
+            response_pydantic = self._to_response(response_dict)
             logger.trace("单资产结构化响应生成成功")
             
             return response_pydantic
@@ -301,9 +363,71 @@ class MultiAssetsOpenAICompatibleGeneration(MultiAssetsStructuredGenerationChatE
         self.system_message = chat_config.get("chat_system_message", "You are a helpful assistant.")
         
         # 初始化OpenAI兼容客户端
-        self.client = OpenAICompatibleClient(self.model_name)
+        self.response_cache = get_response_cache(chat_config)
+        self.client = OpenAICompatibleClient(
+            self.model_name,
+            http_config=chat_config.get("chat_http", {}),
+            response_cache=self.response_cache,
+        )
         
         logger.trace(f"多资产生成器初始化完成: {self.model_name}")
+
+    def close(self) -> None:
+        self.client.close()
+
+    def usage_report(self) -> Dict[str, Any]:
+        return self.client.usage.to_dict()
+    
+    @staticmethod
+    def _to_response(
+        response_dict: Dict[str, Any], symbols: List[str]
+    ) -> MultiAssetsStructureOutputResponse:
+        # 解析多资产响应格式
+        summary_reason = {
+            symbol: response_dict["symbols_summary"][f"{symbol}_summary_reason"]
+            for symbol in symbols
+            if f"{symbol}_summary_reason" in response_dict.get("symbols_summary", {})
+        }
+        
+        investment_decision = {
+            symbol: response_dict["symbols_summary"].get(f"{symbol}_investment_decision", TradeAction.HOLD)
+            for symbol in symbols
+        }
+        
+        # 处理各种内存ID
+        short_memory_ids = {
+            symbol: list(set(response_dict.get(f"{symbol}_short_memory_ids", [])))
+            for symbol in symbols
+            if f"{symbol}_short_memory_ids" in response_dict
+        }
+        
+        mid_memory_ids = {
+            symbol: list(set(response_dict.get(f"{symbol}_mid_memory_ids", [])))
+            for symbol in symbols
+            if f"{symbol}_mid_memory_ids" in response_dict
+        }
+        
+        long_memory_ids = {
+            symbol: list(set(response_dict.get(f"{symbol}_long_memory_ids", [])))
+            for symbol in symbols
+            if f"{symbol}_long_memory_ids" in response_dict
+        }
+        
+        reflection_memory_ids = {
+            symbol: list(set(response_dict.get(f"{symbol}_reflection_memory_ids", [])))
+            for symbol in symbols
+            if f"{symbol}_reflection_memory_ids" in response_dict
+        }
+        
+        # 创建响应对象
+        return MultiAssetsStructureOutputResponse(
+            investment_decision=investment_decision,
+            summary_reason=summary_reason,
+            short_memory_ids=short_memory_ids,
+            mid_memory_ids=mid_memory_ids,
+            long_memory_ids=long_memory_ids,
+            reflection_memory_ids=reflection_memory_ids,
+        )
     
     def __call__(
         self, prompt: str, schema: Any, symbols: List[str]
@@ -332,55 +456,11 @@ class MultiAssetsOpenAICompatibleGeneration(MultiAssetsStructuredGenerationChatE
                 messages=messages,
                 schema=schema,
                 max_tokens=self.max_tokens,
+                validate=lambda d: self._to_response(d, symbols),
                 **self.parameters
             )
             
-            # 解析多资产响应格式
-            summary_reason = {
-                symbol: response_dict["symbols_summary"][f"{symbol}_summary_reason"]
-                for symbol in symbols
-                if f"{symbol}_summary_reason" in response_dict.get("symbols_summary", {})
-            }
-            
-            investment_decision = {
-                symbol: response_dict["symbols_summary"].get(f"{symbol}_investment_decision", TradeAction.HOLD)
-                for symbol in symbols
-            }
-            
-            # 处理各种内存ID
-            short_memory_ids = {
-                symbol: list(set(response_dict.get(f"{symbol}_short_memory_ids", [])))
-                for symbol in symbols
-                if f"{symbol}_short_memory_ids" in response_dict
-            }
-            
-            mid_memory_ids = {
-                symbol: list(set(response_dict.get(f"{symbol}_mid_memory_ids", [])))
-                for symbol in symbols
-                if f"{symbol}_mid_memory_ids" in response_dict
-            }
-            
-            long_memory_ids = {
-                symbol: list(set(response_dict.get(f"{symbol}_long_memory_ids", [])))
-                for symbol in symbols
-                if f"{symbol}_long_memory_ids" in response_dict
-            }
-            
-            reflection_memory_ids = {
-                symbol: list(set(response_dict.get(f"{symbol}_reflection_memory_ids", [])))
-                for symbol in symbols
-                if f"{symbol}_reflection_memory_ids" in response_dict
-            }
-            
-            # 创建响应对象
-            return MultiAssetsStructureOutputResponse(
-                investment_decision=investment_decision,
-                summary_reason=summary_reason,
-                short_memory_ids=short_memory_ids,
-                mid_memory_ids=mid_memory_ids,
-                long_memory_ids=long_memory_ids,
-                reflection_memory_ids=reflection_memory_ids,
-            )
+            return self._to_response(response_dict, symbols)
             
         except Exception as e:
             logger.error(f"多资产结构化生成失败: {str(e)}")
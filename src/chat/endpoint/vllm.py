@@ -1,13 +1,15 @@
 import json
-from typing import Any, Dict, List, Union
+from typing import Any, Dict, List, Tuple, Union
 
-import httpx
 import json_repair
-from httpx import ConnectError
+from httpx import HTTPError
 from loguru import logger
 from pydantic import ValidationError
 
+from ...instrumentation import UsageStats
 from ...portfolio import TradeAction
+from ...replica_pool import ReplicaPool
+from ...response_cache import get_response_cache
 from .base import (
     MultiAssetsStructuredGenerationChatEndPoint,
     MultiAssetsStructureGenerationFailure,
@@ -22,11 +24,47 @@ class VLLMConnectionError(Exception):
     pass
 
 
-class SingleAssetVLLMStructureGeneration(SingleAssetStructuredGenerationChatEndPoint):
+def scrape_prefix_cache_metrics(
+    client: Any, request_url: str, timeout: float
+) -> Dict[str, Any]:
+    """
+    Prefix cache counters from the Prometheus endpoint of vLLM; newer versions
+    export hit and query totals, older ones a hit rate gauge.
+    """
+    try:
+        response = client.get(url=f"{request_url}/metrics", timeout=timeout)
+    except HTTPError as e:
+        logger.warning(f"CHAT-VLLM could not read metrics: {e}")
+        return {}
+    if response.status_code != 200:
+        return {}
+    hits, queries, hit_rate = 0.0, 0.0, None
+    for line in response.text.splitlines():
+        if (not line) or line.startswith("#"):
+            continue
+        name, _, value = line.rpartition(" ")
+        metric = name.split("{")[0]
+        if metric.endswith("prefix_cache_hits_total"):
+            hits += float(value)
+        elif metric.endswith("prefix_cache_queries_total"):
+            queries += float(value)
+        elif metric.endswith("prefix_cache_hit_rate"):
+            hit_rate = float(value)
+    if queries:
+        return {"hits": hits, "queries": queries, "hit_rate": hits / queries}
+    if hit_rate is not None:
+        return {"hit_rate": hit_rate}
+    return {}
+
+
+class VLLMEndpointMixin:
+    """Connection, response cache and usage shared by the single and multi asset endpoints."""
+
     def __init__(self, chat_config: Dict[str, Any]) -> None:
         logger.trace("CHAT-VLLM chat model initializing")
         self.chat_config = chat_config
         self.header = {"accept": "application/json", "Content-Type": "application/json"}
+        # one url or a list of replicas serving the same model
         self.request_url = chat_config["chat_vllm_endpoint"]
         logger.trace(f"CHAT-VLLM chat model endpoint: {self.request_url}")
         self.chat_model = chat_config["chat_model"]
@@ -48,17 +86,75 @@ class SingleAssetVLLMStructureGeneration(SingleAssetStructuredGenerationChatEndP
         logger.trace(f"CHAT-VLLM chat request timeout: {self.chat_request_timeout}")
         self.chat_parameters = chat_config["chat_parameters"]
         logger.trace(f"CHAT-VLLM chat parameters: {self.chat_parameters}")
-        # check if vllm is alive otherwise raise an error
-        try:
-            with httpx.Client(timeout=self.chat_request_timeout) as client:
-                response = client.get(url=f"{self.request_url}/health")
-            if response.status_code != 200:
-                raise VLLMConnectionError("VLLM is not available")
-        except ConnectError as e:
+        self.replicas = ReplicaPool(
+            self.request_url,
+            chat_config.get("chat_replicas", {}),
+            chat_config.get("chat_http", {}),
+            chat_config.get("chat_hedging"),
+        )
+        self.response_cache = get_response_cache(chat_config)
+        self.usage = UsageStats()
+        # check if vllm is alive otherwise raise an error, dead replicas start ejected
+        if not self.replicas.check_health(self.chat_request_timeout):
+            self.replicas.close()
             raise VLLMConnectionError(
                 f"Failed to connect VLLM from {self.request_url}"
-            ) from e
+            )
+
+    def close(self) -> None:
+        self.replicas.close()
+
+    def usage_report(self) -> Dict[str, Any]:
+        return {
+            **self.usage.to_dict(),
+            "server_prefix_cache": {
+                replica.url: scrape_prefix_cache_metrics(
+                    replica.client, replica.url, self.chat_request_timeout
+                )
+                for replica in self.replicas.replicas
+            },
+            "replica_pool": self.replicas.to_dict(),
+        }
+
+    def _cached_post(
+        self, request_data: Dict[str, Any]
+    ) -> Tuple[Union[Dict[str, Any], None], Union[str, None]]:
+        """
+        Response json and the key to cache it under once it parsed; cache hits
+        come back without a key, so that only validated responses are stored.
+        """
+        cache_key = None
+        if self.response_cache is not None:
+            cache_key = self.response_cache.key(
+                {"endpoint": self.endpoint_suffix, **request_data}
+            )
+            response_json = self.response_cache.get(cache_key)
+            if response_json is not None:
+                return response_json, None
+        response = self.replicas.post(
+            self.endpoint_suffix,
+            headers=self.header,
+            json=request_data,
+            timeout=self.chat_request_timeout,
+        )
+        if response.status_code != 200:
+            logger.error(f"CHAT-VLLM response status code: {response.status_code}")
+            logger.error(f"CHAT-VLLM response text: {response.text}")
+            return None, None
+        response_json = response.json()
+        self.usage.record(response_json.get("usage"))
+        return response_json, cache_key
+
+    def _cache_response(
+        self, cache_key: Union[str, None], response_json: Dict[str, Any]
+    ) -> None:
+        if cache_key is not None:
+            self.response_cache.put(cache_key, response_json)  # type: ignore
 
+
+class SingleAssetVLLMStructureGeneration(
+    VLLMEndpointMixin, SingleAssetStructuredGenerationChatEndPoint
+):
     def __call__(
         self, prompt: str, schema: Any
     ) -> Union[
@@ -87,22 +183,15 @@ class SingleAssetVLLMStructureGeneration(SingleAssetStructuredGenerationChatEndP
                 },
                 **self.chat_parameters,
             }
-        with httpx.Client(timeout=self.chat_request_timeout) as client:
-            response = client.post(
-                url=f"{self.request_url}{self.endpoint_suffix}",
-                headers=self.header,
-                json=request_data,
-            )
-        if response.status_code != 200:
-            logger.error(f"CHAT-VLLM response status code: {response.status_code}")
-            logger.error(f"CHAT-VLLM response text: {response.json()}")
+        response_json, cache_key = self._cached_post(request_data)
+        if response_json is None:
             return SingleAssetStructureGenerationFailure()
         try:
             if self.chat_model_type == "completion":
-                response_dict = json.loads(response.json()["choices"][0]["text"])
+                response_dict = json.loads(response_json["choices"][0]["text"])
             else:
                 response_dict = json.loads(
-                    response.json()["choices"][0]["message"]["content"]
+                    response_json["choices"][0]["message"]["content"]
                 )
             if "short_memory_ids" in response_dict:
                 response_dict["short_memory_ids"] = list(
@@ -123,54 +212,21 @@ class SingleAssetVLLMStructureGeneration(SingleAssetStructuredGenerationChatEndP
             response_pydantic = SingleAssetStructureOutputResponse(**response_dict)
         except json.JSONDecodeError:
             logger.error("CHAT-VLLM json decoder error")
-            logger.error(f"CHAT-VLLM response text: {response.json()}")
+            logger.error(f"CHAT-VLLM response text: {response_json}")
             return SingleAssetStructureGenerationFailure()
         except ValidationError as e:
             logger.error("CHAT-VLLM pydantic validation error")
-            logger.error(f"CHAT-VLLM response text: {response.json()}")
+            logger.error(f"CHAT-VLLM response text: {response_json}")
             logger.error(f"CHAT-VLLM pydantic error: {e}")
             return SingleAssetStructureGenerationFailure()
 
+        self._cache_response(cache_key, response_json)
         return response_pydantic
 
 
-class MultiAssetsVLLMStructureGeneration(MultiAssetsStructuredGenerationChatEndPoint):
-    def __init__(self, chat_config: Dict[str, Any]) -> None:
-        logger.trace("CHAT-VLLM chat model initializing")
-        self.chat_config = chat_config
-        self.header = {"accept": "application/json", "Content-Type": "application/json"}
-        self.request_url = chat_config["chat_vllm_endpoint"]
-        logger.trace(f"CHAT-VLLM chat model endpoint: {self.request_url}")
-        self.chat_model = chat_config["chat_model"]
-        logger.trace(f"CHAT-VLLM chat model: {self.chat_model}")
-        self.chat_max_new_token = chat_config["chat_max_new_token"]
-        logger.trace(f"CHAT-VLLM chat max new token: {self.chat_max_new_token}")
-        self.chat_model_type = chat_config["chat_model_type"]
-        logger.trace(f"CHAT-VLLM chat model type: {self.chat_model_type}")
-        if self.chat_model_type == "completion":
-            logger.trace("CHAT-VLLM chat model type is completion")
-            self.endpoint_suffix = "/v1/completions"
-        else:
-            logger.trace("CHAT-VLLM chat model type is chat")
-            self.chat_system_message = chat_config["chat_system_message"]
-            logger.trace(f"CHAT-VLLM chat system message: {self.chat_system_message}")
-            self.endpoint_suffix = "/v1/chat/completions"
-        logger.trace(f"CHAT-VLLM chat model endpoint suffix: {self.endpoint_suffix}")
-        self.chat_request_timeout = chat_config["chat_request_timeout"]
-        logger.trace(f"CHAT-VLLM chat request timeout: {self.chat_request_timeout}")
-        self.chat_parameters = chat_config["chat_parameters"]
-        logger.trace(f"CHAT-VLLM chat parameters: {self.chat_parameters}")
-        # check if vllm is alive otherwise raise an error
-        try:
-            with httpx.Client(timeout=self.chat_request_timeout) as client:
-                response = client.get(url=f"{self.request_url}/health")
-            if response.status_code != 200:
-                raise VLLMConnectionError("VLLM is not available")
-        except ConnectError as e:
-            raise VLLMConnectionError(
-                f"Failed to connect VLLM from {self.request_url}"
-            ) from e
-
+class MultiAssetsVLLMStructureGeneration(
+    VLLMEndpointMixin, MultiAssetsStructuredGenerationChatEndPoint
+):
     def __call__(
         self, prompt: str, schema: Any, symbols: List[str]
     ) -> Union[
@@ -199,30 +255,23 @@ class MultiAssetsVLLMStructureGeneration(MultiAssetsStructuredGenerationChatEndP
                 },
                 **self.chat_parameters,
             }
-        with httpx.Client(timeout=self.chat_request_timeout) as client:
-            response = client.post(
-                url=f"{self.request_url}{self.endpoint_suffix}",
-                headers=self.header,
-                json=request_data,
-            )
-        if response.status_code != 200:
-            logger.error(f"CHAT-VLLM response status code: {response.status_code}")
-            logger.error(f"CHAT-VLLM response text: {response.json()}")
+        response_json, cache_key = self._cached_post(request_data)
+        if response_json is None:
             return MultiAssetsStructureGenerationFailure(
                 investment_decision={symbol: TradeAction.HOLD for symbol in symbols}
             )
         try:
             if self.chat_model_type == "completion":
-                response_dict = json.loads(response.json()["choices"][0]["text"])
+                response_dict = json.loads(response_json["choices"][0]["text"])
             else:
                 response_dict = json.loads(
-                    response.json()["choices"][0]["message"]["content"]
+                    response_json["choices"][0]["message"]["content"]
                 )
         except json.JSONDecodeError:
             logger.error("CHAT-VLLM json decoder error")
-            logger.error(f"CHAT-VLLM response text: {response.json()}")
+            logger.error(f"CHAT-VLLM response text: {response_json}")
             response_dict = json_repair.repair_json(
-                response.json()["choices"][0]["message"]["content"], return_objects=True
+                response_json["choices"][0]["message"]["content"], return_objects=True
             )
             if response_dict == "":
                 return MultiAssetsStructureGenerationFailure(
@@ -266,7 +315,7 @@ class MultiAssetsVLLMStructureGeneration(MultiAssetsStructuredGenerationChatEndP
                 for cur_symbol in symbols
                 if f"{cur_symbol}_reflection_memory_ids" in response_dict  # type: ignore
             }
-            return MultiAssetsStructureOutputResponse(
+            response_pydantic = MultiAssetsStructureOutputResponse(
                 investment_decision=investment_decision,  # type: ignore
                 summary_reason=summary_reason,
                 short_memory_ids=short_memory_ids,  # type: ignore
@@ -276,8 +325,11 @@ class MultiAssetsVLLMStructureGeneration(MultiAssetsStructuredGenerationChatEndP
             )
         except (ValidationError, KeyError) as e:
             logger.error("CHAT-VLLM pydantic validation error")
-            logger.error(f"CHAT-VLLM response text: {response.json()}")
+            logger.error(f"CHAT-VLLM response text: {response_json}")
             logger.error(f"CHAT-VLLM pydantic error: {e}")
             return MultiAssetsStructureGenerationFailure(
                 investment_decision={symbol: TradeAction.HOLD for symbol in symbols}
             )
+
+        self._cache_response(cache_key, response_json)
+        return response_pydantic
@@ -2,5 +2,7 @@ from .base import SingleAssetBasePromptConstructor, MultiAssetBasePromptConstruc
 from .vllm_prompt import (
     SingleAssetVLLMPromptConstructor,
     MultiAssetsVLLMPromptConstructor,
+    SingleAssetVLLMPrefixCachedPromptConstructor,
+    MultiAssetsVLLMPrefixCachedPromptConstructor,
 )
 from .guardrail import GuardrailPromptConstructor
@@ -143,6 +143,20 @@ etf_test_final_prompt = """Given the information, can you make an investment dec
     You also need to provide the ids of the information to support your decision."""
 
 
+ASSET_SYMBOLS = {
+    "stock": {"MSFT", "JNJ", "UVV", "HON", "TSLA", "AAPL", "NIO"},
+    "etf": {"ETF"},
+    "crypto": {"BTC", "ETH"},
+}
+
+
+def _asset_type(symbol: str) -> str:
+    for asset_type, symbols in ASSET_SYMBOLS.items():
+        if symbol in symbols:
+            return asset_type
+    raise ValueError(f"Invalid symbol: {symbol}")
+
+
 class SingleAssetVLLMPromptConstructor(SingleAssetBasePromptConstructor):
     @staticmethod
     def __call__(
@@ -160,16 +174,7 @@ class SingleAssetVLLMPromptConstructor(SingleAssetBasePromptConstructor):
         reflection_memory_id: Union[List[int], None],
         momentum: Union[int, None] = None,
     ) -> str:  # sourcery skip: low-code-quality
-        if symbol in {
-            "MSFT", "JNJ", "UVV", "HON", "TSLA", "AAPL", "NIO"
-        }:
-            asset_type = "stock"
-        elif symbol in {"ETF"}:
-            asset_type = "etf"
-        elif symbol in {"BTC", "ETH"}:
-            asset_type = "crypto"
-        else:
-            raise ValueError(f"Invalid symbol: {symbol}")
+        asset_type = _asset_type(symbol)
 
         if asset_type == "etf":
             investment_info = (
@@ -464,3 +469,188 @@ class MultiAssetsVLLMPromptConstructor(MultiAssetBasePromptConstructor):
             return investment_info + asset_test_final_prompt.format(
                 trading_symbols=symbols, cur_date=cur_date
             )
+
+
+# prefix-cache friendly layout: the static instructions come first so that
+# every day's prompt shares the same prefix, the dated content follows
+ASSET_PROMPTS = {
+    "stock": {
+        "warmup_prefix": stock_warmup_investment_info_prefix,
+        "test_prefix": stock_test_investment_info_prefix,
+        "sentiment": stock_sentiment_explanation,
+        "momentum": stock_momentum_explanation,
+        "warmup_final": stock_warmup_final_prompt,
+        "test_final": stock_test_final_prompt,
+    },
+    "etf": {
+        "warmup_prefix": etf_warmup_investment_info_prefix,
+        "test_prefix": etf_test_investment_info_prefix,
+        "sentiment": etf_sentiment_explanation,
+        "momentum": etf_momentum_explanation,
+        "warmup_final": etf_warmup_final_prompt,
+        "test_final": etf_test_final_prompt,
+    },
+    "crypto": {
+        "warmup_prefix": crypto_warmup_investment_info_prefix,
+        "test_prefix": crypto_test_investment_info_prefix,
+        "sentiment": crypto_sentiment_explanation,
+        "momentum": crypto_momentum_explanation,
+        "warmup_final": crypto_warmup_final_prompt,
+        "test_final": crypto_test_final_prompt,
+    },
+}
+variable_content_header = "\n\n---\nThe information:\n"
+
+
+def _format_memory_block(
+    title: str,
+    memory: Union[List[str], None],
+    memory_id: Union[List[int], None],
+    strip: bool = True,
+) -> str:
+    if not (memory and memory_id):
+        return ""
+    return (
+        f"{title}:\n"
+        + "\n".join(
+            f"{i}. {m.strip() if strip else m}" for i, m in zip(memory_id, memory)
+        )
+        + "\n\n"
+    )
+
+
+class SingleAssetVLLMPrefixCachedPromptConstructor(SingleAssetBasePromptConstructor):
+    @staticmethod
+    def __call__(
+        cur_date: date,
+        symbol: str,
+        run_mode: RunMode,
+        future_record: Union[float, None],
+        short_memory: Union[List[str], None],
+        short_memory_id: Union[List[int], None],
+        mid_memory: Union[List[str], None],
+        mid_memory_id: Union[List[int], None],
+        long_memory: Union[List[str], None],
+        long_memory_id: Union[List[int], None],
+        reflection_memory: Union[List[str], None],
+        reflection_memory_id: Union[List[int], None],
+        momentum: Union[int, None] = None,
+    ) -> str:
+        prompts = ASSET_PROMPTS[_asset_type(symbol)]
+        # static part, identical for every day of a run
+        static_prompt = (
+            (
+                prompts["warmup_final"]
+                if run_mode == RunMode.WARMUP
+                else prompts["test_final"]
+            )
+            + "\n\n"
+            + prompts["sentiment"]
+            + "\n"
+            + prompts["momentum"]
+        )
+        # dated part
+        if run_mode == RunMode.WARMUP:
+            investment_info = prompts["warmup_prefix"].format(
+                symbol=symbol, cur_date=cur_date, future_record=future_record
+            )
+        else:
+            investment_info = (
+                prompts["test_prefix"].format(symbol=symbol, cur_date=cur_date) + "\n\n"
+            )
+        investment_info += _format_memory_block(
+            "The short-term information", short_memory, short_memory_id
+        )
+        investment_info += _format_memory_block(
+            "The mid-term information", mid_memory, mid_memory_id
+        )
+        investment_info += _format_memory_block(
+            "The long-term information", long_memory, long_memory_id
+        )
+        investment_info += _format_memory_block(
+            "The reflection-term information",
+            reflection_memory,
+            reflection_memory_id,
+            strip=False,
+        )
+        if momentum:
+            investment_info = _add_momentum_info(momentum, investment_info)
+        return static_prompt + variable_content_header + investment_info
+
+
+class MultiAssetsVLLMPrefixCachedPromptConstructor(MultiAssetBasePromptConstructor):
+    @staticmethod
+    def __call__(
+        cur_date: date,
+        symbols: List[str],
+        run_mode: RunMode,
+        future_record: Dict[str, Union[float, None]],
+        short_memory: Dict[str, Union[List[str], None]],
+        short_memory_id: Dict[str, Union[List[int], None]],
+        mid_memory: Dict[str, Union[List[str], None]],
+        mid_memory_id: Dict[str, Union[List[int], None]],
+        long_memory: Dict[str, Union[List[str], None]],
+        long_memory_id: Dict[str, Union[List[int], None]],
+        reflection_memory: Dict[str, Union[List[str], None]],
+        reflection_memory_id: Dict[str, Union[List[int], None]],
+        momentum: Dict[str, Union[int, None]],
+    ) -> str:
+        # static part, the date is left to the dated part
+        static_prompt = (
+            (
+                asset_warmup_final_prompt
+                if run_mode == RunMode.WARMUP
+                else asset_test_final_prompt
+            ).format(trading_symbols=symbols, cur_date="the current date")
+            + "\n\n"
+            + asset_sentiment_explanation
+            + "\n"
+            + asset_momentum_explanation
+        )
+        # dated part
+        if run_mode == RunMode.WARMUP:
+            investment_info = asset_warmup_investment_info_prefix.format(
+                trading_symbols=symbols, cur_date=cur_date
+            )
+            for symbol in symbols:
+                investment_info += (
+                    asset_warmup_price_diff.format(
+                        symbol=symbol, future_record=future_record[symbol]
+                    )
+                    + "\n"
+                )
+            investment_info += "\n"
+        else:
+            investment_info = (
+                asset_test_investment_info_prefix.format(
+                    trading_symbols=symbols, cur_date=cur_date
+                )
+                + "\n\n"
+            )
+        for symbol in symbols:
+            investment_info += _format_memory_block(
+                f"The short-term information for {symbol}",
+                short_memory[symbol],
+                short_memory_id[symbol],
+            )
+            investment_info += _format_memory_block(
+                f"The mid-term information for {symbol}",
+                mid_memory[symbol],
+                mid_memory_id[symbol],
+            )
+            investment_info += _format_memory_block(
+                f"The long-term information for {symbol}",
+                long_memory[symbol],
+                long_memory_id[symbol],
+            )
+            investment_info += _format_memory_block(
+                f"The reflection-term information for {symbol}",
+                reflection_memory[symbol],
+                reflection_memory_id[symbol],
+                strip=False,
+            )
+            if momentum and momentum[symbol]:
+                investment_info += f"For {symbol}: "
+                investment_info = _add_momentum_info(momentum[symbol], investment_info)  # type: ignore
+                investment_info += "\n"
+        return static_prompt + variable_content_header + investment_info
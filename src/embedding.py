@@ -1,6 +1,8 @@
 # 为了向后兼容，保留原始接口
 # 但现在使用统一的配置系统
 
+from typing import Any, Dict
+
 from .embedding_unified import (
     EmbeddingModel,
     UnifiedOpenAIEmbedding,
@@ -12,3 +14,20 @@ from .embedding_unified import (
 # 为了向后兼容，重新导出为原来的名称
 OpenAIEmbedding = UnifiedOpenAIEmbedding
 OpenAIEmbeddingError = UnifiedEmbeddingError
+
+
+def get_embedding_model(emb_config: Dict[str, Any]) -> EmbeddingModel:
+    """根据emb_config["emb_backend"]选择Embedding后端, 默认为OpenAI兼容接口"""
+    backend = emb_config.get("emb_backend", "openai")
+    if backend == "openai":
+        return UnifiedOpenAIEmbedding(emb_config=emb_config)
+    elif backend == "hashing":
+        from .embedding_local import HashingEmbedding
+
+        return HashingEmbedding(emb_config=emb_config)
+    elif backend == "sentence_transformers":
+        from .embedding_local import SentenceTransformerEmbedding
+
+        return SentenceTransformerEmbedding(emb_config=emb_config)
+    else:
+        raise ValueError(f"Unknown embedding backend: {backend}")
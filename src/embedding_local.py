@@ -0,0 +1,98 @@
+"""
+本地CPU Embedding后端, 用于离线运行和性能测试
+"""
+
+import functools
+import hashlib
+import re
+from typing import Any, Dict, List, Union
+
+import numpy as np
+from loguru import logger
+
+from .embedding_unified import EmbeddingModel
+
+try:
+    from sentence_transformers import SentenceTransformer
+except ImportError:
+    SentenceTransformer = None
+
+TOKEN_PATTERN = re.compile(r"\w+")
+
+
+class HashingEmbedding(EmbeddingModel):
+    """确定性的特征哈希Embedding, 不需要模型文件和网络
+
+    词和相邻词对被哈希到emb_size维并带符号累加, 再做L2归一化。
+    语义能力很弱, 但词面相近的文本仍然相近, 适合吞吐测试和CI。
+    """
+
+    def __init__(self, emb_config: Dict[str, Any]) -> None:
+        self.config = emb_config
+        self.emb_size = emb_config["emb_size"]
+        # 词表不封闭, 缓存需要有上限
+        self._feature = functools.lru_cache(
+            maxsize=emb_config.get("hashing_cache_size", 65536)
+        )(self._hash_feature)
+        logger.trace(f"本地哈希Embedding初始化, 维度: {self.emb_size}")
+
+    def _hash_feature(self, token: str) -> tuple:
+        h = int.from_bytes(
+            hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest(), "big"
+        )
+        return (h % self.emb_size, 1.0 if h >> 63 else -1.0)
+
+    def __call__(self, texts: Union[List[str], str]) -> np.ndarray:
+        if isinstance(texts, str):
+            texts = [texts]
+        embeddings = np.zeros((len(texts), self.emb_size), dtype=np.float32)
+        for i, text in enumerate(texts):
+            tokens = TOKEN_PATTERN.findall(text.lower())
+            features = tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+            for token in features:
+                col, sign = self._feature(token)
+                embeddings[i, col] += sign
+        norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+        return embeddings / np.maximum(norms, 1e-12)
+
+
+class SentenceTransformerEmbedding(EmbeddingModel):
+    """本地sentence-transformers模型, 每个进程只加载一次"""
+
+    _models: Dict[str, Any] = {}
+
+    def __init__(self, emb_config: Dict[str, Any]) -> None:
+        if SentenceTransformer is None:
+            raise ImportError(
+                "sentence-transformers is required for the sentence_transformers embedding backend"
+            )
+        self.config = emb_config
+        self.model_path = emb_config["local_model_path"]
+        self.device = emb_config.get("local_device", "cpu")
+        self.batch_size = emb_config.get("local_batch_size", 32)
+        cache_key = f"{self.model_path}@{self.device}"
+        if cache_key not in self._models:
+            logger.info(f"SYS-Loading local embedding model {self.model_path} on {self.device}")
+            self._models[cache_key] = SentenceTransformer(
+                self.model_path, device=self.device
+            )
+        self.model = self._models[cache_key]
+        model_dim = self.model.get_sentence_embedding_dimension()
+        if model_dim != emb_config["emb_size"]:
+            raise ValueError(
+                f"Local model {self.model_path} has dimension {model_dim}, emb_size is {emb_config['emb_size']}"
+            )
+
+    def __call__(self, texts: Union[List[str], str]) -> np.ndarray:
+        if isinstance(texts, str):
+            texts = [texts]
+        return np.asarray(
+            self.model.encode(
+                texts,
+                batch_size=self.batch_size,
+                convert_to_numpy=True,
+                normalize_embeddings=True,
+                show_progress_bar=False,
+            ),
+            dtype=np.float32,
+        )
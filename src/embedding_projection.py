@@ -0,0 +1,175 @@
+import os
+from typing import Any, Dict, List, Literal, Union
+
+import numpy as np
+import orjson
+from loguru import logger
+
+from .utils import ensure_path
+
+# rows used to fit the PCA basis, more adds little for a few hundred components
+PCA_FIT_MAX_ROWS = 20000
+
+
+class EmbeddingProjection:
+    """
+    Map full-size embeddings to a smaller storage dimension.
+
+    ``truncate`` keeps the leading dimensions, which is how Matryoshka-trained
+    models (e.g. text-embedding-3) are meant to be shortened. ``pca`` projects
+    onto the top principal components fitted on a corpus.
+    """
+
+    def __init__(
+        self,
+        method: Literal["truncate", "pca"],
+        dim: int,
+        mean: Union[np.ndarray, None] = None,
+        components: Union[np.ndarray, None] = None,
+    ) -> None:
+        if method not in ("truncate", "pca"):
+            raise ValueError(f"Unknown projection method: {method}")
+        if method == "pca" and (mean is None or components is None):
+            raise ValueError("pca projection needs to be fitted before use")
+        self.method = method
+        self.dim = dim
+        self.mean = mean
+        self.components = components
+
+    @staticmethod
+    def max_dim(embeddings: np.ndarray, method: Literal["truncate", "pca"]) -> int:
+        """Largest dim a projection fitted on ``embeddings`` can produce."""
+        if method == "truncate":
+            return embeddings.shape[1]
+        # pca has at most one component per fitted row
+        return min(len(embeddings), PCA_FIT_MAX_ROWS, embeddings.shape[1])
+
+    @classmethod
+    def fit(
+        cls,
+        embeddings: np.ndarray,
+        method: Literal["truncate", "pca"],
+        dim: int,
+        seed: int = 0,
+    ) -> "EmbeddingProjection":
+        max_dim = cls.max_dim(embeddings, method)
+        if dim > max_dim:
+            raise ValueError(
+                f"Cannot fit a {method} projection to dim {dim} on {len(embeddings)} embeddings of size {embeddings.shape[1]}, at most {max_dim}"
+            )
+        if method == "truncate":
+            return cls(method=method, dim=dim)
+        if len(embeddings) > PCA_FIT_MAX_ROWS:
+            rows = np.random.default_rng(seed).choice(
+                len(embeddings), PCA_FIT_MAX_ROWS, replace=False
+            )
+            embeddings = embeddings[np.sort(rows)]
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        mean = embeddings.mean(axis=0)
+        _, _, vt = np.linalg.svd(embeddings - mean, full_matrices=False)
+        logger.info(f"SYS-Fitted PCA projection on {len(embeddings)} embeddings")
+        return cls(method=method, dim=dim, mean=mean, components=vt[:dim])
+
+    def __call__(self, embeddings: np.ndarray) -> np.ndarray:
+        if self.method == "truncate":
+            projected = embeddings[:, : self.dim]
+        else:
+            projected = (embeddings - self.mean) @ self.components.T  # type: ignore
+        return np.ascontiguousarray(projected, dtype=np.float32)
+
+    def save(self, path: str) -> None:
+        ensure_path(path)
+        with open(os.path.join(path, "projection.json"), "w") as f:
+            f.write(orjson.dumps({"method": self.method, "dim": self.dim}).decode())
+        if self.method == "pca":
+            np.savez(
+                os.path.join(path, "projection.npz"),
+                mean=self.mean,  # type: ignore
+                components=self.components,  # type: ignore
+            )
+        logger.info(f"SYS-Embedding projection saved to {path}")
+
+    @classmethod
+    def load(cls, path: str) -> "EmbeddingProjection":
+        with open(os.path.join(path, "projection.json"), "rb") as f:
+            meta = orjson.loads(f.read())
+        if meta["method"] == "truncate":
+            return cls(method="truncate", dim=meta["dim"])
+        arrays = np.load(os.path.join(path, "projection.npz"))
+        return cls(
+            method="pca",
+            dim=meta["dim"],
+            mean=arrays["mean"],
+            components=arrays["components"],
+        )
+
+    @classmethod
+    def from_config(
+        cls, projection_config: Dict[str, Any]
+    ) -> "EmbeddingProjection":
+        # a truncation needs no fitted state, a pca projection is loaded from disk
+        if projection_config["method"] == "truncate":
+            return cls(method="truncate", dim=projection_config["dim"])
+        projection = cls.load(projection_config["path"])
+        if projection.dim != projection_config["dim"]:
+            raise ValueError(
+                f"Projection in {projection_config['path']} has dim {projection.dim}, config asks for {projection_config['dim']}"
+            )
+        return projection
+
+
+def _normalize(embeddings: np.ndarray) -> np.ndarray:
+    return embeddings / np.maximum(
+        np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12
+    )
+
+
+def retrieval_agreement(
+    embeddings: np.ndarray,
+    groups: List[str],
+    projections: Dict[str, EmbeddingProjection],
+    k: int = 5,
+    num_queries: int = 200,
+    seed: int = 0,
+) -> Dict[str, Dict[str, Any]]:
+    """
+    Compare top-k cosine retrieval of projected embeddings against full size.
+
+    Sampled records act as queries against the other records of the same
+    group (symbol), mirroring how MemoryDB filters searches. Returns, per
+    projection, the mean overlap of the top-k id sets (recall@k) and the
+    share of queries whose top-1 is unchanged.
+    """
+    groups_arr = np.asarray(groups)
+    query_rows = np.random.default_rng(seed).choice(
+        len(embeddings), min(num_queries, len(embeddings)), replace=False
+    )
+    full = _normalize(np.asarray(embeddings, dtype=np.float32))
+    projected = {
+        name: _normalize(projection(np.asarray(embeddings, dtype=np.float32)))
+        for name, projection in projections.items()
+    }
+    overlap: Dict[str, List[float]] = {name: [] for name in projections}
+    top1: Dict[str, List[float]] = {name: [] for name in projections}
+    for row in query_rows:
+        candidates = np.flatnonzero(groups_arr == groups_arr[row])
+        candidates = candidates[candidates != row]
+        if len(candidates) == 0:
+            continue
+        cur_k = min(k, len(candidates))
+        full_top = candidates[np.argsort(-(full[candidates] @ full[row]))[:cur_k]]
+        for name, cur_projected in projected.items():
+            cur_top = candidates[
+                np.argsort(-(cur_projected[candidates] @ cur_projected[row]))[:cur_k]
+            ]
+            overlap[name].append(len(set(full_top) & set(cur_top)) / cur_k)
+            top1[name].append(float(full_top[0] == cur_top[0]))
+    return {
+        name: {
+            "dim": projections[name].dim,
+            f"recall_at_{k}": float(np.mean(overlap[name])) if overlap[name] else None,
+            "top1_agreement": float(np.mean(top1[name])) if top1[name] else None,
+            "num_queries": len(overlap[name]),
+        }
+        for name in projections
+    }
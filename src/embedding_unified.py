@@ -2,9 +2,12 @@
 统一的Embedding模块，使用OpenAI兼容接口
 """
 
+import base64
 from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
 from typing import Any, Dict, List, Union
 
+import numpy as np
 from openai import OpenAI
 from loguru import logger
 from pydantic import BaseModel, ValidationError
@@ -15,6 +18,13 @@ import os
 sys.path.append(os.path.join(os.path.dirname(__file__), '../../'))
 from config import get_model_config
 
+from .transport import transport_registry
+from .utils import estimate_tokens
+
+# 单次请求的默认上限, 可在config.py的模型配置中用max_batch_size / max_batch_tokens覆盖
+DEFAULT_MAX_BATCH_SIZE = 32
+DEFAULT_MAX_BATCH_TOKENS = 8192
+
 
 class EmbeddingObject(BaseModel):
     object: str = "embedding"
@@ -47,7 +57,11 @@ class EmbeddingModel(ABC):
         pass
 
     @abstractmethod
-    def __call__(self, texts: Union[List[str], str]) -> List[List[float]]:
+    def __call__(self, texts: Union[List[str], str]) -> np.ndarray:
+        pass
+
+    def close(self) -> None:
+        """释放连接和线程, 本地后端无需处理"""
         pass
 
 
@@ -69,44 +83,121 @@ class UnifiedOpenAIEmbedding(EmbeddingModel):
         if self.model_config["type"] != "embedding_api":
             raise ValueError(f"模型 {self.model_name} 不是embedding类型")
         
-        # 初始化OpenAI客户端
+        # 初始化OpenAI客户端, 连接池和重试由共享的transport负责
         self.client = OpenAI(
             api_key=self.model_config["api_key"],
-            base_url=self.model_config["api_base"]
+            base_url=self.model_config["api_base"],
+            http_client=transport_registry.acquire(
+                self.model_config["api_base"], emb_config.get("emb_http", {})
+            ),
+            max_retries=0,
         )
         
         self.provider = self.model_config.get("provider", "unknown")
         self.timeout = emb_config.get("embedding_timeout", 60)
+        self.max_batch_size = self.model_config.get(
+            "max_batch_size", DEFAULT_MAX_BATCH_SIZE
+        )
+        self.max_batch_tokens = self.model_config.get(
+            "max_batch_tokens", DEFAULT_MAX_BATCH_TOKENS
+        )
+        # base64传输, 直接解码为float32; 不支持base64的服务可在模型配置中设为"float"
+        self.encoding_format = self.model_config.get("encoding_format", "base64")
+        # 并发请求batch的上限, 所有线程共用同一个client的连接池
+        self.max_concurrency = emb_config.get("embedding_max_concurrency", 1)
+        self._executor = (
+            ThreadPoolExecutor(
+                max_workers=self.max_concurrency, thread_name_prefix="embedding"
+            )
+            if self.max_concurrency > 1
+            else None
+        )
         
         logger.trace(f"统一Embedding客户端初始化: {self.model_name}")
         logger.trace(f"Provider: {self.provider}")
         logger.trace(f"API Base: {self.model_config['api_base']}")
+        logger.trace(
+            f"Batch limits: {self.max_batch_size} texts, {self.max_batch_tokens} tokens"
+        )
+
+    def close(self) -> None:
+        # 归还共享连接池, 并关闭并发batch的线程池
+        transport_registry.release(self.model_config["api_base"])
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+
+    def _make_batches(self, texts: List[str]) -> List[List[int]]:
+        """按条数和估计token数切分, 返回每个batch中文本的下标"""
+        batches: List[List[int]] = []
+        cur_batch: List[int] = []
+        cur_tokens = 0
+        for i, text in enumerate(texts):
+            cur_text_tokens = estimate_tokens(text)
+            if cur_batch and (
+                len(cur_batch) >= self.max_batch_size
+                or cur_tokens + cur_text_tokens > self.max_batch_tokens
+            ):
+                batches.append(cur_batch)
+                cur_batch = []
+                cur_tokens = 0
+            # 超过上限的单条文本单独成batch, 交给服务端截断或报错
+            cur_batch.append(i)
+            cur_tokens += cur_text_tokens
+        if cur_batch:
+            batches.append(cur_batch)
+        return batches
+
+    @staticmethod
+    def _decode_embedding(embedding: Union[str, List[float]]) -> np.ndarray:
+        if isinstance(embedding, str):
+            # 小端float32, 不经过Python float对象
+            return np.frombuffer(base64.b64decode(embedding), dtype="<f4")
+        return np.asarray(embedding, dtype=np.float32)
+
+    def _embed_batch(self, texts: List[str]) -> np.ndarray:
+        # 调用OpenAI兼容的embedding接口
+        response = self.client.embeddings.create(
+            input=texts,
+            model=self.model_config["model"],
+            encoding_format=self.encoding_format,
+        )
+        # 确保按索引排序
+        embeddings_data = sorted(response.data, key=lambda x: x.index)
+        return np.stack([self._decode_embedding(item.embedding) for item in embeddings_data])
 
-    def __call__(self, texts: Union[List[str], str]) -> List[List[float]]:
+    def __call__(self, texts: Union[List[str], str]) -> np.ndarray:
         """获取文本的embedding向量
         
         Args:
             texts: 单个文本或文本列表
             
         Returns:
-            List[List[float]]: embedding向量列表
+            np.ndarray: 连续的float32矩阵, 形状为(len(texts), emb_size)
         """
         if isinstance(texts, str):
             texts = [texts]
 
         try:
-            logger.trace(f"调用Embedding API: {self.model_name}, 文本数量: {len(texts)}")
-            
-            # 调用OpenAI兼容的embedding接口
-            response = self.client.embeddings.create(
-                input=texts,
-                model=self.model_config["model"],
-                encoding_format="float"
+            batches = self._make_batches(texts)
+            logger.trace(
+                f"调用Embedding API: {self.model_name}, 文本数量: {len(texts)}, batch数量: {len(batches)}"
             )
-            
-            # 确保按索引排序
-            embeddings_data = sorted(response.data, key=lambda x: x.index)
-            embeddings = [item.embedding for item in embeddings_data]
+
+            # 多个batch时并发请求, map保证结果顺序, 再按原始下标拼回
+            batch_texts = [[texts[i] for i in batch] for batch in batches]
+            if self._executor is not None and len(batches) > 1:
+                batch_results = self._executor.map(self._embed_batch, batch_texts)
+            else:
+                batch_results = map(self._embed_batch, batch_texts)
+            embeddings = np.empty(
+                (len(texts), self.config.get("emb_size", 0)), dtype=np.float32
+            )
+            for batch, batch_embeddings in zip(batches, batch_results):
+                if embeddings.shape[1] != batch_embeddings.shape[1]:
+                    embeddings = np.empty(
+                        (len(texts), batch_embeddings.shape[1]), dtype=np.float32
+                    )
+                embeddings[batch] = batch_embeddings
             
             logger.trace(f"Embedding API调用成功: {self.model_name}")
             return embeddings
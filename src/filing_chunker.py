@@ -0,0 +1,129 @@
+import re
+from typing import List
+
+from .utils import estimate_tokens
+
+# a line that opens a new section: markdown heading, bold title, "Item 7." or "3. ..."
+SECTION_PATTERN = re.compile(
+    r"^\s*(#{1,6}\s|\*\*[^*]+\*\*|item\s+\d+[a-z]?[.:]|\d+[.)]\s)", re.IGNORECASE
+)
+SENTENCE_PATTERN = re.compile(r"(?<=[.!?])\s+")
+
+
+def split_sections(text: str) -> List[str]:
+    sections: List[List[str]] = [[]]
+    for line in text.splitlines():
+        if not line.strip():
+            continue
+        if SECTION_PATTERN.match(line) and sections[-1]:
+            sections.append([])
+        sections[-1].append(line.strip())
+    return ["\n".join(s) for s in sections if s]
+
+
+def _pack(
+    parts: List[str], separator: str, max_chunk_tokens: int, overlap_tokens: int = 0
+) -> List[str]:
+    """
+    Greedily join parts up to the budget. Each new piece starts with the
+    trailing parts of the previous one, up to ``overlap_tokens``, as long as
+    they still fit next to the part that opened the piece.
+    """
+    pieces = []
+    cur_parts: List[str] = []
+    for part in parts:
+        if cur_parts and (
+            estimate_tokens(separator.join(cur_parts + [part])) > max_chunk_tokens
+        ):
+            pieces.append(separator.join(cur_parts))
+            overlap: List[str] = []
+            for prev_part in reversed(cur_parts):
+                candidate = [prev_part] + overlap
+                if (estimate_tokens(separator.join(candidate)) > overlap_tokens) or (
+                    estimate_tokens(separator.join(candidate + [part])) > max_chunk_tokens
+                ):
+                    break
+                overlap = candidate
+            cur_parts = overlap
+        cur_parts.append(part)
+    if cur_parts:
+        pieces.append(separator.join(cur_parts))
+    return pieces
+
+
+def _split_chars(text: str, max_chunk_tokens: int) -> List[str]:
+    pieces = []
+    cur_piece = ""
+    for char in text:
+        if cur_piece and estimate_tokens(cur_piece + char) > max_chunk_tokens:
+            pieces.append(cur_piece)
+            cur_piece = ""
+        cur_piece += char
+    if cur_piece:
+        pieces.append(cur_piece)
+    return pieces
+
+
+def _hard_split(text: str, max_chunk_tokens: int, overlap_tokens: int) -> List[str]:
+    # no sentence boundary left (tables, long runs without periods): split at
+    # lines, then words, then characters
+    for separator in ("\n", " "):
+        if separator in text:
+            parts = [
+                p
+                for part in text.split(separator)
+                if part
+                for p in (
+                    _hard_split(part, max_chunk_tokens, overlap_tokens)
+                    if estimate_tokens(part) > max_chunk_tokens
+                    else [part]
+                )
+            ]
+            return _pack(parts, separator, max_chunk_tokens, overlap_tokens)
+    return _split_chars(text, max_chunk_tokens)
+
+
+def _split_oversized(
+    section: str, max_chunk_tokens: int, overlap_tokens: int = 0
+) -> List[str]:
+    sentences = [
+        piece
+        for sentence in SENTENCE_PATTERN.split(section)
+        for piece in (
+            _hard_split(sentence, max_chunk_tokens, overlap_tokens)
+            if estimate_tokens(sentence) > max_chunk_tokens
+            else [sentence]
+        )
+    ]
+    return _pack(sentences, " ", max_chunk_tokens, overlap_tokens)
+
+
+def chunk_filing(
+    text: str, max_chunk_tokens: int = 512, overlap_tokens: int = 0
+) -> List[str]:
+    """
+    Split a filing into chunks of whole sections, packing consecutive small
+    sections together up to ``max_chunk_tokens`` and splitting oversized
+    sections at sentence boundaries. Pieces of a split section repeat up to
+    ``overlap_tokens`` of trailing sentences from the piece before. Every
+    chunk fits the budget: a sentence that alone exceeds it is cut at lines,
+    words or, failing those, characters.
+    """
+    chunks = []
+    cur_chunk = ""
+    for section in split_sections(text):
+        pieces = (
+            _split_oversized(section, max_chunk_tokens, overlap_tokens)
+            if estimate_tokens(section) > max_chunk_tokens
+            else [section]
+        )
+        for piece in pieces:
+            candidate = f"{cur_chunk}\n{piece}" if cur_chunk else piece
+            if cur_chunk and estimate_tokens(candidate) > max_chunk_tokens:
+                chunks.append(cur_chunk)
+                cur_chunk = piece
+            else:
+                cur_chunk = candidate
+    if cur_chunk:
+        chunks.append(cur_chunk)
+    return chunks
@@ -0,0 +1,192 @@
+import functools
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Union
+
+import numpy as np
+import orjson
+from loguru import logger
+
+from .utils import ensure_path
+
+# upper bounds (seconds) of the latency histogram buckets, last bucket is open
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0)
+
+
+class OperationStats:
+    def __init__(self) -> None:
+        self.count = 0
+        self.bytes = 0
+        self.latencies: List[float] = []
+        self.histogram = [0] * (len(LATENCY_BUCKETS) + 1)
+
+    def record(self, elapsed: float) -> None:
+        self.count += 1
+        self.latencies.append(elapsed)
+        for i, upper in enumerate(LATENCY_BUCKETS):
+            if elapsed <= upper:
+                self.histogram[i] += 1
+                break
+        else:
+            self.histogram[-1] += 1
+
+    def to_dict(self) -> Dict[str, Any]:
+        if self.latencies:
+            latencies = np.array(self.latencies)
+            summary = {
+                "total_seconds": float(latencies.sum()),
+                "mean_seconds": float(latencies.mean()),
+                "p50_seconds": float(np.percentile(latencies, 50)),
+                "p95_seconds": float(np.percentile(latencies, 95)),
+                "p99_seconds": float(np.percentile(latencies, 99)),
+                "max_seconds": float(latencies.max()),
+            }
+        else:
+            summary = {}
+        return {
+            "count": self.count,
+            "bytes": self.bytes,
+            **summary,
+            "histogram": {
+                **{
+                    f"le_{upper}": self.histogram[i]
+                    for i, upper in enumerate(LATENCY_BUCKETS)
+                },
+                "gt_last": self.histogram[-1],
+            },
+        }
+
+
+class Instrumentation:
+    def __init__(self) -> None:
+        self.operations: Dict[str, OperationStats] = {}
+        self.counters: Dict[str, Union[int, float]] = {}
+        self.partition_sizes: List[Dict[str, Any]] = []
+        self.evidence: Dict[str, Dict[str, int]] = {}
+        self.prompt_tokens: List[Dict[str, Any]] = []
+
+    def _operation(self, operation: str) -> OperationStats:
+        if operation not in self.operations:
+            self.operations[operation] = OperationStats()
+        return self.operations[operation]
+
+    def record_latency(self, operation: str, elapsed: float) -> None:
+        self._operation(operation).record(elapsed)
+
+    def add_bytes(self, operation: str, num_bytes: int) -> None:
+        self._operation(operation).bytes += num_bytes
+
+    def incr(self, counter: str, value: Union[int, float] = 1) -> None:
+        self.counters[counter] = self.counters.get(counter, 0) + value
+
+    @contextmanager
+    def timer(self, operation: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record_latency(operation, time.perf_counter() - start)
+
+    def record_partition_sizes(self, step: Any, sizes: Dict[str, int]) -> None:
+        self.partition_sizes.append({"step": step, "sizes": sizes})
+
+    def record_prompt_tokens(self, step: Any, symbols: List[str], tokens: int) -> None:
+        self.prompt_tokens.append({"step": step, "symbols": symbols, "tokens": tokens})
+
+    def record_evidence(self, layer: str, retrieved: int, cited: int) -> None:
+        if layer not in self.evidence:
+            self.evidence[layer] = {"retrieved": 0, "cited": 0}
+        self.evidence[layer]["retrieved"] += retrieved
+        self.evidence[layer]["cited"] += cited
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "operations": {
+                name: stats.to_dict() for name, stats in sorted(self.operations.items())
+            },
+            "counters": self.counters,
+            "evidence_hit_rate": {
+                layer: {
+                    **counts,
+                    "hit_rate": counts["cited"] / counts["retrieved"]
+                    if counts["retrieved"]
+                    else None,
+                }
+                for layer, counts in self.evidence.items()
+            },
+            "partition_sizes": self.partition_sizes,
+            "prompt_tokens": self.prompt_tokens,
+        }
+
+    def save(self, path: str, file_name: str) -> None:
+        ensure_path(path)
+        with open(os.path.join(path, file_name), "w") as f:
+            f.write(
+                orjson.dumps(
+                    self.to_dict(),
+                    option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS,
+                ).decode()
+            )
+        logger.info(f"SYS-Instrumentation saved to {os.path.join(path, file_name)}")
+
+
+class UsageStats:
+    """
+    Token usage reported by the chat server. ``cached_tokens`` comes from
+    ``usage.prompt_tokens_details`` and counts prompt tokens served from the
+    server's prefix cache; servers that do not report it leave it at zero.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.cached_tokens = 0
+        self.requests_with_cache_details = 0
+
+    def record(self, usage: Union[Dict[str, Any], None]) -> None:
+        if not usage:
+            return
+        details = usage.get("prompt_tokens_details") or {}
+        with self._lock:
+            self.requests += 1
+            self.prompt_tokens += usage.get("prompt_tokens") or 0
+            self.completion_tokens += usage.get("completion_tokens") or 0
+            if details.get("cached_tokens") is not None:
+                self.requests_with_cache_details += 1
+                self.cached_tokens += details["cached_tokens"]
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "prompt_tokens": self.prompt_tokens,
+                "completion_tokens": self.completion_tokens,
+                "cached_tokens": self.cached_tokens,
+                "requests_with_cache_details": self.requests_with_cache_details,
+                "cached_token_rate": self.cached_tokens / self.prompt_tokens
+                if self.prompt_tokens
+                else None,
+            }
+
+
+def timed(operation: str) -> Callable:
+    """
+    Record the latency of a method into ``self.stats`` under ``operation``.
+    """
+
+    def decorator(func: Callable) -> Callable:
+        @functools.wraps(func)
+        def wrapper(self, *args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(self, *args, **kwargs)
+            finally:
+                self.stats.record_latency(operation, time.perf_counter() - start)
+
+        return wrapper
+
+    return decorator
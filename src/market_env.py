@@ -1,7 +1,7 @@
 import json
 import os
 from datetime import date, datetime
-from typing import Dict, List, Union
+from typing import Dict, List, Tuple, Union
 
 import numpy as np
 import orjson
@@ -203,6 +203,20 @@ class MarketEnv:
 
         return return_market_info
 
+    def peek_news(
+        self,
+    ) -> Union[Tuple[date, Dict[str, Union[List[str], None]]], None]:
+        """News of the day the next `step` will return, without advancing the env."""
+        # the last date only serves as future date, step terminates there
+        if len(self.final_date_series) < 2:
+            return None
+        next_date = self.final_date_series[0]
+        next_date_str = next_date.strftime("%Y-%m-%d")
+        return next_date, {
+            symbol: self.env_data[symbol][next_date_str]["news"] or None  # type: ignore
+            for symbol in self.env_data.keys()  # type: ignore
+        }
+
     def update_simulation_length(self) -> None:
         self.simulation_length = len(self.final_date_series)
 
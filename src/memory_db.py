@@ -1,7 +1,8 @@
+import hashlib
 import os
 from datetime import date
 from enum import Enum
-from typing import Any, Dict, List, Literal, Tuple, Union
+from typing import Any, Dict, List, Literal, Set, Tuple, Union
 
 import numpy as np
 import orjson
@@ -23,7 +24,9 @@ from qdrant_client.models import (
     VectorParams,
 )
 
-from .embedding import OpenAIEmbedding
+from .embedding import get_embedding_model
+from .embedding_projection import EmbeddingProjection
+from .instrumentation import Instrumentation, timed
 from .utils import ensure_path
 
 
@@ -131,6 +134,30 @@ class BrainSaveFailed(Exception):
     pass
 
 
+class BrainLoadFailed(Exception):
+    pass
+
+
+def record_digest(record_id: int, payload: Dict[str, Any]) -> int:
+    """
+    Hash a single memory record into a 64-bit integer.
+
+    Vectors are left out on purpose: they are a deterministic function of the
+    record text and the embedding config, and Qdrant normalizes them on insert,
+    so hashing them would make digests differ across a save/load round trip.
+    """
+    return int.from_bytes(
+        hashlib.blake2b(
+            orjson.dumps(
+                {"id": record_id, "payload": payload},
+                option=orjson.OPT_SORT_KEYS | orjson.OPT_SERIALIZE_NUMPY,
+            ),
+            digest_size=8,
+        ).digest(),
+        "big",
+    )
+
+
 class IDGenerator:
     def __init__(self, id_init: int = 0):
         logger.trace(f"SYS-Initializing IDGenerator, with init id: {id_init}")
@@ -155,18 +182,37 @@ class IDGenerator:
 
 
 class MemoryDB:
-    def __init__(self, agent_config: Dict[str, Any], emb_config: Dict[str, Any]):
+    def __init__(
+        self,
+        agent_config: Dict[str, Any],
+        emb_config: Dict[str, Any],
+        projection: Union[EmbeddingProjection, None] = None,
+    ):
         logger.info("SYS-Initializing MemoryDB")
         # init
         self.agent_config = agent_config
         self.memory_config = agent_config["memory_db_config"]
         self.emb_config = emb_config
         # embedding model
-        self.emb_model = OpenAIEmbedding(emb_config=self.emb_config)
-        # init database
-        self.connection_client = QdrantClient(
-            url=self.memory_config["memory_db_endpoint"]
+        self.emb_model = get_embedding_model(emb_config=self.emb_config)
+        # optional dimension reduction of stored vectors, a checkpoint passes
+        # the projection its vectors were built with
+        if projection is None and self.emb_config.get("emb_projection"):
+            projection = EmbeddingProjection.from_config(self.emb_config["emb_projection"])
+        self.projection = projection
+        self.vector_size = (
+            self.projection.dim
+            if self.projection is not None
+            else self.emb_config["emb_size"]
         )
+        # init database
+        # ":memory:" runs an in-process Qdrant, e.g. for offline cassette replays
+        if self.memory_config["memory_db_endpoint"] == ":memory:":
+            self.connection_client = QdrantClient(location=":memory:")
+        else:
+            self.connection_client = QdrantClient(
+                url=self.memory_config["memory_db_endpoint"]
+            )
         logger.trace("Connect to Qdrant established")
         if self.connection_client.collection_exists(
             collection_name=self.agent_config["agent_name"]
@@ -178,21 +224,170 @@ class MemoryDB:
                 collection_name=self.agent_config["agent_name"]
             )
         logger.trace(
-            f"SYS-Create collection {self.agent_config['agent_name']}, emb_size: {self.emb_config['emb_size']}"
+            f"SYS-Create collection {self.agent_config['agent_name']}, emb_size: {self.emb_config['emb_size']}, vector size: {self.vector_size}"
         )
         self.connection_client.create_collection(
             collection_name=self.agent_config["agent_name"],
             vectors_config=VectorParams(
-                size=self.emb_config["emb_size"], distance=Distance.COSINE
+                size=self.vector_size, distance=Distance.COSINE
             ),
         )
+        # content digest, maintained incrementally on every mutation
+        self._record_index: Dict[int, Tuple[str, str, int]] = {}
+        self._partition_digest: Dict[Tuple[str, str], int] = {}
+        self._partition_count: Dict[Tuple[str, str], int] = {}
+        self._last_saved_digest: Dict[str, str] = {}
+        self._saved_projection_paths: Set[str] = set()
+        # partition versions, stamped from a monotonic mutation counter
+        self._mutation_stamp = 0
+        self._partition_version: Dict[Tuple[str, str], int] = {}
+        self._partition_membership_version: Dict[Tuple[str, str], int] = {}
+        # query caches
+        self._query_emb_cache: Dict[str, np.ndarray] = {}
+        self._query_cache: Dict[Tuple[str, str, str], Dict[str, Any]] = {}
+        # per-operation latency, counts and transfer sizes
+        self.stats = Instrumentation()
+
+    def close(self) -> None:
+        self.emb_model.close()
+
+    # digest
+    def _bump_version(
+        self, partition: Tuple[str, str], membership_change: bool
+    ) -> None:
+        self._mutation_stamp += 1
+        self._partition_version[partition] = self._mutation_stamp
+        if membership_change:
+            self._partition_membership_version[partition] = self._mutation_stamp
+
+    def _track_upsert(self, record_id: int, payload: Dict[str, Any]) -> None:
+        partition = (payload["layer"], payload["symbol"])
+        if record_id in self._record_index:
+            membership_change = self._record_index[record_id][:2] != partition
+        else:
+            membership_change = True
+        self._track_delete(record_id, membership_change=membership_change)
+        cur_digest = record_digest(record_id, payload)
+        self._record_index[record_id] = (partition[0], partition[1], cur_digest)
+        self._partition_digest[partition] = (
+            self._partition_digest.get(partition, 0) + cur_digest
+        ) % (1 << 64)
+        self._partition_count[partition] = self._partition_count.get(partition, 0) + 1
+        self._bump_version(partition, membership_change=membership_change)
+
+    def _track_delete(self, record_id: int, membership_change: bool = True) -> None:
+        if record_id not in self._record_index:
+            return
+        layer, symbol, cur_digest = self._record_index.pop(record_id)
+        partition = (layer, symbol)
+        self._partition_digest[partition] = (
+            self._partition_digest[partition] - cur_digest
+        ) % (1 << 64)
+        self._partition_count[partition] -= 1
+        if self._partition_count[partition] == 0:
+            del self._partition_digest[partition]
+            del self._partition_count[partition]
+        self._bump_version(partition, membership_change=membership_change)
+
+    def partition_digests(self) -> Dict[str, Dict[str, Union[str, int]]]:
+        return {
+            f"{layer}/{symbol}": {
+                "digest": f"{self._partition_digest[(layer, symbol)]:016x}",
+                "count": self._partition_count[(layer, symbol)],
+            }
+            for layer, symbol in sorted(self._partition_digest)
+        }
+
+    def partition_counts(self) -> Dict[str, int]:
+        return {
+            f"{layer}/{symbol}": count
+            for (layer, symbol), count in sorted(self._partition_count.items())
+        }
+
+    def _layer_count(self, layer: str) -> int:
+        return sum(
+            c for (cur_layer, _), c in self._partition_count.items() if cur_layer == layer
+        )
+
+    @staticmethod
+    def _clean_up_filter(
+        importance_threshold: float, recency_threshold: float, layer: str
+    ) -> Filter:
+        return Filter(
+            must=[
+                FieldCondition(key="layer", match=MatchValue(value=layer)),
+                Filter(
+                    should=[
+                        FieldCondition(
+                            key="importance", range=Range(lt=importance_threshold)
+                        ),
+                        FieldCondition(key="recency", range=Range(lt=recency_threshold)),
+                    ]
+                ),
+            ]
+        )
+
+    @staticmethod
+    def _jump_filter(jump_direction: JumpDirection, layer: str, threshold: float) -> Filter:
+        return Filter(
+            must=[
+                FieldCondition(
+                    key="importance",
+                    range=Range(gte=threshold)
+                    if jump_direction == JumpDirection.UP
+                    else Range(lt=threshold),
+                ),
+                FieldCondition(key="layer", match=MatchValue(value=layer)),
+            ]
+        )
+
+    def _any_matches(self, layer: str, count_filter: Filter) -> bool:
+        # empty layers are known locally, otherwise let qdrant count
+        if self._layer_count(layer) == 0:
+            return False
+        return (
+            self.connection_client.count(
+                collection_name=self.agent_config["agent_name"],
+                count_filter=count_filter,
+                exact=True,
+            ).count
+            > 0
+        )
+
+    def needs_clean_up(
+        self, importance_threshold: float, recency_threshold: float, layer: str
+    ) -> bool:
+        return self._any_matches(
+            layer, self._clean_up_filter(importance_threshold, recency_threshold, layer)
+        )
+
+    def needs_jump(
+        self, jump_direction: JumpDirection, layer: str, threshold: float
+    ) -> bool:
+        return self._any_matches(
+            layer, self._jump_filter(jump_direction, layer, threshold)
+        )
+
+    def _vector_bytes(self, num_vectors: int) -> int:
+        return num_vectors * self.vector_size * 4
+
+    def state_digest(self) -> str:
+        return hashlib.blake2b(
+            orjson.dumps(self.partition_digests()), digest_size=16
+        ).hexdigest()
+
+    def has_unsaved_changes(self, path: str) -> bool:
+        return self._last_saved_digest.get(path) != self.state_digest()
+
+    def _project(self, embs: np.ndarray) -> np.ndarray:
+        return embs if self.projection is None else self.projection(embs)
 
     def _get_most_similar_score_in_layer(
-        self, layer: str, embs: List[List[float]], symbols: List[str]
+        self, layer: str, embs: np.ndarray, symbols: List[str]
     ) -> List[float]:
         search_queries = [
             SearchRequest(
-                vector=cur_emb,
+                vector=cur_emb.tolist(),
                 limit=1,
                 with_payload=False,
                 with_vector=False,
@@ -219,6 +414,7 @@ class MemoryDB:
                 ret_results.append(s[0].score)
         return ret_results
 
+    @timed("add_memory")
     def add_memory(
         self,
         memory_input: List[Dict],
@@ -226,80 +422,69 @@ class MemoryDB:
         importance_init_func: ConstantImportanceInitialization,
         recency_init_func: ConstantRecencyInitialization,
         similarity_threshold: float | None = None,
+        embeddings: np.ndarray | None = None,
     ) -> List[NonNegativeInt]:
         if not memory_input:
             return []
         memories = Memories(memory_records=memory_input)  # type: ignore
         logger.trace(f"MEM-Adding memories: {memories}")
         memories_records = memories.memory_records
-        to_emb_texts = [m.text for m in memories_records]
-        text_embs = self.emb_model(texts=to_emb_texts)
+        if embeddings is None:
+            to_emb_texts = [m.text for m in memories_records]
+            text_embs = self.emb_model(texts=to_emb_texts)
+        else:
+            text_embs = embeddings
+        text_embs = self._project(text_embs)
         if similarity_threshold is not None:
             symbol_list = [m.symbol for m in memories_records]
             most_similar_score = self._get_most_similar_score_in_layer(
                 layer=layer, embs=text_embs, symbols=symbol_list
             )
         # construct points
-        points = []
+        keep_rows = []
+        payloads = []
         id_list = []
-        if similarity_threshold is None:
-            for cur_m, cur_emb in zip(memories_records, text_embs):
-                points.append(
-                    PointStruct(
-                        id=cur_m.id,
-                        payload={
-                            "symbol": cur_m.symbol,
-                            "date": cur_m.date.isoformat(),
-                            "text": cur_m.text,
-                            "delta": 0,
-                            "importance": importance_init_func(),
-                            "recency": recency_init_func(),
-                            "access_counter": 0,
-                            "layer": layer,
-                        },
-                        vector=cur_emb,
-                    )
-                )
+        for i, cur_m in enumerate(memories_records):
+            cur_payload = {
+                "symbol": cur_m.symbol,
+                "date": cur_m.date.isoformat(),
+                "text": cur_m.text,
+                "delta": 0,
+                "importance": importance_init_func(),
+                "recency": recency_init_func(),
+                "access_counter": 0,
+                "layer": layer,
+            }
+            if (similarity_threshold is None) or (
+                most_similar_score[i] < similarity_threshold
+            ):
+                keep_rows.append(i)
+                payloads.append(cur_payload)
                 id_list.append(cur_m.id)
                 logger.trace(
                     f"MEM-Adding memory: id: {cur_m.id}, symbol: {cur_m.symbol}, date: {cur_m.date}, delta: 0, importance: {importance_init_func()}, recency: {recency_init_func()}, access_counter: 0, layer: {layer}"
                 )
-        else:
-            for cur_m, cur_emb, cur_sim in zip(
-                memories_records, text_embs, most_similar_score
-            ):
-                if cur_sim < similarity_threshold:
-                    points.append(
-                        PointStruct(
-                            id=cur_m.id,
-                            payload={
-                                "symbol": cur_m.symbol,
-                                "date": cur_m.date.isoformat(),
-                                "text": cur_m.text,
-                                "delta": 0,
-                                "importance": importance_init_func(),
-                                "recency": recency_init_func(),
-                                "access_counter": 0,
-                                "layer": layer,
-                            },
-                            vector=cur_emb,
-                        )
-                    )
-                    id_list.append(cur_m.id)
-                    logger.trace(
-                        f"MEM-Adding memory: id: {cur_m.id}, symbol: {cur_m.symbol}, date: {cur_m.date}, delta: 0, importance: {importance_init_func()}, recency: {recency_init_func()}, access_counter: 0, layer: {layer}"
-                    )
-                else:
-                    logger.trace(
-                        f"MEM-Skipping memory: id: {cur_m.id}, symbol: {cur_m.symbol}, date: {cur_m.date}, delta: 0, importance: {importance_init_func()}, recency: {recency_init_func()}, access_counter: 0, layer: {layer}"
-                    )
-        # upload to db
-        if points:
-            self.connection_client.upsert(
+            else:
+                logger.trace(
+                    f"MEM-Skipping memory: id: {cur_m.id}, symbol: {cur_m.symbol}, date: {cur_m.date}, delta: 0, importance: {importance_init_func()}, recency: {recency_init_func()}, access_counter: 0, layer: {layer}"
+                )
+        # upload to db, vectors stay a float32 matrix up to the client
+        if id_list:
+            self.connection_client.upload_collection(
                 collection_name=self.agent_config["agent_name"],
-                points=points,
+                vectors=text_embs[keep_rows],
+                payload=payloads,
+                ids=id_list,
                 wait=True,
             )
+            for cur_id, cur_payload in zip(id_list, payloads):
+                self._track_upsert(cur_id, cur_payload)
+            self.stats.add_bytes(
+                "add_memory",
+                self._vector_bytes(len(id_list))
+                + sum(len(p["text"]) for p in payloads),
+            )
+            self.stats.incr("memories_added", len(id_list))
             logger.trace("MEM-Adding memories finished")
             return id_list
         else:
@@ -380,104 +565,176 @@ class MemoryDB:
             result.append(FieldCondition(key="symbol", match=MatchValue(value=symbol)))
         return result
 
+    def _embed_queries(self, texts: List[str]) -> List[np.ndarray]:
+        # query texts (the character strings) rarely change during a run
+        to_emb = [t for t in dict.fromkeys(texts) if t not in self._query_emb_cache]
+        if to_emb:
+            for cur_text, cur_emb in zip(
+                to_emb, self._project(self.emb_model(texts=to_emb))
+            ):
+                self._query_emb_cache[cur_text] = cur_emb
+        return [self._query_emb_cache[t] for t in texts]
+
+    @staticmethod
+    def _rank_candidates(
+        candidates: List[Tuple[int, float]],
+        payloads: Dict[int, Dict[str, Any]],
+        linear_compound_func: LinearCompoundScore,
+    ) -> List[Tuple[str, int]]:
+        ranking = sorted(
+            [
+                {
+                    "compound_score": linear_compound_func(
+                        similarity_score=cur_score,
+                        importance_score=payloads[cur_id]["importance"],
+                        recency_score=payloads[cur_id]["recency"],
+                    ),
+                    "text": payloads[cur_id]["text"],
+                    "id": cur_id,
+                }
+                for cur_id, cur_score in candidates
+                if cur_id in payloads
+            ],
+            key=lambda x: -x["compound_score"],  # type: ignore
+        )
+        return [(r["text"], r["id"]) for r in ranking]  # type: ignore
+
+    @timed("query")
     def query(
         self,
         query_input: Queries,
         layer: str,
         linear_compound_func: LinearCompoundScore,
     ) -> List[Tuple[List[str], List[int]]]:
-        # generate embedding
-        to_emb = [r.query_text for r in query_input.query_records]
-        emb_vector = self.emb_model(texts=to_emb)
-        query_records = [
-            {
-                "query_vector": cur_emb,
-                "query_text": cur_query.query_text,
-                "k": cur_query.k,
-                "symbol": cur_query.symbol,
-            }
-            for cur_emb, cur_query in zip(emb_vector, query_input.query_records)
+        """
+        Retrieve the top-k memories of a layer for each query.
+
+        Results are cached per (query, layer, symbol) together with the
+        partition version they were computed at. An unchanged partition
+        returns the cached ranking; a partition whose membership is unchanged
+        (only importance/recency moved, e.g. after decay) reuses the cached
+        similarity scores and only re-reads payloads; anything else runs the
+        vector search.
+        """
+        query_records = query_input.query_records
+        ret_results: List[Tuple[List[str], List[int]]] = [
+            ([], []) for _ in query_records
         ]
-        # construct request
-        query_result = {}
-        search_requests = []
-        search_queries = []
-        for cur_query in query_records:
-            cur_count = self._count_num_records(layer=layer, symbol=cur_query["symbol"])
-            if cur_count == 0:
-                query_result[orjson.dumps(cur_query)] = ([], [])
+        to_rescore = []
+        to_search = []
+        for i, cur_query in enumerate(query_records):
+            partition = (layer, cur_query.symbol)
+            if self._partition_count.get(partition, 0) == 0:
                 continue
-            cur_search_query = SearchRequest(
-                vector=cur_query["query_vector"],
-                limit=cur_count,
-                with_payload=True,
-                params=SearchParams(exact=True),
-                filter=Filter(
-                    must=[
-                        FieldCondition(
-                            key="symbol", match=MatchValue(value=cur_query["symbol"])
-                        ),
-                        FieldCondition(key="layer", match=MatchValue(value=layer)),
-                    ]
-                ),
+            cache_key = (cur_query.query_text, layer, cur_query.symbol)
+            cached = self._query_cache.get(cache_key)
+            if (cached is None) or (cached["score_func"] is not linear_compound_func):
+                to_search.append((i, cache_key))
+                self.stats.incr("query_cache_miss")
+            elif cached["version"] == self._partition_version[partition]:
+                ranking = cached["ranking"][: cur_query.k]
+                ret_results[i] = ([r[0] for r in ranking], [r[1] for r in ranking])
+                self.stats.incr("query_cache_hit")
+            elif (
+                cached["membership_version"]
+                == self._partition_membership_version[partition]
+            ):
+                to_rescore.append((i, cache_key))
+                self.stats.incr("query_cache_rescore")
+            else:
+                to_search.append((i, cache_key))
+                self.stats.incr("query_cache_miss")
+
+        # same candidates, re-read importance and recency only
+        if to_rescore:
+            rescore_ids = sorted(
+                {
+                    cur_id
+                    for _, cache_key in to_rescore
+                    for cur_id, _ in self._query_cache[cache_key]["candidates"]
+                }
+            )
+            retrieved_points = self.connection_client.retrieve(
+                collection_name=self.agent_config["agent_name"],
+                ids=rescore_ids,  # type: ignore
+                with_payload=["importance", "recency", "text"],
+                with_vectors=False,
+            )
+            payloads = {r.id: r.payload for r in retrieved_points}
+            self.stats.add_bytes(
+                "query",
+                sum(len(p["text"]) for p in payloads.values()),  # type: ignore
+            )
+            for i, cache_key in to_rescore:
+                cached = self._query_cache[cache_key]
+                cached["ranking"] = self._rank_candidates(
+                    cached["candidates"], payloads, linear_compound_func  # type: ignore
+                )
+                cached["version"] = self._partition_version[cache_key[1:]]  # type: ignore
+                ranking = cached["ranking"][: query_records[i].k]
+                ret_results[i] = ([r[0] for r in ranking], [r[1] for r in ranking])
+
+        # full vector search
+        if to_search:
+            emb_vector = self._embed_queries(
+                [query_records[i].query_text for i, _ in to_search]
+            )
+            search_requests = [
+                SearchRequest(
+                    vector=cur_emb.tolist(),
+                    limit=self._partition_count[(layer, query_records[i].symbol)],
+                    with_payload=["importance", "recency", "text"],
+                    params=SearchParams(exact=True),
+                    filter=Filter(
+                        must=[
+                            FieldCondition(
+                                key="symbol",
+                                match=MatchValue(value=query_records[i].symbol),
+                            ),
+                            FieldCondition(key="layer", match=MatchValue(value=layer)),
+                        ]
+                    ),
+                )
+                for (i, _), cur_emb in zip(to_search, emb_vector)
+            ]
+            search_results = self.connection_client.search_batch(
+                collection_name=self.agent_config["agent_name"],
+                requests=search_requests,
             )
-            search_requests.append(cur_search_query)
-            search_queries.append(cur_query)
+            self.stats.add_bytes(
+                "query",
+                sum(len(r.payload["text"]) for s in search_results for r in s),  # type: ignore
+            )
+            for (i, cache_key), cur_result in zip(to_search, search_results):
+                candidates = [(r.id, r.score) for r in cur_result]
+                payloads = {r.id: r.payload for r in cur_result}
+                partition = (layer, query_records[i].symbol)
+                self._query_cache[cache_key] = {
+                    "score_func": linear_compound_func,
+                    "version": self._partition_version[partition],
+                    "membership_version": self._partition_membership_version[
+                        partition
+                    ],
+                    "candidates": candidates,
+                    "ranking": self._rank_candidates(
+                        candidates, payloads, linear_compound_func  # type: ignore
+                    ),
+                }
+                ranking = self._query_cache[cache_key]["ranking"][
+                    : query_records[i].k
+                ]
+                ret_results[i] = ([r[0] for r in ranking], [r[1] for r in ranking])
 
-        # search
-        search_results = self.connection_client.search_batch(
-            collection_name=self.agent_config["agent_name"], requests=search_requests
-        )
-        for cur_query, cur_result in zip(search_queries, search_results):
-            cur_result_subset = sorted(
-                [
-                    {
-                        "compound_score": linear_compound_func(
-                            similarity_score=r.score,
-                            importance_score=r.payload["importance"],  # type: ignore
-                            recency_score=r.payload["recency"],  # type: ignore
-                        ),
-                        "text": r.payload["text"],  # type: ignore
-                        "id": r.id,
-                    }
-                    for r in cur_result
-                ],
-                key=lambda x: -x["compound_score"],  # type: ignore
-            )[: cur_query["k"]]
-            cur_text = [i["text"] for i in cur_result_subset]
-            cur_ids = [i["id"] for i in cur_result_subset]
-            query_result[orjson.dumps(cur_query)] = (cur_text, cur_ids)
-
-        return [query_result[orjson.dumps(q)] for q in query_records]
+        return ret_results
 
+    @timed("prepare_jump")
     def prepare_jump(
         self, jump_direction: JumpDirection, layer: str, threshold: float
     ) -> List[Dict[str, Any]]:
-        record_count = self._count_num_records(layer=layer)
-        if record_count == 0:
+        if not self.needs_jump(jump_direction, layer, threshold):
             return []
-
-        # get filter
-        if jump_direction == JumpDirection.UP:
-            filter_condition = Filter(
-                must=[
-                    FieldCondition(
-                        key="importance",
-                        range=Range(gte=threshold),
-                    ),
-                    FieldCondition(key="layer", match=MatchValue(value=layer)),
-                ]
-            )
-        else:
-            filter_condition = Filter(
-                must=[
-                    FieldCondition(
-                        key="importance",
-                        range=Range(lt=threshold),
-                    ),
-                    FieldCondition(key="layer", match=MatchValue(value=layer)),
-                ]
-            )
+        record_count = self._layer_count(layer)
+        filter_condition = self._jump_filter(jump_direction, layer, threshold)
 
         # get all records
         all_records = self.connection_client.scroll(
@@ -491,6 +748,8 @@ class MemoryDB:
         for r in all_records:
             jump_records.append({"id": r.id, "payload": r.payload, "vector": r.vector})
             to_delete_ids.append(r.id)
+        self.stats.add_bytes("prepare_jump", self._vector_bytes(len(jump_records)))
+        self.stats.incr(f"jump_{jump_direction.value}_from_{layer}", len(jump_records))
 
         # delete
         if to_delete_ids:
@@ -498,9 +757,12 @@ class MemoryDB:
                 collection_name=self.agent_config["agent_name"],
                 points_selector=PointIdsList(points=to_delete_ids),
             )
+            for cur_id in to_delete_ids:
+                self._track_delete(cur_id)
 
         return jump_records
 
+    @timed("accept_jump")
     def accept_jump(
         self,
         jump_dict: List[Dict[str, Any]],
@@ -527,7 +789,11 @@ class MemoryDB:
                 points=add_points,
                 wait=True,
             )
+            for p in add_points:
+                self._track_upsert(p.id, p.payload)  # type: ignore
+            self.stats.add_bytes("accept_jump", self._vector_bytes(len(add_points)))
 
+    @timed("update_access_counter_with_feedback")
     def update_access_counter_with_feedback(
         self,
         access_feedback: Union[AccessFeedback, AccessFeedbackMulti],
@@ -543,13 +809,18 @@ class MemoryDB:
                 with_vectors=True,
             )
 
+            # records may have been cleaned up or consolidated since they were
+            # queried, so match feedback to points by id
+            feedback_dict = {
+                a.id: a.feedback for a in access_feedback.access_counter_records
+            }
             new_points = []
-            for r, f in zip(retrieved_points, access_feedback.access_counter_records):
+            for r in retrieved_points:
                 cur_payload = r.payload
-                cur_payload["access_counter"] += f.feedback  # type: ignore
+                cur_payload["access_counter"] += feedback_dict[r.id]  # type: ignore
                 cur_payload["importance"] = access_counter_update_func(  # type: ignore
                     cur_importance_score=cur_payload["importance"],  # type: ignore
-                    direction=f.feedback,  # type: ignore
+                    direction=feedback_dict[r.id],  # type: ignore
                 )
                 new_points.append(
                     PointStruct(id=r.id, vector=r.vector, payload=cur_payload)  # type: ignore
@@ -558,6 +829,12 @@ class MemoryDB:
                 self.connection_client.upsert(
                     collection_name=self.agent_config["agent_name"], points=new_points
                 )
+                for p in new_points:
+                    self._track_upsert(p.id, p.payload)  # type: ignore
+                self.stats.add_bytes(
+                    "update_access_counter_with_feedback",
+                    2 * self._vector_bytes(len(new_points)),
+                )
         else:
             for cur_asset in access_feedback.access_counter_records:
                 point_ids = cur_asset.id
@@ -568,13 +845,14 @@ class MemoryDB:
                     with_vectors=True,
                 )
 
+                feedback_dict = dict(zip(cur_asset.id, cur_asset.feedback))
                 new_points = []
-                for r, f in zip(retrieved_points, cur_asset.feedback):
+                for r in retrieved_points:
                     cur_payload = r.payload
-                    cur_payload["access_counter"] += f  # type: ignore
+                    cur_payload["access_counter"] += feedback_dict[r.id]  # type: ignore
                     cur_payload["importance"] = access_counter_update_func(  # type: ignore
                         cur_importance_score=cur_payload["importance"],  # type: ignore
-                        direction=f,
+                        direction=feedback_dict[r.id],  # type: ignore
                     )  # type: ignore
                     new_points.append(
                         PointStruct(id=r.id, vector=r.vector, payload=cur_payload)  # type: ignore
@@ -585,20 +863,23 @@ class MemoryDB:
                         collection_name=self.agent_config["agent_name"],
                         points=new_points,
                     )
+                    for p in new_points:
+                        self._track_upsert(p.id, p.payload)  # type: ignore
+                    self.stats.add_bytes(
+                        "update_access_counter_with_feedback",
+                        2 * self._vector_bytes(len(new_points)),
+                    )
 
     def __eq__(self, another_db) -> bool:
         emb_config_condition = self.emb_config == another_db.emb_config
         memory_config_condition = self.memory_config == another_db.memory_config
         config_condition = emb_config_condition and memory_config_condition
 
-        our_brain_records = self._get_record_dict()
-        our_brain_records = sorted(our_brain_records, key=lambda x: x["id"])  # type: ignore
-        another_brain_records = self._get_record_dict()
-        another_brain_records = sorted(another_brain_records, key=lambda x: x["id"])  # type: ignore
-        record_condition = our_brain_records == another_brain_records
+        record_condition = self.state_digest() == another_db.state_digest()
 
         return config_condition and record_condition
 
+    @timed("decay")
     def decay(
         self,
         importance_decay_func: ImportanceDecay,
@@ -608,6 +889,7 @@ class MemoryDB:
         all_records = self._get_record_dict(with_vector=False, layer=layer)
         update_operations = []
 
+        new_payloads = []
         for r in all_records:
             cur_id = r["id"]
             cur_new_delta = r["payload"]["delta"] + 1  # type: ignore
@@ -615,46 +897,149 @@ class MemoryDB:
                 cur_val=r["payload"]["importance"]  # type: ignore
             )
             cur_new_recency = recency_decay_func(delta=cur_new_delta)
+            cur_update = {
+                "delta": cur_new_delta,
+                "importance": cur_new_importance,
+                "recency": cur_new_recency,
+            }
             update_operations.append(
                 SetPayloadOperation(
                     set_payload=SetPayload(
-                        payload={
-                            "delta": cur_new_delta,
-                            "importance": cur_new_importance,
-                            "recency": cur_new_recency,
-                        },
+                        payload=cur_update,
                         points=[cur_id],  # type: ignore
                     )
                 )
             )
+            new_payloads.append((cur_id, {**r["payload"], **cur_update}))  # type: ignore
 
+        if not update_operations:
+            return
         self.connection_client.batch_update_points(
             collection_name=self.agent_config["agent_name"],
             update_operations=update_operations,
         )
+        for cur_id, cur_payload in new_payloads:
+            self._track_upsert(cur_id, cur_payload)  # type: ignore
 
+    @timed("clean_up")
     def clean_up(
         self, importance_threshold: float, recency_threshold: float, layer: str
     ) -> None:
+        if not self.needs_clean_up(importance_threshold, recency_threshold, layer):
+            return
+        # resolve ids first so that the digest can follow the deletion
+        to_delete_records = self.connection_client.scroll(
+            collection_name=self.agent_config["agent_name"],
+            scroll_filter=self._clean_up_filter(
+                importance_threshold, recency_threshold, layer
+            ),
+            limit=self._layer_count(layer),
+            with_payload=False,
+            with_vectors=False,
+        )[0]
+        to_delete_ids = [r.id for r in to_delete_records]
+        if not to_delete_ids:
+            return
         self.connection_client.delete(
             collection_name=self.agent_config["agent_name"],
-            points_selector=Filter(
-                must=[
-                    FieldCondition(key="layer", match=MatchValue(value=layer)),
-                    Filter(
-                        should=[
-                            FieldCondition(
-                                key="importance", range=Range(lt=importance_threshold)
-                            ),
-                            FieldCondition(
-                                key="recency", range=Range(lt=recency_threshold)
-                            ),
-                        ]
+            points_selector=PointIdsList(points=to_delete_ids),
+        )
+        for cur_id in to_delete_ids:
+            self._track_delete(cur_id)  # type: ignore
+        self.stats.incr(f"cleaned_up_from_{layer}", len(to_delete_ids))
+
+    @staticmethod
+    def _cluster_near_duplicates(
+        records: List[Dict[str, Any]], similarity_threshold: float
+    ) -> List[List[int]]:
+        # greedy clustering, seeded by the most important remaining record
+        vectors = np.array([r["vector"] for r in records], dtype=np.float32)
+        vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+        order = sorted(
+            range(len(records)), key=lambda i: -records[i]["payload"]["importance"]
+        )
+        assigned = np.zeros(len(records), dtype=bool)
+        clusters = []
+        for seed in order:
+            if assigned[seed]:
+                continue
+            members = np.flatnonzero(
+                (~assigned) & (vectors @ vectors[seed] >= similarity_threshold)
+            )
+            members = [seed] + [int(m) for m in members if m != seed]
+            assigned[members] = True
+            clusters.append(members)
+        return clusters
+
+    @timed("consolidate")
+    def consolidate(self, layer: str, similarity_threshold: float) -> int:
+        """
+        Merge near-duplicate memories of a layer, per symbol.
+
+        Each cluster is collapsed into its most important record, which keeps
+        its text and date and takes the max importance and recency, the
+        min delta and the summed access counter of the cluster. Returns the
+        number of removed records.
+        """
+        update_operations = []
+        new_payloads = []
+        to_delete_ids = []
+        for cur_layer, cur_symbol in sorted(self._partition_count):
+            if cur_layer != layer or self._partition_count[(layer, cur_symbol)] < 2:
+                continue
+            records = self._get_record_dict(
+                with_vector=True, layer=layer, symbol=cur_symbol
+            )
+            self.stats.add_bytes("consolidate", self._vector_bytes(len(records)))
+            for cluster in self._cluster_near_duplicates(records, similarity_threshold):
+                if len(cluster) == 1:
+                    continue
+                members = [records[i] for i in cluster]
+                cur_update = {
+                    "importance": max(m["payload"]["importance"] for m in members),
+                    "recency": max(m["payload"]["recency"] for m in members),
+                    "delta": min(m["payload"]["delta"] for m in members),
+                    "access_counter": sum(
+                        m["payload"]["access_counter"] for m in members
                     ),
-                ]
-            ),
+                }
+                update_operations.append(
+                    SetPayloadOperation(
+                        set_payload=SetPayload(
+                            payload=cur_update,
+                            points=[members[0]["id"]],  # type: ignore
+                        )
+                    )
+                )
+                new_payloads.append(
+                    (members[0]["id"], {**members[0]["payload"], **cur_update})  # type: ignore
+                )
+                to_delete_ids.extend(m["id"] for m in members[1:])
+                logger.trace(
+                    f"MEM-Consolidating {[m['id'] for m in members[1:]]} into {members[0]['id']}, layer: {layer}, symbol: {cur_symbol}"
+                )
+
+        if not to_delete_ids:
+            return 0
+        self.connection_client.batch_update_points(
+            collection_name=self.agent_config["agent_name"],
+            update_operations=update_operations,
         )
+        self.connection_client.delete(
+            collection_name=self.agent_config["agent_name"],
+            points_selector=PointIdsList(points=to_delete_ids),
+        )
+        for cur_id, cur_payload in new_payloads:
+            self._track_upsert(cur_id, cur_payload)  # type: ignore
+        for cur_id in to_delete_ids:
+            self._track_delete(cur_id)  # type: ignore
+        self.stats.incr(f"consolidated_from_{layer}", len(to_delete_ids))
+        logger.info(
+            f"MEM-Consolidated {len(to_delete_ids)} memories in layer {layer} into {len(new_payloads)}"
+        )
+        return len(to_delete_ids)
 
+    @timed("memory_flow")
     def memory_flow(
         self,
         jump_threshold_dict: Dict[str, Dict[str, float]],
@@ -731,6 +1116,7 @@ class MemoryDB:
                 target_layer="mid",
             )
 
+    @timed("save_checkpoint")
     def save_checkpoint(
         self,
         path: str,
@@ -738,15 +1124,36 @@ class MemoryDB:
         # ensure save path
         save_path = os.path.join(path, "brain")
         ensure_path(save_path)
-        # extract memories
-        all_memories = self._get_record_dict(with_vector=True)
-        # save
-        with open(os.path.join(path, "brain", "memories.json"), "w") as f:
-            f.write(orjson.dumps(all_memories).decode())
+        cur_digest = self.state_digest()
+        if (not self.has_unsaved_changes(path)) and os.path.exists(
+            os.path.join(save_path, "memories.json")
+        ):
+            logger.trace(f"MEM-Memories unchanged since last save to {path}, skip")
+        else:
+            # extract memories
+            all_memories = self._get_record_dict(with_vector=True)
+            # save
+            with open(os.path.join(path, "brain", "memories.json"), "w") as f:
+                f.write(orjson.dumps(all_memories).decode())
+            with open(os.path.join(path, "brain", "digest.json"), "w") as f:
+                f.write(
+                    orjson.dumps(
+                        {
+                            "state_digest": cur_digest,
+                            "partitions": self.partition_digests(),
+                        }
+                    ).decode()
+                )
+            self._last_saved_digest[path] = cur_digest
         with open(os.path.join(path, "brain", "agent_config.json"), "w") as f:
             f.write(orjson.dumps(self.agent_config).decode())
         with open(os.path.join(path, "brain", "emb_config.json"), "w") as f:
             f.write(orjson.dumps(self.emb_config).decode())
+        # a copy of the projection, the configured path may be refitted later;
+        # it never changes during a run, so each checkpoint path is written once
+        if (self.projection is not None) and (path not in self._saved_projection_paths):
+            self.projection.save(os.path.join(path, "brain", "projection"))
+            self._saved_projection_paths.add(path)
 
     @classmethod
     def load_checkpoint(cls, path: str) -> "MemoryDB":
@@ -757,8 +1164,16 @@ class MemoryDB:
             agent_config = orjson.loads(f.read())
         with open(os.path.join(path, "brain", "emb_config.json"), "r") as f:
             emb_config = orjson.loads(f.read())
+        projection_path = os.path.join(path, "brain", "projection")
+        projection = (
+            EmbeddingProjection.load(projection_path)
+            if os.path.exists(os.path.join(projection_path, "projection.json"))
+            else None
+        )
         # init memoryDB
-        new_memory_db = cls(agent_config=agent_config, emb_config=emb_config)
+        new_memory_db = cls(
+            agent_config=agent_config, emb_config=emb_config, projection=projection
+        )
         if memories:
             points = [
                 PointStruct(id=m["id"], payload=m["payload"], vector=m["vector"])
@@ -768,4 +1183,18 @@ class MemoryDB:
                 collection_name=new_memory_db.agent_config["agent_name"],
                 points=points,  # type: ignore
             )
+            for m in memories:
+                new_memory_db._track_upsert(m["id"], m["payload"])
+        # verify checkpoint integrity
+        digest_path = os.path.join(path, "brain", "digest.json")
+        if os.path.exists(digest_path):
+            with open(digest_path, "r") as f:
+                saved_digest = orjson.loads(f.read())["state_digest"]
+            if saved_digest != new_memory_db.state_digest():
+                logger.error(f"MEM-Checkpoint digest mismatch in {path}")
+                new_memory_db.close()
+                raise BrainLoadFailed(
+                    f"Memory checkpoint in {path} does not match its saved digest"
+                )
+            new_memory_db._last_saved_digest[path] = saved_digest
         return new_memory_db
@@ -0,0 +1,186 @@
+import hashlib
+import os
+import re
+from collections import deque
+from datetime import date, timedelta
+from typing import Any, Deque, Dict, List, Set, Tuple
+
+import numpy as np
+import orjson
+from loguru import logger
+
+TOKEN_PATTERN = re.compile(r"\w+")
+# upper bits of a 64-bit multiply-shift hash
+MINHASH_SHIFT = np.uint64(32)
+
+
+class NewsDeduplicator:
+    """
+    Lexical near-duplicate filter for news, applied before embedding.
+
+    Each item is reduced to word shingles and a MinHash signature. An LSH
+    index over the signatures (one per symbol) finds earlier items from the
+    last ``window_days`` days whose estimated Jaccard similarity reaches
+    ``threshold``; such items are dropped.
+    """
+
+    def __init__(self, dedup_config: Dict[str, Any], seed: int = 0) -> None:
+        self.dedup_config = dedup_config
+        self.seed = seed
+        self.threshold = dedup_config.get("threshold", 0.8)
+        self.window_days = dedup_config.get("window_days", 3)
+        self.shingle_size = dedup_config.get("shingle_size", 5)
+        self.num_perm = dedup_config.get("num_perm", 64)
+        self.bands = dedup_config.get("bands", 8)
+        if self.num_perm % self.bands != 0:
+            raise ValueError("num_perm must be a multiple of bands")
+        self.rows = self.num_perm // self.bands
+        rng = np.random.default_rng(seed)
+        self._a = rng.integers(1, 2**63, self.num_perm, dtype=np.uint64) | np.uint64(1)
+        self._b = rng.integers(0, 2**63, self.num_perm, dtype=np.uint64)
+        # per symbol: band buckets and entries in date order for eviction
+        self._buckets: Dict[str, Dict[Tuple[int, bytes], Set[int]]] = {}
+        self._entries: Dict[str, Deque[Tuple[date, int, List[Tuple[int, bytes]]]]] = {}
+        self._signatures: Dict[int, np.ndarray] = {}
+        self._next_id = 0
+        self.num_seen = 0
+        self.num_dropped = 0
+
+    def _shingles(self, text: str) -> Set[str]:
+        tokens = TOKEN_PATTERN.findall(text.lower())
+        if len(tokens) < self.shingle_size:
+            return {" ".join(tokens)}
+        return {
+            " ".join(tokens[i : i + self.shingle_size])
+            for i in range(len(tokens) - self.shingle_size + 1)
+        }
+
+    def signature(self, text: str) -> np.ndarray:
+        hashes = np.array(
+            [
+                int.from_bytes(
+                    hashlib.blake2b(s.encode("utf-8"), digest_size=8).digest(), "big"
+                )
+                for s in self._shingles(text)
+            ],
+            dtype=np.uint64,
+        )
+        # (a * x + b) mod 2^64, upper 32 bits; min over shingles per permutation
+        permuted = (np.outer(hashes, self._a) + self._b) >> MINHASH_SHIFT
+        return permuted.min(axis=0)
+
+    def _band_keys(self, signature: np.ndarray) -> List[Tuple[int, bytes]]:
+        return [
+            (band, signature[band * self.rows : (band + 1) * self.rows].tobytes())
+            for band in range(self.bands)
+        ]
+
+    def _evict(self, symbol: str, cur_date: date) -> None:
+        entries = self._entries[symbol]
+        oldest = cur_date - timedelta(days=self.window_days)
+        while entries and entries[0][0] < oldest:
+            _, entry_id, band_keys = entries.popleft()
+            for key in band_keys:
+                bucket = self._buckets[symbol][key]
+                bucket.discard(entry_id)
+                if not bucket:
+                    del self._buckets[symbol][key]
+            del self._signatures[entry_id]
+
+    def _is_duplicate(
+        self, cur_signature: np.ndarray, signatures: List[np.ndarray]
+    ) -> bool:
+        return any(np.mean(s == cur_signature) >= self.threshold for s in signatures)
+
+    def peek(self, symbol: str, cur_date: date, texts: List[str]) -> List[str]:
+        """Return the texts a call on ``cur_date`` would keep, without recording them."""
+        buckets = self._buckets.get(symbol, {})
+        oldest = cur_date - timedelta(days=self.window_days)
+        live = {
+            entry_id
+            for entry_date, entry_id, _ in self._entries.get(symbol, ())
+            if entry_date >= oldest
+        }
+        kept = []
+        kept_entries: List[Tuple[Set[Tuple[int, bytes]], np.ndarray]] = []
+        for text in texts:
+            cur_signature = self.signature(text)
+            band_keys = set(self._band_keys(cur_signature))
+            candidates = set().union(*(buckets.get(key, set()) for key in band_keys)) & live
+            signatures = [self._signatures[c] for c in candidates] + [
+                s for keys, s in kept_entries if keys & band_keys
+            ]
+            if self._is_duplicate(cur_signature, signatures):
+                continue
+            kept_entries.append((band_keys, cur_signature))
+            kept.append(text)
+        return kept
+
+    def __call__(self, symbol: str, cur_date: date, texts: List[str]) -> List[str]:
+        """Return the texts that are not near-duplicates of recent news."""
+        buckets = self._buckets.setdefault(symbol, {})
+        self._entries.setdefault(symbol, deque())
+        self._evict(symbol, cur_date)
+        kept = []
+        for text in texts:
+            self.num_seen += 1
+            cur_signature = self.signature(text)
+            band_keys = self._band_keys(cur_signature)
+            candidates = set().union(*(buckets.get(key, set()) for key in band_keys))
+            if self._is_duplicate(cur_signature, [self._signatures[c] for c in candidates]):
+                self.num_dropped += 1
+                logger.trace(f"AGENT-Dropping near-duplicate news for {symbol}: {text[:80]}")
+                continue
+            self._add(symbol, cur_date, self._next_id, cur_signature)
+            self._next_id += 1
+            kept.append(text)
+        return kept
+
+    def _add(
+        self, symbol: str, cur_date: date, entry_id: int, signature: np.ndarray
+    ) -> None:
+        band_keys = self._band_keys(signature)
+        self._signatures[entry_id] = signature
+        buckets = self._buckets.setdefault(symbol, {})
+        for key in band_keys:
+            buckets.setdefault(key, set()).add(entry_id)
+        self._entries.setdefault(symbol, deque()).append((cur_date, entry_id, band_keys))
+
+    def save_checkpoint(self, path: str) -> None:
+        # buckets and band keys follow from the signatures, only those are stored
+        state = {
+            "dedup_config": self.dedup_config,
+            "seed": self.seed,
+            "next_id": self._next_id,
+            "num_seen": self.num_seen,
+            "num_dropped": self.num_dropped,
+            "entries": {
+                symbol: [
+                    [entry_date.isoformat(), entry_id, self._signatures[entry_id].tolist()]
+                    for entry_date, entry_id, _ in entries
+                ]
+                for symbol, entries in self._entries.items()
+            },
+        }
+        with open(os.path.join(path, "news_dedup.json"), "wb") as f:
+            f.write(orjson.dumps(state))
+
+    @classmethod
+    def load_checkpoint(cls, path: str) -> "NewsDeduplicator":
+        with open(os.path.join(path, "news_dedup.json"), "rb") as f:
+            state = orjson.loads(f.read())
+        dedup = cls(state["dedup_config"], seed=state["seed"])
+        for symbol, entries in state["entries"].items():
+            dedup._buckets[symbol] = {}
+            dedup._entries[symbol] = deque()
+            for entry_date, entry_id, signature in entries:
+                dedup._add(
+                    symbol,
+                    date.fromisoformat(entry_date),
+                    entry_id,
+                    np.array(signature, dtype=np.uint64),
+                )
+        dedup._next_id = state["next_id"]
+        dedup.num_seen = state["num_seen"]
+        dedup.num_dropped = state["num_dropped"]
+        return dedup
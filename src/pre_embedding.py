@@ -0,0 +1,130 @@
+import hashlib
+import os
+from datetime import date, datetime
+from typing import Any, Dict, List, Tuple, Union
+
+import numpy as np
+import orjson
+from loguru import logger
+
+from .embedding import get_embedding_model
+from .news_dedup import NewsDeduplicator
+from .utils import ensure_path
+
+# texts are embedded and flushed to the matrix in chunks of this size
+PRE_EMBEDDING_CHUNK_SIZE = 1024
+
+
+class PreEmbeddingMismatch(Exception):
+    pass
+
+
+def pre_embedding_key(symbol: str, cur_date: Union[date, str], text: str) -> str:
+    if isinstance(cur_date, date):
+        cur_date = cur_date.isoformat()
+    text_hash = hashlib.blake2b(text.encode("utf-8"), digest_size=8).hexdigest()
+    return f"{symbol}|{cur_date}|{text_hash}"
+
+
+def collect_news(
+    env_data_path: Dict[str, str],
+    start_date: str,
+    end_date: str,
+    deduplicator: Union[NewsDeduplicator, None] = None,
+) -> List[Tuple[str, str]]:
+    """
+    Collect (key, text) for every news item of the symbols in a date range,
+    leaving out near-duplicates if a deduplicator is given.
+    """
+    start = datetime.strptime(start_date, "%Y-%m-%d").date()
+    end = datetime.strptime(end_date, "%Y-%m-%d").date()
+    items = {}
+    for symbol, file_path in env_data_path.items():
+        with open(file_path, "rb") as f:
+            symbol_data = orjson.loads(f.read())
+        for cur_date_str, cur_data in sorted(symbol_data.items()):
+            cur_date = datetime.strptime(cur_date_str, "%Y-%m-%d").date()
+            if not (start <= cur_date <= end):
+                continue
+            news = cur_data.get("news") or []
+            if deduplicator is not None:
+                news = deduplicator(symbol, cur_date, news)
+            for text in news:
+                items[pre_embedding_key(symbol, cur_date_str, text)] = text
+    return sorted(items.items())
+
+
+class PreEmbeddingStore:
+    """
+    Memory-mapped embedding matrix with an index from (symbol, date, text)
+    keys to matrix rows.
+    """
+
+    def __init__(
+        self, embeddings: np.ndarray, index: Dict[str, int], meta: Dict[str, Any]
+    ) -> None:
+        self.embeddings = embeddings
+        self.index = index
+        self.meta = meta
+
+    @classmethod
+    def build(
+        cls,
+        items: List[Tuple[str, str]],
+        emb_config: Dict[str, Any],
+        path: str,
+    ) -> "PreEmbeddingStore":
+        ensure_path(path)
+        emb_model = get_embedding_model(emb_config=emb_config)
+        embeddings = np.lib.format.open_memmap(
+            os.path.join(path, "embeddings.npy"),
+            mode="w+",
+            dtype=np.float32,
+            shape=(len(items), emb_config["emb_size"]),
+        )
+        for start in range(0, len(items), PRE_EMBEDDING_CHUNK_SIZE):
+            chunk = items[start : start + PRE_EMBEDDING_CHUNK_SIZE]
+            embeddings[start : start + len(chunk)] = emb_model(
+                texts=[text for _, text in chunk]
+            )
+            logger.info(
+                f"SYS-Pre-embedded {start + len(chunk)}/{len(items)} texts into {path}"
+            )
+        embeddings.flush()
+        index = {key: i for i, (key, _) in enumerate(items)}
+        meta = {
+            "emb_model_name": emb_config["emb_model_name"],
+            "emb_size": emb_config["emb_size"],
+            "num_records": len(items),
+        }
+        with open(os.path.join(path, "index.json"), "w") as f:
+            f.write(orjson.dumps({"meta": meta, "index": index}).decode())
+        return cls(embeddings=embeddings, index=index, meta=meta)
+
+    @classmethod
+    def load(cls, path: str, emb_config: Dict[str, Any]) -> "PreEmbeddingStore":
+        with open(os.path.join(path, "index.json"), "rb") as f:
+            index_file = orjson.loads(f.read())
+        meta = index_file["meta"]
+        if (meta["emb_model_name"] != emb_config["emb_model_name"]) or (
+            meta["emb_size"] != emb_config["emb_size"]
+        ):
+            raise PreEmbeddingMismatch(
+                f"Pre-embedding in {path} was built with {meta['emb_model_name']} ({meta['emb_size']}), "
+                f"but the run uses {emb_config['emb_model_name']} ({emb_config['emb_size']})"
+            )
+        embeddings = np.load(os.path.join(path, "embeddings.npy"), mmap_mode="r")
+        logger.info(f"SYS-Loaded {meta['num_records']} pre-computed embeddings from {path}")
+        return cls(embeddings=embeddings, index=index_file["index"], meta=meta)
+
+    def lookup(
+        self, symbol: str, cur_date: Union[date, str], texts: List[str]
+    ) -> Union[np.ndarray, None]:
+        """Return the vectors of all texts, or None if any of them is missing."""
+        rows = []
+        for text in texts:
+            row = self.index.get(pre_embedding_key(symbol, cur_date, text))
+            if row is None:
+                return None
+            rows.append(row)
+        return np.asarray(self.embeddings[rows], dtype=np.float32)
@@ -0,0 +1,143 @@
+import threading
+import time
+from typing import Any, Dict, List, Union
+
+import httpx
+import orjson
+from loguru import logger
+
+from .utils import estimate_tokens
+
+
+def estimate_request_tokens(request: httpx.Request) -> int:
+    """Prompt estimate from the body plus the completion budget the request asks for."""
+    body = request.read()
+    try:
+        max_tokens = orjson.loads(body).get("max_tokens") or 0
+    except (orjson.JSONDecodeError, AttributeError):
+        max_tokens = 0
+    return estimate_tokens(body.decode("utf-8", errors="ignore")) + int(max_tokens)
+
+
+class RateLimiter:
+    """
+    Token bucket over requests per minute and (estimated) tokens per minute.
+
+    Callers reserve capacity up front and sleep off the debt, so waiters are
+    served in arrival order. A 429 multiplies the refill rate by
+    ``decrease_factor`` (at most once per ``decrease_cooldown`` seconds) and
+    pauses the bucket for Retry-After; every successful response adds back
+    ``increase_step`` of the configured rate.
+    """
+
+    def __init__(self, rate_config: Dict[str, Any]) -> None:
+        self.requests_per_minute = rate_config.get("requests_per_minute")
+        self.tokens_per_minute = rate_config.get("tokens_per_minute")
+        if not (self.requests_per_minute or self.tokens_per_minute):
+            raise ValueError("rate_limit needs requests_per_minute or tokens_per_minute")
+        self.burst_seconds = rate_config.get("burst_seconds", 1.0)
+        self.decrease_factor = rate_config.get("decrease_factor", 0.5)
+        self.decrease_cooldown = rate_config.get("decrease_cooldown", 5.0)
+        self.increase_step = rate_config.get("increase_step", 0.02)
+        self.min_scale = rate_config.get("min_scale", 0.05)
+        self._lock = threading.Lock()
+        self.scale = 1.0
+        self._requests = self._capacity(self.requests_per_minute)
+        self._tokens = self._capacity(self.tokens_per_minute)
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._last_decrease = float("-inf")
+        self.num_acquired = 0
+        self.num_throttled = 0
+        self.wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+        self._step_mark = 0.0
+        self.step_waits: List[Dict[str, Any]] = []
+
+    def _capacity(self, per_minute: Union[float, None]) -> float:
+        if not per_minute:
+            return 0.0
+        # a full bucket always admits at least one request
+        return max(per_minute / 60 * self.burst_seconds, 1.0)
+
+    def _refill(self, now: float) -> None:
+        elapsed = now - self._updated
+        self._updated = now
+        if self.requests_per_minute:
+            self._requests = min(
+                self._requests + elapsed * self.requests_per_minute / 60 * self.scale,
+                self._capacity(self.requests_per_minute),
+            )
+        if self.tokens_per_minute:
+            self._tokens = min(
+                self._tokens + elapsed * self.tokens_per_minute / 60 * self.scale,
+                self._capacity(self.tokens_per_minute),
+            )
+
+    def acquire(self, tokens: int = 0) -> float:
+        """Block until the request may be sent; returns the seconds waited."""
+        start = time.monotonic()
+        with self._lock:
+            self._refill(start)
+            wait = self._paused_until - start
+            if self.requests_per_minute:
+                self._requests -= 1
+                wait = max(wait, -self._requests / (self.requests_per_minute / 60 * self.scale))
+            if self.tokens_per_minute:
+                # larger than the bucket would never fit, charge a full bucket instead
+                self._tokens -= min(tokens, self._capacity(self.tokens_per_minute))
+                wait = max(wait, -self._tokens / (self.tokens_per_minute / 60 * self.scale))
+        while wait > 0:
+            time.sleep(wait)
+            # a 429 may have paused the bucket while we slept
+            with self._lock:
+                wait = self._paused_until - time.monotonic()
+        waited = time.monotonic() - start
+        with self._lock:
+            self.num_acquired += 1
+            self.wait_seconds += waited
+            self.max_wait_seconds = max(self.max_wait_seconds, waited)
+        if waited > 1.0:
+            logger.debug(f"SYS-Rate limiter held a request for {waited:.2f}s")
+        return waited
+
+    def throttle(self, retry_after: Union[float, None] = None) -> None:
+        """The server answered 429: slow down and hold every caller for Retry-After."""
+        now = time.monotonic()
+        with self._lock:
+            self.num_throttled += 1
+            if retry_after:
+                self._paused_until = max(self._paused_until, now + retry_after)
+            if now - self._last_decrease < self.decrease_cooldown:
+                return
+            self._refill(now)
+            self._last_decrease = now
+            self.scale = max(self.scale * self.decrease_factor, self.min_scale)
+        logger.warning(f"SYS-Rate limited by server, refill rate scaled to {self.scale:.2f}")
+
+    def success(self) -> None:
+        with self._lock:
+            if self.scale < 1.0:
+                self._refill(time.monotonic())
+                self.scale = min(self.scale + self.increase_step, 1.0)
+
+    def mark_step(self, step: Any) -> float:
+        """Record the time spent waiting since the previous step."""
+        with self._lock:
+            waited = self.wait_seconds - self._step_mark
+            self._step_mark = self.wait_seconds
+            self.step_waits.append({"step": step, "wait_seconds": waited})
+        return waited
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "requests_per_minute": self.requests_per_minute,
+                "tokens_per_minute": self.tokens_per_minute,
+                "scale": self.scale,
+                "acquired": self.num_acquired,
+                "throttled": self.num_throttled,
+                "wait_seconds": self.wait_seconds,
+                "max_wait_seconds": self.max_wait_seconds,
+                "step_waits": list(self.step_waits),
+            }
@@ -0,0 +1,301 @@
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, Deque, Dict, List, Union
+
+import httpx
+from loguru import logger
+
+from .transport import RETRYABLE_STATUS_CODES, transport_registry
+
+
+class Replica:
+    def __init__(self, url: str, client: httpx.Client) -> None:
+        self.url = url
+        self.client = client
+        self.outstanding = 0
+        self.consecutive_failures = 0
+        self.ejected_until = 0.0
+        self.requests = 0
+        self.failures = 0
+        self.ejections = 0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "requests": self.requests,
+            "failures": self.failures,
+            "ejections": self.ejections,
+            "outstanding": self.outstanding,
+            "ejected": self.ejected_until > time.monotonic(),
+        }
+
+
+class ReplicaPool:
+    """
+    Inference servers that serve the same model. Each request goes to the
+    healthy replica with the fewest outstanding requests. A replica that fails
+    ``eject_after`` requests in a row (connection errors or retryable status
+    codes) is ejected for ``eject_seconds``, and the request fails over to
+    another replica, at most ``max_failovers`` times. With several replicas
+    the pooled transports do not retry, failover replaces retries so that a
+    dead replica is skipped at once; a single replica keeps its retries.
+    After its ejection a replica gets traffic again; one more failure ejects
+    it anew. When every replica is ejected the one due back first is tried.
+
+    With ``hedge_config`` a request that is still running after the
+    ``percentile`` of recent latencies is sent once more, without failover,
+    to the least loaded replica (the same one if it is alone), and the first
+    good response wins. The synchronous client cannot abort the other
+    request; it is left to finish in the background and its response is
+    discarded. At most ``max_in_flight`` hedges run at a time, counting the
+    abandoned ones, so hedging cannot pile load onto a struggling pool.
+    """
+
+    def __init__(
+        self,
+        urls: Union[str, List[str]],
+        pool_config: Dict[str, Any],
+        http_config: Dict[str, Any],
+        hedge_config: Union[Dict[str, Any], None] = None,
+    ) -> None:
+        if isinstance(urls, str):
+            urls = [urls]
+        if not urls:
+            raise ValueError("No inference endpoint configured")
+        self.eject_after = pool_config.get("eject_after", 3)
+        self.eject_seconds = pool_config.get("eject_seconds", 30.0)
+        self.max_failovers = pool_config.get("max_failovers", len(urls) - 1)
+        self._lock = threading.Lock()
+        if len(urls) > 1:
+            http_config = {**http_config, "max_retries": 0}
+        # pooled clients, shared with every endpoint on the same server
+        self.replicas = [
+            Replica(url.rstrip("/"), transport_registry.acquire(url, http_config))
+            for url in urls
+        ]
+        self.num_failovers = 0
+        self.hedge_config = hedge_config
+        self._hedge_executor = None
+        if hedge_config:
+            self.hedge_percentile = hedge_config.get("percentile", 95)
+            self.hedge_min_samples = hedge_config.get("min_samples", 20)
+            # seconds to wait before the window has min_samples, None to not hedge until then
+            self.hedge_initial_delay = hedge_config.get("initial_delay")
+            self.hedge_min_delay = hedge_config.get("min_delay", 0.0)
+            self.hedge_max_in_flight = hedge_config.get("max_in_flight", 4)
+            self._hedges_in_flight = 0
+            self._latencies: Deque[float] = deque(maxlen=hedge_config.get("window", 500))
+            self._hedge_executor = ThreadPoolExecutor(
+                max_workers=hedge_config.get("max_workers", 32),
+                thread_name_prefix="hedge",
+            )
+            self.num_hedged_requests = 0
+            self.num_hedges_fired = 0
+            self.num_hedges_won = 0
+            self.num_hedges_skipped = 0
+        logger.trace(f"SYS-Replica pool: {[r.url for r in self.replicas]}")
+
+    @property
+    def urls(self) -> List[str]:
+        return [replica.url for replica in self.replicas]
+
+    def pick(self, exclude: List[Replica]) -> Replica:
+        now = time.monotonic()
+        with self._lock:
+            candidates = [r for r in self.replicas if r not in exclude] or self.replicas
+            healthy = [r for r in candidates if r.ejected_until <= now]
+            if healthy:
+                # total requests as tie breaker spreads an idle pool round robin
+                replica = min(healthy, key=lambda r: (r.outstanding, r.requests))
+            else:
+                replica = min(candidates, key=lambda r: r.ejected_until)
+            replica.outstanding += 1
+            replica.requests += 1
+            return replica
+
+    def release(self, replica: Replica, success: bool) -> None:
+        now = time.monotonic()
+        with self._lock:
+            replica.outstanding -= 1
+            if success:
+                replica.consecutive_failures = 0
+                return
+            replica.failures += 1
+            replica.consecutive_failures += 1
+            if (replica.consecutive_failures < self.eject_after) or (
+                replica.ejected_until > now
+            ):
+                return
+            replica.ejected_until = now + self.eject_seconds
+            replica.ejections += 1
+        logger.warning(
+            f"SYS-Ejected replica {replica.url} for {self.eject_seconds}s after {replica.consecutive_failures} failures"
+        )
+
+    def send(self, replica: Replica, method: str, path: str, **kwargs) -> httpx.Response:
+        """One request on ``replica``; the caller must have picked it."""
+        try:
+            response = replica.client.request(method, f"{replica.url}{path}", **kwargs)
+        except httpx.HTTPError:
+            self.release(replica, False)
+            raise
+        self.release(replica, response.status_code not in RETRYABLE_STATUS_CODES)
+        return response
+
+    def request(self, method: str, path: str, **kwargs) -> httpx.Response:
+        tried: List[Replica] = []
+        start = time.perf_counter()
+        while True:
+            replica = self.pick(tried)
+            tried.append(replica)
+            can_fail_over = len(tried) <= self.max_failovers and len(tried) < len(
+                self.replicas
+            )
+            try:
+                response = self.send(replica, method, path, **kwargs)
+            except httpx.HTTPError as e:
+                if not can_fail_over:
+                    raise
+                logger.warning(
+                    f"SYS-Replica {replica.url} failed with {type(e).__name__}, failing over"
+                )
+            else:
+                if (response.status_code not in RETRYABLE_STATUS_CODES) or (
+                    not can_fail_over
+                ):
+                    if self._hedge_executor is not None and response.status_code < 400:
+                        with self._lock:
+                            self._latencies.append(time.perf_counter() - start)
+                    return response
+                logger.warning(
+                    f"SYS-Replica {replica.url} returned {response.status_code}, failing over"
+                )
+            with self._lock:
+                self.num_failovers += 1
+
+    def _hedge_delay(self) -> Union[float, None]:
+        with self._lock:
+            if len(self._latencies) < self.hedge_min_samples:
+                return self.hedge_initial_delay
+            latencies = sorted(self._latencies)
+        index = min(
+            int(len(latencies) * self.hedge_percentile / 100), len(latencies) - 1
+        )
+        return max(latencies[index], self.hedge_min_delay)
+
+    @staticmethod
+    def _succeeded(future: Future) -> bool:
+        return (future.exception() is None) and (
+            future.result().status_code not in RETRYABLE_STATUS_CODES
+        )
+
+    @staticmethod
+    def _discard(future: Future) -> None:
+        if (not future.cancel()) and (future.exception() is None):
+            future.result().close()
+
+    def _send_hedge(self, method: str, path: str, **kwargs) -> httpx.Response:
+        # a single attempt, failover stays with the primary request
+        return self.send(self.pick([]), method, path, **kwargs)
+
+    def _hedge_done(self, future: Future) -> None:
+        # runs when the hedge finishes or is cancelled before it started
+        with self._lock:
+            self._hedges_in_flight -= 1
+
+    def hedged_request(self, method: str, path: str, **kwargs) -> httpx.Response:
+        delay = self._hedge_delay()
+        if delay is None:
+            return self.request(method, path, **kwargs)
+        with self._lock:
+            self.num_hedged_requests += 1
+        primary = self._hedge_executor.submit(self.request, method, path, **kwargs)  # type: ignore
+        done, _ = wait([primary], timeout=delay)
+        if done:
+            return primary.result()
+        with self._lock:
+            within_budget = self._hedges_in_flight < self.hedge_max_in_flight
+            if within_budget:
+                self._hedges_in_flight += 1
+                self.num_hedges_fired += 1
+            else:
+                self.num_hedges_skipped += 1
+        if not within_budget:
+            return primary.result()
+        hedge = self._hedge_executor.submit(self._send_hedge, method, path, **kwargs)  # type: ignore
+        hedge.add_done_callback(self._hedge_done)
+        logger.debug(f"SYS-Request to {path} still running after {delay:.2f}s, hedged")
+        pending = {primary, hedge}
+        while True:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            winner = next((f for f in done if self._succeeded(f)), None)
+            if winner is None and pending:
+                # the first to finish failed, the other may still succeed
+                continue
+            winner = winner or next(
+                (f for f in (primary, hedge) if f.exception() is None), primary
+            )
+            if winner is hedge:
+                with self._lock:
+                    self.num_hedges_won += 1
+            for future in (primary, hedge):
+                if future is not winner:
+                    future.add_done_callback(self._discard)
+            return winner.result()
+
+    def post(self, path: str, **kwargs) -> httpx.Response:
+        if self._hedge_executor is not None:
+            return self.hedged_request("POST", path, **kwargs)
+        return self.request("POST", path, **kwargs)
+
+    def check_health(self, timeout: float) -> List[str]:
+        """Probe /health on every replica, eject the ones that are down; returns the live urls."""
+        alive = []
+        for replica in self.replicas:
+            try:
+                healthy = (
+                    replica.client.get(f"{replica.url}/health", timeout=timeout).status_code
+                    == 200
+                )
+            except httpx.HTTPError:
+                healthy = False
+            if healthy:
+                alive.append(replica.url)
+                continue
+            logger.warning(f"SYS-Replica {replica.url} is not healthy")
+            with self._lock:
+                replica.ejected_until = time.monotonic() + self.eject_seconds
+                replica.ejections += 1
+        return alive
+
+    def close(self) -> None:
+        if self._hedge_executor is not None:
+            # abandoned hedges must not hold up shutdown
+            self._hedge_executor.shutdown(wait=False, cancel_futures=True)
+        for replica in self.replicas:
+            transport_registry.release(replica.url)
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            report: Dict[str, Any] = {
+                "failovers": self.num_failovers,
+                "replicas": {replica.url: replica.to_dict() for replica in self.replicas},
+            }
+            if self._hedge_executor is not None:
+                report["hedging"] = {
+                    "percentile": self.hedge_percentile,
+                    "requests": self.num_hedged_requests,
+                    "fired": self.num_hedges_fired,
+                    "won": self.num_hedges_won,
+                    "skipped_over_budget": self.num_hedges_skipped,
+                    "fired_rate": self.num_hedges_fired / self.num_hedged_requests
+                    if self.num_hedged_requests
+                    else None,
+                    "won_rate": self.num_hedges_won / self.num_hedges_fired
+                    if self.num_hedges_fired
+                    else None,
+                }
+        if self._hedge_executor is not None:
+            report["hedging"]["delay_seconds"] = self._hedge_delay()
+        return report
@@ -0,0 +1,142 @@
+import hashlib
+import os
+import threading
+from typing import Any, Dict, List, Tuple, Union
+
+import orjson
+from loguru import logger
+
+from .utils import ensure_path
+
+# eviction trims the cache down to this fraction of max_bytes
+EVICTION_LOW_WATER = 0.9
+
+
+class ResponseCache:
+    """
+    On-disk cache of raw LLM responses keyed by the sha256 of the full request
+    (model, messages or prompt, guided schema, sampling parameters and seed).
+
+    Entries are sharded by the first two hex digits of the key. Reads refresh
+    the file mtime, and writes evict the least recently used entries once the
+    cache grows beyond ``max_bytes``. In ``read_only`` mode the cache is only
+    replayed, never written or touched.
+    """
+
+    def __init__(self, cache_config: Dict[str, Any]) -> None:
+        self.path = cache_config["path"]
+        self.max_bytes = cache_config.get("max_bytes", 1 << 30)
+        self.read_only = cache_config.get("read_only", False)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.evictions = 0
+        if not self.read_only:
+            ensure_path(self.path)
+        self._total_bytes = sum(size for _, _, size in self._entries())
+        logger.info(
+            f"CHAT-Response cache at {self.path}: {self._total_bytes} bytes, read_only={self.read_only}"
+        )
+
+    @staticmethod
+    def key(request: Dict[str, Any]) -> str:
+        return hashlib.sha256(
+            orjson.dumps(request, option=orjson.OPT_SORT_KEYS, default=str)
+        ).hexdigest()
+
+    def _file(self, key: str) -> str:
+        return os.path.join(self.path, key[:2], f"{key}.json")
+
+    def _entries(self) -> List[Tuple[float, str, int]]:
+        entries = []
+        if not os.path.isdir(self.path):
+            return entries
+        for shard in os.scandir(self.path):
+            if not shard.is_dir():
+                continue
+            for entry in os.scandir(shard.path):
+                if not entry.name.endswith(".json"):
+                    continue
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, entry.path, stat.st_size))
+        return entries
+
+    def get(self, key: str) -> Union[Dict[str, Any], None]:
+        file = self._file(key)
+        try:
+            with open(file, "rb") as f:
+                value = orjson.loads(f.read())
+        except (FileNotFoundError, orjson.JSONDecodeError):
+            with self._lock:
+                self.misses += 1
+            return None
+        if not self.read_only:
+            try:
+                os.utime(file)
+            except FileNotFoundError:
+                pass
+        with self._lock:
+            self.hits += 1
+        logger.trace(f"CHAT-Response cache hit {key}")
+        return value
+
+    def put(self, key: str, value: Dict[str, Any]) -> None:
+        if self.read_only:
+            return
+        file = self._file(key)
+        ensure_path(os.path.dirname(file))
+        data = orjson.dumps(value)
+        tmp_file = f"{file}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_file, "wb") as f:
+            f.write(data)
+        os.replace(tmp_file, file)
+        with self._lock:
+            self.writes += 1
+            self._total_bytes += len(data)
+            if self._total_bytes > self.max_bytes:
+                self._evict()
+
+    def _evict(self) -> None:
+        # other processes may share the directory, so recount from disk
+        entries = sorted(self._entries())
+        self._total_bytes = sum(size for _, _, size in entries)
+        target = self.max_bytes * EVICTION_LOW_WATER
+        for _, file, size in entries:
+            if self._total_bytes <= target:
+                break
+            try:
+                os.remove(file)
+            except FileNotFoundError:
+                pass
+            self._total_bytes -= size
+            self.evictions += 1
+        logger.debug(
+            f"CHAT-Response cache evicted down to {self._total_bytes} bytes ({self.evictions} evictions so far)"
+        )
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "writes": self.writes,
+                "evictions": self.evictions,
+                "bytes": self._total_bytes,
+            }
+
+    def save(self, path: str, file_name: str) -> None:
+        ensure_path(path)
+        with open(os.path.join(path, file_name), "w") as f:
+            f.write(orjson.dumps(self.to_dict(), option=orjson.OPT_INDENT_2).decode())
+        logger.info(f"SYS-Response cache stats saved to {os.path.join(path, file_name)}")
+
+
+def get_response_cache(chat_config: Dict[str, Any]) -> Union[ResponseCache, None]:
+    cache_config = chat_config.get("chat_response_cache")
+    if not cache_config:
+        return None
+    return ResponseCache(cache_config)
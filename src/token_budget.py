@@ -0,0 +1,191 @@
+import functools
+import threading
+from typing import Any, Dict, List, Tuple, Union
+
+from loguru import logger
+
+from .instrumentation import Instrumentation
+from .utils import estimate_tokens
+
+try:
+    from transformers import AutoTokenizer
+except ImportError:
+    AutoTokenizer = None
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+LAYERS = ("short", "mid", "long", "reflection")
+DEFAULT_LAYER_SHARES = {"short": 0.4, "mid": 0.2, "long": 0.2, "reflection": 0.2}
+
+
+class TokenCounter:
+    """
+    Counts and truncates text with the tokenizer of the chat model: a Hugging
+    Face tokenizer, a tiktoken encoding, or the ~4 bytes per token heuristic.
+    """
+
+    # loaded tokenizers are shared by every agent in the process
+    _cache: Dict[Tuple[str, str], "TokenCounter"] = {}
+    _lock = threading.Lock()
+
+    def __init__(self, backend: str, tokenizer: Any = None) -> None:
+        self.backend = backend
+        self.tokenizer = tokenizer
+
+    @classmethod
+    def load(cls, backend: str, name: str) -> "TokenCounter":
+        with cls._lock:
+            if (backend, name) not in cls._cache:
+                cls._cache[(backend, name)] = cls._load(backend, name)
+            return cls._cache[(backend, name)]
+
+    @classmethod
+    def _load(cls, backend: str, name: str) -> "TokenCounter":
+        if backend in ("auto", "hf") and AutoTokenizer is not None:
+            try:
+                tokenizer = AutoTokenizer.from_pretrained(name)
+                logger.info(f"SYS-Loaded {name} tokenizer for prompt budgeting")
+                return cls("hf", tokenizer)
+            except (OSError, ValueError) as e:
+                if backend == "hf":
+                    raise
+                logger.warning(f"SYS-Could not load tokenizer {name}: {e}")
+        if backend in ("auto", "tiktoken") and tiktoken is not None:
+            try:
+                encoding = tiktoken.encoding_for_model(name)
+            except KeyError:
+                encoding = tiktoken.get_encoding("cl100k_base")
+            logger.info(f"SYS-Using tiktoken {encoding.name} for prompt budgeting")
+            return cls("tiktoken", encoding)
+        if backend not in ("auto", "heuristic"):
+            raise ImportError(f"Tokenizer backend {backend} is not installed")
+        logger.warning("SYS-No tokenizer available, estimating prompt tokens from bytes")
+        return cls("heuristic")
+
+    def encode(self, text: str) -> List[int]:
+        if self.backend == "hf":
+            return self.tokenizer.encode(text, add_special_tokens=False)
+        return self.tokenizer.encode(text, disallowed_special=())
+
+    def count(self, text: str) -> int:
+        if self.backend == "heuristic":
+            return estimate_tokens(text)
+        return len(self.encode(text))
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        if self.backend == "heuristic":
+            return text.encode("utf-8")[: max(max_tokens - 1, 0) * 4].decode(
+                "utf-8", errors="ignore"
+            )
+        tokens = self.encode(text)
+        if len(tokens) <= max_tokens:
+            return text
+        return self.tokenizer.decode(tokens[:max_tokens])
+
+
+class PromptBudget:
+    """
+    Fits the retrieved memories of each symbol into ``max_memory_tokens``.
+
+    The budget is split evenly across symbols and by ``layer_shares`` across
+    layers; what a layer does not use goes to the layers that need more.
+    Within a layer memories are kept best-first, each cut to
+    ``max_item_tokens``; the memory that crosses the budget is truncated if at
+    least ``min_item_tokens`` remain, and it and every lower-scored memory are
+    dropped otherwise.
+    """
+
+    def __init__(self, budget_config: Dict[str, Any], model_name: str) -> None:
+        self.max_memory_tokens = budget_config["max_memory_tokens"]
+        self.max_item_tokens = budget_config.get("max_item_tokens", 512)
+        self.min_item_tokens = budget_config.get("min_item_tokens", 32)
+        self.layer_shares = budget_config.get("layer_shares", DEFAULT_LAYER_SHARES)
+        self.counter = TokenCounter.load(
+            budget_config.get("tokenizer", "auto"),
+            budget_config.get("tokenizer_path", model_name),
+        )
+        # long-term memories come back day after day
+        self._count = functools.lru_cache(maxsize=8192)(self.counter.count)
+
+    def _allocate(self, budget: int, demand: Dict[str, int]) -> Dict[str, int]:
+        # water-filling: split by share, hand what saturated layers leave to the rest
+        allocation = {layer: 0 for layer in demand}
+        active = [layer for layer in demand if demand[layer] > 0]
+        remaining = budget
+        while active and remaining > 0:
+            total_share = sum(self.layer_shares.get(layer, 0) for layer in active)
+            if total_share <= 0:
+                break
+            granted = 0
+            for layer in active:
+                grant = min(
+                    int(remaining * self.layer_shares.get(layer, 0) / total_share),
+                    demand[layer] - allocation[layer],
+                )
+                allocation[layer] += grant
+                granted += grant
+            remaining -= granted
+            unsaturated = [layer for layer in active if allocation[layer] < demand[layer]]
+            if (granted == 0) or (len(unsaturated) == len(active)):
+                break
+            active = unsaturated
+        # int() rounding leaves up to a token per layer, the largest share takes it
+        for layer in sorted(active, key=lambda layer: -self.layer_shares.get(layer, 0)):
+            if (remaining <= 0) or (self.layer_shares.get(layer, 0) <= 0):
+                break
+            grant = min(remaining, demand[layer] - allocation[layer])
+            allocation[layer] += grant
+            remaining -= grant
+        return allocation
+
+    def _fit_layer(
+        self, texts: List[str], ids: List[int], budget: int, stats: Instrumentation
+    ) -> Tuple[List[str], List[int]]:
+        kept_texts, kept_ids = [], []
+        for text, memory_id in zip(texts, ids):
+            num_tokens = self._count(text)
+            limit = min(self.max_item_tokens, budget)
+            if num_tokens > limit:
+                if limit < self.min_item_tokens:
+                    break
+                text = self.counter.truncate(text, limit)
+                num_tokens = limit
+                stats.incr("prompt_budget_truncated")
+            kept_texts.append(text)
+            kept_ids.append(memory_id)
+            budget -= num_tokens
+        stats.incr("prompt_budget_dropped", len(texts) - len(kept_texts))
+        return kept_texts, kept_ids
+
+    def __call__(
+        self,
+        queried_memories: Dict[str, Dict[str, Union[List, None]]],
+        stats: Instrumentation,
+    ) -> Dict[str, Dict[str, Union[List, None]]]:
+        symbol_budget = self.max_memory_tokens // max(len(queried_memories), 1)
+        fitted = {}
+        for symbol, memories in queried_memories.items():
+            demand = {
+                layer: sum(
+                    min(self._count(t), self.max_item_tokens)
+                    for t in (memories[f"{layer}_memory"] or [])
+                )
+                for layer in LAYERS
+            }
+            allocation = self._allocate(symbol_budget, demand)
+            fitted[symbol] = dict(memories)
+            for layer in LAYERS:
+                if not memories[f"{layer}_memory"]:
+                    continue
+                texts, ids = self._fit_layer(
+                    memories[f"{layer}_memory"],  # type: ignore
+                    memories[f"{layer}_memory_id"],  # type: ignore
+                    allocation[layer],
+                    stats,
+                )
+                fitted[symbol][f"{layer}_memory"] = texts or None
+                fitted[symbol][f"{layer}_memory_id"] = ids or None
+        return fitted
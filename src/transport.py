@@ -0,0 +1,299 @@
+import os
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Any, Dict, Set, Tuple, Union
+
+import httpx
+import orjson
+from loguru import logger
+
+from .cassette import Cassette, RecordingTransport, ReplayTransport
+from .instrumentation import OperationStats
+from .rate_limit import RateLimiter, estimate_request_tokens
+from .utils import ensure_path
+
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+class EndpointStats:
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.latency = OperationStats()
+        self.status_codes: Dict[int, int] = {}
+        self.counters: Dict[str, int] = {}
+
+    def record(self, elapsed: float, status_code: int) -> None:
+        with self._lock:
+            self.latency.record(elapsed)
+            self.status_codes[status_code] = self.status_codes.get(status_code, 0) + 1
+
+    def incr(self, counter: str, value: int = 1) -> None:
+        with self._lock:
+            self.counters[counter] = self.counters.get(counter, 0) + value
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "latency_to_headers": self.latency.to_dict(),
+                "status_codes": dict(self.status_codes),
+                "counters": dict(self.counters),
+            }
+
+
+class RetryingTransport(httpx.BaseTransport):
+    """
+    Pooled HTTP transport that retries connection errors and retryable
+    status codes with jittered exponential backoff, honouring Retry-After.
+    """
+
+    def __init__(self, transport_config: Dict[str, Any], stats: EndpointStats) -> None:
+        http2 = transport_config.get("http2", False)
+        if http2:
+            try:
+                import h2  # noqa: F401
+            except ImportError:
+                logger.warning("SYS-http2 requested but h2 is not installed, using http/1.1")
+                http2 = False
+        self._transport = httpx.HTTPTransport(
+            http2=http2,
+            limits=httpx.Limits(
+                max_connections=transport_config.get("max_connections", 20),
+                max_keepalive_connections=transport_config.get(
+                    "max_keepalive_connections", 20
+                ),
+                keepalive_expiry=transport_config.get("keepalive_expiry", 60.0),
+            ),
+        )
+        self.max_retries = transport_config.get("max_retries", 3)
+        self.backoff_base = transport_config.get("backoff_base", 0.5)
+        self.backoff_max = transport_config.get("backoff_max", 30.0)
+        self.max_retry_after = transport_config.get("max_retry_after", 120.0)
+        self.stats = stats
+
+    def _backoff(self, attempt: int) -> float:
+        # full jitter
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2**attempt))
+
+    @staticmethod
+    def _retry_after(response: httpx.Response) -> Union[float, None]:
+        value = response.headers.get("retry-after")
+        if value is None:
+            return None
+        try:
+            return max(float(value), 0.0)
+        except ValueError:
+            pass
+        try:
+            return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+        except (TypeError, ValueError):
+            return None
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        # buffer the body so that it can be sent again
+        request.read()
+        # set per caller by LimitedTransport, the pooled transport itself is shared
+        rate_limiter = request.extensions.get("rate_limiter")
+        num_tokens = estimate_request_tokens(request) if rate_limiter else 0
+        attempt = 0
+        while True:
+            if rate_limiter is not None:
+                rate_limiter.acquire(num_tokens)
+            start = time.perf_counter()
+            try:
+                response = self._transport.handle_request(request)
+            except httpx.TransportError as e:
+                self.stats.incr("transport_errors")
+                if attempt >= self.max_retries:
+                    self.stats.incr("failures")
+                    raise
+                delay = self._backoff(attempt)
+                logger.warning(
+                    f"SYS-{request.method} {request.url} failed with {type(e).__name__}, retry in {delay:.2f}s"
+                )
+            else:
+                self.stats.record(time.perf_counter() - start, response.status_code)
+                if rate_limiter is not None and response.status_code < 400:
+                    rate_limiter.success()
+                if (response.status_code not in RETRYABLE_STATUS_CODES) or (
+                    attempt >= self.max_retries
+                ):
+                    if response.status_code in RETRYABLE_STATUS_CODES:
+                        self.stats.incr("failures")
+                    return response
+                retry_after = self._retry_after(response)
+                response.close()
+                if retry_after is not None:
+                    self.stats.incr("retry_after_honoured")
+                    delay = min(retry_after, self.max_retry_after)
+                else:
+                    delay = self._backoff(attempt)
+                logger.warning(
+                    f"SYS-{request.method} {request.url} returned {response.status_code}, retry in {delay:.2f}s"
+                )
+                if rate_limiter is not None and response.status_code == 429:
+                    # the pause applies to every caller of the limiter, the retry waits in acquire
+                    rate_limiter.throttle(delay)
+                    delay = 0.0
+            self.stats.incr("retries")
+            attempt += 1
+            time.sleep(delay)
+
+    def close(self) -> None:
+        self._transport.close()
+
+
+class LimitedTransport(httpx.BaseTransport):
+    """
+    One caller's view of a pooled transport: tags its requests with the
+    caller's rate limiter. Closing it leaves the pooled transport open.
+    """
+
+    def __init__(
+        self, transport: httpx.BaseTransport, rate_limiter: Union[RateLimiter, None]
+    ) -> None:
+        self._transport = transport
+        self.rate_limiter = rate_limiter
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        if self.rate_limiter is not None:
+            request.extensions["rate_limiter"] = self.rate_limiter
+        return self._transport.handle_request(request)
+
+    def close(self) -> None:
+        pass
+
+
+class TransportRegistry:
+    """
+    Process-wide pooled transports keyed by api_base. Endpoints acquire a
+    client on init and release it on close; the pool closes with its last
+    user. Clients on the same api_base share the connection pool, retries and
+    stats of the first config; the rate limit is resolved for every caller.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._transports: Dict[str, httpx.BaseTransport] = {}
+        # one client per (api_base, rate limiter name)
+        self._clients: Dict[Tuple[str, Union[str, None]], httpx.Client] = {}
+        self._refcounts: Dict[str, int] = {}
+        self._configs: Dict[str, Dict[str, Any]] = {}
+        self._stats: Dict[str, EndpointStats] = {}
+        # limiters by name, endpoints configured with the same name share one bucket
+        self._rate_limiters: Dict[str, RateLimiter] = {}
+        self._rate_limit_configs: Dict[str, Dict[str, Any]] = {}
+        self._endpoint_limiters: Dict[str, Set[str]] = {}
+        self.cassette: Union[Cassette, None] = None
+
+    def use_cassette(self, cassette: Union[Cassette, None]) -> None:
+        """Record or replay every client created from now on; existing clients are unaffected."""
+        with self._lock:
+            self.cassette = cassette
+
+    def _rate_limiter(self, key: str, transport_config: Dict[str, Any]) -> Union[str, None]:
+        """Name of the caller's limiter, created on first use; by default one per api_base."""
+        rate_config = transport_config.get("rate_limit")
+        if not rate_config:
+            return None
+        name = rate_config.get("name", key)
+        if name not in self._rate_limiters:
+            self._rate_limiters[name] = RateLimiter(rate_config)
+            self._rate_limit_configs[name] = rate_config
+            logger.info(f"SYS-Rate limiter {name}: {rate_config}")
+        elif rate_config != self._rate_limit_configs[name]:
+            logger.warning(
+                f"SYS-Rate limiter {name} already exists with {self._rate_limit_configs[name]}, ignoring {rate_config}"
+            )
+        self._endpoint_limiters.setdefault(key, set()).add(name)
+        return name
+
+    def _transport(
+        self, transport_config: Dict[str, Any], stats: EndpointStats
+    ) -> httpx.BaseTransport:
+        if self.cassette is not None and self.cassette.mode == "replay":
+            return ReplayTransport(self.cassette)
+        transport = RetryingTransport(transport_config, stats)
+        if self.cassette is not None:
+            return RecordingTransport(transport, self.cassette)
+        return transport
+
+    @staticmethod
+    def _key(api_base: str) -> str:
+        return api_base.rstrip("/")
+
+    def acquire(
+        self, api_base: str, transport_config: Union[Dict[str, Any], None] = None
+    ) -> httpx.Client:
+        key = self._key(api_base)
+        transport_config = transport_config or {}
+        # the rate limit is per caller, everything else belongs to the pool
+        pool_config = {k: v for k, v in transport_config.items() if k != "rate_limit"}
+        with self._lock:
+            if key not in self._transports:
+                self._stats.setdefault(key, EndpointStats())
+                self._transports[key] = self._transport(pool_config, self._stats[key])
+                self._refcounts[key] = 0
+                self._configs[key] = pool_config
+                logger.trace(f"SYS-Created pooled transport for {key}")
+            elif pool_config and pool_config != self._configs[key]:
+                logger.warning(
+                    f"SYS-Pooled transport for {key} already exists, ignoring a different config {pool_config}"
+                )
+            name = self._rate_limiter(key, transport_config)
+            if (key, name) not in self._clients:
+                self._clients[(key, name)] = httpx.Client(
+                    transport=LimitedTransport(
+                        self._transports[key],
+                        self._rate_limiters[name] if name is not None else None,
+                    ),
+                    timeout=httpx.Timeout(
+                        self._configs[key].get("timeout", 60.0),
+                        connect=self._configs[key].get("connect_timeout", 10.0),
+                    ),
+                )
+            self._refcounts[key] += 1
+            return self._clients[(key, name)]
+
+    def release(self, api_base: str) -> None:
+        key = self._key(api_base)
+        with self._lock:
+            if key not in self._transports:
+                return
+            self._refcounts[key] -= 1
+            if self._refcounts[key] == 0:
+                for client_key in [k for k in self._clients if k[0] == key]:
+                    self._clients.pop(client_key).close()
+                self._transports.pop(key).close()
+                del self._refcounts[key]
+                del self._configs[key]
+                logger.trace(f"SYS-Closed pooled transport for {key}")
+
+    def mark_step(self, step: Any) -> float:
+        """Close the current step on every rate limiter; returns the seconds it waited on them."""
+        with self._lock:
+            rate_limiters = list(self._rate_limiters.values())
+        return sum(rate_limiter.mark_step(step) for rate_limiter in rate_limiters)
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            report = {key: stats.to_dict() for key, stats in self._stats.items()}
+            for key, names in self._endpoint_limiters.items():
+                report[key]["rate_limits"] = {
+                    name: self._rate_limiters[name].to_dict() for name in sorted(names)
+                }
+            return report
+
+    def save(self, path: str, file_name: str) -> None:
+        ensure_path(path)
+        with open(os.path.join(path, file_name), "w") as f:
+            f.write(
+                orjson.dumps(
+                    self.stats(), option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS
+                ).decode()
+            )
+        logger.info(f"SYS-Transport stats saved to {os.path.join(path, file_name)}")
+
+
+transport_registry = TransportRegistry()
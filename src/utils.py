@@ -15,6 +15,11 @@ class TaskType(str, Enum):
     MultiAssets = "multi_assets"
 
 
+def estimate_tokens(text: str) -> int:
+    # rough estimate shared by the embedding batcher, chunker and budgets, ~4 utf-8 bytes per token
+    return len(text.encode("utf-8")) // 4 + 1
+
+
 def ensure_path(save_path: str) -> None:
     if not os.path.exists(save_path):
         os.makedirs(save_path, exist_ok=True)
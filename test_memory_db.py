@@ -0,0 +1,230 @@
+"""
+MemoryDB bookkeeping against an in-process Qdrant with the hashing embedding
+backend, no network.
+"""
+
+import json
+import os
+from datetime import date
+
+import pytest
+
+from src.memory_db import (
+    AccessFeedback,
+    BrainLoadFailed,
+    ConstantAccessCounterUpdateFunction,
+    ConstantImportanceInitialization,
+    ConstantRecencyInitialization,
+    ImportanceDecay,
+    JumpDirection,
+    LinearCompoundScore,
+    MemoryDB,
+    Queries,
+    RecencyDecay,
+)
+
+EMB_CONFIG = {"emb_backend": "hashing", "emb_model_name": "hashing-64", "emb_size": 64}
+
+
+def agent_config(agent_name: str = "test-agent"):
+    return {"agent_name": agent_name, "memory_db_config": {"memory_db_endpoint": ":memory:"}}
+
+
+def add(
+    memory_db: MemoryDB, ids, layer="short", symbol="AAPL", importance=50.0, text=None
+):
+    memory_db.add_memory(
+        memory_input=[
+            {
+                "id": i,
+                "symbol": symbol,
+                "date": date(2024, 1, 1),
+                "text": text or f"memory number {i} about {symbol}",
+            }
+            for i in ids
+        ],
+        layer=layer,
+        importance_init_func=ConstantImportanceInitialization(importance),
+        recency_init_func=ConstantRecencyInitialization(),
+    )
+
+
+@pytest.fixture
+def memory_db():
+    db = MemoryDB(agent_config(), EMB_CONFIG)
+    yield db
+    db.close()
+
+
+def test_needs_clean_up_and_jump_count_in_qdrant(memory_db):
+    assert not memory_db.needs_clean_up(10.0, 0.5, "short")
+    add(memory_db, [1, 2], importance=50.0)
+    add(memory_db, [3], importance=5.0)
+
+    assert memory_db.needs_clean_up(10.0, 0.5, "short")
+    assert not memory_db.needs_clean_up(1.0, 0.5, "short")
+    assert not memory_db.needs_clean_up(10.0, 0.5, "mid")
+    # recency alone is enough
+    assert memory_db.needs_clean_up(1.0, 1.5, "short")
+
+    assert memory_db.needs_jump(JumpDirection.UP, "short", 50.0)
+    assert not memory_db.needs_jump(JumpDirection.UP, "short", 60.0)
+    assert memory_db.needs_jump(JumpDirection.DOWN, "short", 10.0)
+    assert not memory_db.needs_jump(JumpDirection.DOWN, "short", 1.0)
+
+    memory_db.clean_up(10.0, 0.5, "short")
+    assert memory_db.partition_counts() == {"short/AAPL": 2}
+    assert not memory_db.needs_clean_up(10.0, 0.5, "short")
+
+
+def feedback(memory_db: MemoryDB, record_id: int, direction: int, step=5.0) -> None:
+    memory_db.update_access_counter_with_feedback(
+        AccessFeedback(access_counter_records=[{"id": record_id, "feedback": direction}]),
+        ConstantAccessCounterUpdateFunction(step),
+    )
+
+
+def test_digest_round_trips(memory_db):
+    empty = memory_db.state_digest()
+    add(memory_db, [1, 2])
+    two = memory_db.state_digest()
+    assert two != empty
+
+    # update and undo
+    feedback(memory_db, 1, 1)
+    assert memory_db.state_digest() != two
+    feedback(memory_db, 1, -1)
+    assert memory_db.state_digest() == two
+
+    # insert and delete
+    add(memory_db, [3], importance=1.0)
+    assert memory_db.state_digest() != two
+    memory_db.clean_up(10.0, 0.5, "short")
+    assert memory_db.state_digest() == two
+
+    memory_db.clean_up(100.0, 0.5, "short")
+    assert memory_db.state_digest() == empty
+    assert memory_db.partition_digests() == {}
+
+
+def test_digest_is_order_independent(memory_db):
+    add(memory_db, [1, 2, 3])
+    add(memory_db, [4], layer="mid", symbol="TSLA")
+
+    other = MemoryDB(agent_config(), EMB_CONFIG)
+    try:
+        add(other, [4], layer="mid", symbol="TSLA")
+        add(other, [3])
+        add(other, [2, 1])
+        assert other.state_digest() == memory_db.state_digest()
+        assert other.partition_digests() == memory_db.partition_digests()
+    finally:
+        other.close()
+
+
+def test_checkpoint_round_trip_and_tampered_digest(memory_db, tmp_path):
+    add(memory_db, [1, 2])
+    add(memory_db, [3], layer="long")
+    memory_db.save_checkpoint(str(tmp_path))
+    assert not memory_db.has_unsaved_changes(str(tmp_path))
+
+    loaded = MemoryDB.load_checkpoint(str(tmp_path))
+    try:
+        assert loaded == memory_db
+        assert not loaded.has_unsaved_changes(str(tmp_path))
+    finally:
+        loaded.close()
+
+    digest_path = os.path.join(tmp_path, "brain", "digest.json")
+    with open(digest_path) as f:
+        saved = json.load(f)
+    saved["state_digest"] = "0" * 32
+    with open(digest_path, "w") as f:
+        json.dump(saved, f)
+    with pytest.raises(BrainLoadFailed):
+        MemoryDB.load_checkpoint(str(tmp_path))
+
+
+SCORE = LinearCompoundScore(upper_bound=100.0)
+QUERY = Queries(query_records=[{"query_text": "memory about AAPL", "k": 10, "symbol": "AAPL"}])
+
+
+def query_ids(memory_db: MemoryDB, layer: str = "short"):
+    return memory_db.query(QUERY, layer, SCORE)[0][1]
+
+
+def uncached_ids(memory_db: MemoryDB, layer: str = "short"):
+    cache = dict(memory_db._query_cache)
+    memory_db._query_cache.clear()
+    try:
+        return query_ids(memory_db, layer)
+    finally:
+        memory_db._query_cache.clear()
+        memory_db._query_cache.update(cache)
+
+
+def assert_cache_fresh(memory_db: MemoryDB, layer: str = "short"):
+    assert query_ids(memory_db, layer) == uncached_ids(memory_db, layer)
+
+
+def test_query_cache_hits_when_nothing_changed(memory_db):
+    add(memory_db, [1, 2, 3])
+    first = query_ids(memory_db)
+    assert query_ids(memory_db) == first
+    assert memory_db.stats.counters["query_cache_hit"] == 1
+
+
+def test_query_cache_follows_add_and_clean_up(memory_db):
+    add(memory_db, [1, 2])
+    assert sorted(query_ids(memory_db)) == [1, 2]
+
+    add(memory_db, [3], importance=1.0)
+    assert sorted(query_ids(memory_db)) == [1, 2, 3]
+    assert_cache_fresh(memory_db)
+
+    memory_db.clean_up(10.0, 0.5, "short")
+    assert sorted(query_ids(memory_db)) == [1, 2]
+    assert_cache_fresh(memory_db)
+
+
+def test_query_cache_follows_importance_and_decay(memory_db):
+    add(memory_db, [1, 2, 3])
+    before = query_ids(memory_db)
+
+    # push the last ranked record to the top
+    feedback(memory_db, before[-1], 1, step=1000.0)
+    after = query_ids(memory_db)
+    assert after[0] == before[-1]
+    assert_cache_fresh(memory_db)
+    assert memory_db.stats.counters["query_cache_rescore"] >= 1
+
+    memory_db.decay(ImportanceDecay(0.5), RecencyDecay(2.0), "short")
+    assert_cache_fresh(memory_db)
+
+
+def test_query_cache_follows_flow_and_consolidate(memory_db):
+    add(memory_db, [1, 2])
+    add(memory_db, [3], importance=80.0)
+    add(memory_db, [4], layer="mid", importance=80.0)
+    assert sorted(query_ids(memory_db)) == [1, 2, 3]
+    assert query_ids(memory_db, "mid") == [4]
+
+    memory_db.memory_flow(
+        {
+            "short": {"upper": 70.0},
+            "mid": {"upper": 1000.0, "lower": 0.0},
+            "long": {"lower": 0.0},
+        },
+        ConstantRecencyInitialization(),
+        ConstantRecencyInitialization(),
+    )
+    assert sorted(query_ids(memory_db)) == [1, 2]
+    assert sorted(query_ids(memory_db, "mid")) == [3, 4]
+    assert_cache_fresh(memory_db)
+    assert_cache_fresh(memory_db, "mid")
+
+    add(memory_db, [5], text="memory number 1 about AAPL")
+    assert sorted(query_ids(memory_db)) == [1, 2, 5]
+    assert memory_db.consolidate("short", similarity_threshold=0.99) == 1
+    assert len(query_ids(memory_db)) == 2
+    assert_cache_fresh(memory_db)
@@ -0,0 +1,45 @@
+"""
+News near-duplicate filter: peeking at the next day must agree with the real
+call without recording anything.
+"""
+
+from datetime import date
+
+from src.news_dedup import NewsDeduplicator
+
+STORY = "Apple shares rose after the company reported record iPhone sales in the quarter"
+
+
+def test_peek_matches_call_and_records_nothing():
+    dedup = NewsDeduplicator({"window_days": 1})
+    dedup("AAPL", date(2024, 1, 1), [STORY])
+
+    next_day = [
+        STORY + ".",
+        "Apple announced a new board member on Tuesday morning",
+        "Apple announced a new board member on Tuesday morning.",
+    ]
+    peeked = dedup.peek("AAPL", date(2024, 1, 2), next_day)
+    assert peeked == [next_day[1]]
+    assert dedup.num_seen == 1
+    assert dedup("AAPL", date(2024, 1, 2), next_day) == peeked
+
+    # outside the window the old story no longer counts
+    assert dedup.peek("AAPL", date(2024, 1, 5), [STORY]) == [STORY]
+
+
+def test_checkpoint_round_trip(tmp_path):
+    dedup = NewsDeduplicator({"window_days": 3})
+    dedup("AAPL", date(2024, 1, 1), [STORY])
+    dedup("TSLA", date(2024, 1, 2), ["Tesla deliveries beat estimates in the fourth quarter"])
+    dedup.save_checkpoint(str(tmp_path))
+
+    loaded = NewsDeduplicator.load_checkpoint(str(tmp_path))
+    assert loaded.num_seen == 2
+    # already seen before the resume, still dropped after it
+    assert loaded("AAPL", date(2024, 1, 3), [STORY + "."]) == []
+    assert dedup("AAPL", date(2024, 1, 3), [STORY + "."]) == []
+    new_story = ["Apple opens a new campus in Austin"]
+    assert loaded("AAPL", date(2024, 1, 3), new_story) == new_story
+    # entries are still evicted by date
+    assert loaded.peek("TSLA", date(2024, 1, 9), ["Tesla deliveries beat estimates in the fourth quarter"])
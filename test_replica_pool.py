@@ -0,0 +1,159 @@
+"""
+Replica pool routing, ejection and failover, no network: each replica's
+pooled transport talks to an httpx.MockTransport.
+"""
+
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+import httpx
+import pytest
+
+from src.replica_pool import ReplicaPool
+from src.transport import transport_registry
+
+REPLICAS = ["http://replica-a.test", "http://replica-b.test"]
+
+
+def make_pool(handler, pool_config=None, hedge_config=None) -> ReplicaPool:
+    pool = ReplicaPool(REPLICAS, pool_config or {}, {}, hedge_config)
+    for url in REPLICAS:
+        transport_registry._transports[url]._transport = httpx.MockTransport(handler)
+    return pool
+
+
+def by_host(responses):
+    hits: Counter = Counter()
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        hits[request.url.host] += 1
+        response = responses[request.url.host]
+        if isinstance(response, Exception):
+            raise response
+        return httpx.Response(response)
+
+    return handler, hits
+
+
+def test_pick_least_outstanding():
+    pool = make_pool(lambda request: httpx.Response(200))
+    try:
+        first = pool.pick([])
+        second = pool.pick([])
+        assert {first.url, second.url} == set(REPLICAS)
+        # first finishes, it has fewer requests in flight now
+        pool.release(first, True)
+        assert pool.pick([]) is first
+    finally:
+        pool.close()
+
+
+def test_eject_and_readmit():
+    handler, hits = by_host({"replica-a.test": 503, "replica-b.test": 200})
+    pool = make_pool(handler, {"eject_after": 2, "eject_seconds": 0.2})
+    try:
+        for _ in range(6):
+            assert pool.post("/v1/chat/completions", json={}).status_code == 200
+        # a failed twice (no transport retries), then stopped getting traffic
+        assert hits["replica-a.test"] == 2
+        assert pool.to_dict()["replicas"]["http://replica-a.test"]["ejected"]
+        assert pool.to_dict()["failovers"] == 2
+
+        time.sleep(0.25)
+        pool.post("/v1/chat/completions", json={})
+        pool.post("/v1/chat/completions", json={})
+        # back in rotation, one more failure ejects it again
+        assert hits["replica-a.test"] == 3
+        replica_a = pool.to_dict()["replicas"]["http://replica-a.test"]
+        assert replica_a["ejections"] == 2
+        assert replica_a["ejected"]
+    finally:
+        pool.close()
+
+
+def test_failover_exhausted_returns_last_response():
+    handler, hits = by_host({"replica-a.test": 503, "replica-b.test": 503})
+    pool = make_pool(handler)
+    try:
+        assert pool.post("/v1/chat/completions", json={}).status_code == 503
+        assert hits == {"replica-a.test": 1, "replica-b.test": 1}
+    finally:
+        pool.close()
+
+
+def test_failover_exhausted_raises_connection_error():
+    handler, hits = by_host(
+        {
+            "replica-a.test": httpx.ConnectError("refused"),
+            "replica-b.test": httpx.ConnectError("refused"),
+        }
+    )
+    pool = make_pool(handler, {"max_failovers": 1})
+    try:
+        with pytest.raises(httpx.ConnectError):
+            pool.post("/v1/chat/completions", json={})
+        assert hits == {"replica-a.test": 1, "replica-b.test": 1}
+    finally:
+        pool.close()
+
+
+def delayed(responses):
+    """Handler answering each host with (status code, seconds to wait)."""
+    hits: Counter = Counter()
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        hits[request.url.host] += 1
+        status_code, seconds = responses[request.url.host]
+        time.sleep(seconds)
+        return httpx.Response(status_code, json={"host": request.url.host})
+
+    return handler, hits
+
+
+# hedge after 50ms until min_samples latencies are known
+HEDGE_CONFIG = {"initial_delay": 0.05, "min_samples": 1000}
+
+
+def test_hedge_wins_over_slow_primary():
+    handler, hits = delayed({"replica-a.test": (200, 0.5), "replica-b.test": (200, 0.0)})
+    pool = make_pool(handler, hedge_config=HEDGE_CONFIG)
+    try:
+        response = pool.post("/v1/chat/completions", json={})
+        assert response.json()["host"] == "replica-b.test"
+        hedging = pool.to_dict()["hedging"]
+        assert (hedging["fired"], hedging["won"]) == (1, 1)
+    finally:
+        pool.close()
+
+
+def test_failed_hedge_waits_for_primary():
+    # the hedge finishes first but with an error, the slower primary must win
+    handler, hits = delayed({"replica-a.test": (200, 0.3), "replica-b.test": (503, 0.0)})
+    pool = make_pool(handler, hedge_config=HEDGE_CONFIG)
+    try:
+        response = pool.post("/v1/chat/completions", json={})
+        assert response.status_code == 200
+        assert response.json()["host"] == "replica-a.test"
+        hedging = pool.to_dict()["hedging"]
+        assert (hedging["fired"], hedging["won"]) == (1, 0)
+        # the hedge is a single attempt, it does not fail over on its own
+        assert hits == {"replica-a.test": 1, "replica-b.test": 1}
+    finally:
+        pool.close()
+
+
+def test_hedges_in_flight_are_bounded():
+    handler, hits = delayed({"replica-a.test": (200, 0.3), "replica-b.test": (200, 0.3)})
+    pool = make_pool(handler, hedge_config={**HEDGE_CONFIG, "max_in_flight": 1})
+    try:
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            responses = list(
+                executor.map(lambda _: pool.post("/v1/chat/completions", json={}), range(2))
+            )
+        assert all(response.status_code == 200 for response in responses)
+        hedging = pool.to_dict()["hedging"]
+        assert (hedging["fired"], hedging["skipped_over_budget"]) == (1, 1)
+        assert sum(hits.values()) == 3
+    finally:
+        pool.close()
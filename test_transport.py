@@ -0,0 +1,83 @@
+"""
+Pooled transport and rate limiter tests, no network: the pooled transport
+talks to an httpx.MockTransport.
+"""
+
+import time
+
+import httpx
+
+from src.embedding_unified import UnifiedOpenAIEmbedding
+from src.transport import transport_registry
+
+API_BASE = "http://llm.test/v1"
+
+
+def mock_pool(handler) -> None:
+    transport_registry._transports[API_BASE]._transport = httpx.MockTransport(handler)
+
+
+def test_chat_rate_limit_applies_when_embedding_created_the_pool():
+    def handler(request: httpx.Request) -> httpx.Response:
+        if request.url.path.endswith("/embeddings"):
+            return httpx.Response(
+                200,
+                json={
+                    "object": "list",
+                    "data": [{"object": "embedding", "index": 0, "embedding": [1.0, 0.0]}],
+                    "model": "test-embedding",
+                    "usage": {"prompt_tokens": 1, "total_tokens": 1},
+                },
+            )
+        return httpx.Response(200, json={"choices": []})
+
+    # the memory db builds the embedding client before the chat endpoint exists
+    embedding = UnifiedOpenAIEmbedding(
+        {"emb_model_name": "test-embedding", "emb_size": 2, "emb_http": {}}
+    )
+    chat_client = transport_registry.acquire(
+        API_BASE,
+        {
+            "rate_limit": {
+                "name": "test-chat",
+                "requests_per_minute": 600,
+                "burst_seconds": 0.1,
+            }
+        },
+    )
+    try:
+        mock_pool(handler)
+        embedding(["a"])
+        start = time.perf_counter()
+        for _ in range(4):
+            assert chat_client.post(f"{API_BASE}/chat/completions", json={}).status_code == 200
+        elapsed = time.perf_counter() - start
+
+        # 10 requests/s with a bucket of one: the last three wait 0.1s each
+        assert elapsed >= 0.25
+        rate_limits = transport_registry.stats()[API_BASE]["rate_limits"]
+        assert rate_limits["test-chat"]["acquired"] == 4
+    finally:
+        embedding.close()
+        transport_registry.release(API_BASE)
+    # both users released, the pool is closed
+    assert API_BASE not in transport_registry._transports
+
+
+def test_rate_limiter_pauses_on_429():
+    responses = [httpx.Response(429, headers={"Retry-After": "0.2"}), httpx.Response(200)]
+
+    client = transport_registry.acquire(
+        API_BASE,
+        {"max_retries": 1, "rate_limit": {"name": "test-429", "requests_per_minute": 6000}},
+    )
+    try:
+        mock_pool(lambda request: responses.pop(0))
+        start = time.perf_counter()
+        assert client.post(f"{API_BASE}/chat/completions", json={}).status_code == 200
+        assert time.perf_counter() - start >= 0.2
+        rate_limit = transport_registry.stats()[API_BASE]["rate_limits"]["test-429"]
+        assert rate_limit["throttled"] == 1
+        assert rate_limit["scale"] < 1.0
+    finally:
+        transport_registry.release(API_BASE)
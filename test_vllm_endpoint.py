@@ -0,0 +1,68 @@
+"""
+vLLM endpoint response caching, no network: the pooled transport talks to an
+httpx.MockTransport.
+"""
+
+import json
+
+import httpx
+
+from src.chat.endpoint.base import (
+    SingleAssetStructureGenerationFailure,
+    SingleAssetStructureOutputResponse,
+)
+from src.chat.endpoint.vllm import SingleAssetVLLMStructureGeneration
+from src.transport import transport_registry
+
+ENDPOINT = "http://vllm.test"
+
+
+def chat_config(cache_path: str):
+    return {
+        "chat_vllm_endpoint": ENDPOINT,
+        "chat_model": "test-llm",
+        "chat_max_new_token": 64,
+        "chat_model_type": "chat",
+        "chat_system_message": "You are a helpful assistant.",
+        "chat_request_timeout": 10,
+        "chat_parameters": {},
+        "chat_response_cache": {"path": cache_path},
+    }
+
+
+def test_only_validated_responses_are_cached(tmp_path):
+    contents = [
+        "not json",
+        json.dumps({"investment_decision": "buy", "summary_reason": "strong demand"}),
+    ]
+    calls = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        if request.url.path == "/health":
+            return httpx.Response(200)
+        calls.append(request)
+        content = contents[min(len(calls), len(contents)) - 1]
+        return httpx.Response(
+            200, json={"choices": [{"message": {"content": content}}], "usage": {}}
+        )
+
+    # create the pool first to put the mock under it before the health check
+    transport_registry.acquire(ENDPOINT)
+    transport_registry._transports[ENDPOINT]._transport = httpx.MockTransport(handler)
+    endpoint = SingleAssetVLLMStructureGeneration(chat_config(str(tmp_path)))
+    try:
+        schema = {"type": "object"}
+        # malformed generation: a failure, and not replayed on the next call
+        assert isinstance(endpoint("prompt", schema), SingleAssetStructureGenerationFailure)
+        assert endpoint.response_cache.writes == 0
+
+        assert isinstance(endpoint("prompt", schema), SingleAssetStructureOutputResponse)
+        assert endpoint.response_cache.writes == 1
+
+        # served from the cache, no request and no second write
+        assert isinstance(endpoint("prompt", schema), SingleAssetStructureOutputResponse)
+        assert len(calls) == 2
+        assert endpoint.response_cache.writes == 1
+    finally:
+        endpoint.close()
+        transport_registry.release(ENDPOINT)
@@ -0,0 +1,109 @@
+"""
+Record/replay cassettes: a recorded run is served back without the network,
+and requests that were never recorded are flagged.
+"""
+
+import httpx
+import numpy as np
+
+from src.cassette import Cassette, RecordingTransport, ReplayTransport
+from src.embedding_unified import UnifiedOpenAIEmbedding
+from src.transport import transport_registry
+
+API_BASE = "http://llm.test/v1"
+
+
+def counting_handler(calls):
+    def handler(request: httpx.Request) -> httpx.Response:
+        calls.append(request)
+        if request.url.path.endswith("/embeddings"):
+            return httpx.Response(
+                200,
+                json={
+                    "object": "list",
+                    "data": [{"object": "embedding", "index": 0, "embedding": [0.5, 0.25]}],
+                    "model": "test-embedding",
+                    "usage": {"prompt_tokens": 1, "total_tokens": 1},
+                },
+            )
+        return httpx.Response(200, json={"call": len(calls)})
+
+    return handler
+
+
+def record(path: str, handler, requests) -> list:
+    cassette = Cassette(path, mode="record")
+    with httpx.Client(transport=RecordingTransport(httpx.MockTransport(handler), cassette)) as client:
+        responses = [client.post(url, json=body).json() for url, body in requests]
+    assert cassette.num_recorded == len(requests)
+    return responses
+
+
+def test_record_then_replay(tmp_path):
+    path = str(tmp_path / "run.jsonl")
+    calls = []
+    chat = f"{API_BASE}/chat/completions"
+    recorded = record(
+        path,
+        counting_handler(calls),
+        [(chat, {"model": "m", "prompt": "a"}), (chat, {"model": "m", "prompt": "a"}), (chat, {"prompt": "b"})],
+    )
+    assert recorded == [{"call": 1}, {"call": 2}, {"call": 3}]
+
+    cassette = Cassette(path, mode="replay")
+    with httpx.Client(transport=ReplayTransport(cassette)) as client:
+        # JSON key order does not matter, identical requests replay in order
+        assert client.post(chat, json={"prompt": "a", "model": "m"}).json() == {"call": 1}
+        assert client.post(chat, json={"model": "m", "prompt": "a"}).json() == {"call": 2}
+        # exhausted: the last exchange is repeated
+        assert client.post(chat, json={"model": "m", "prompt": "a"}).json() == {"call": 2}
+        assert client.post(chat, json={"prompt": "b"}).json() == {"call": 3}
+    assert len(calls) == 3
+    assert cassette.to_dict()["replayed"] == 4
+    assert cassette.to_dict()["divergent"] == 0
+
+
+def test_replay_miss_is_flagged(tmp_path):
+    path = str(tmp_path / "run.jsonl")
+    chat = f"{API_BASE}/chat/completions"
+    record(path, counting_handler([]), [(chat, {"prompt": "a"})])
+
+    cassette = Cassette(path, mode="replay")
+    with httpx.Client(transport=ReplayTransport(cassette)) as client:
+        response = client.post(chat, json={"prompt": "changed"})
+    assert response.status_code == 404
+    stats = cassette.to_dict()
+    assert stats["divergent"] == 1
+    assert stats["divergent_samples"][0]["url"] == chat
+    assert '"changed"' in stats["divergent_samples"][0]["body"]
+    assert stats["unused_keys"] == 1
+
+
+def test_registry_replays_embeddings_offline(tmp_path):
+    path = str(tmp_path / "run.jsonl")
+    calls = []
+    handler = counting_handler(calls)
+    # record what the embedding client sends, then serve it back with no server
+    transport_registry.use_cassette(Cassette(path, mode="record"))
+    embedding = UnifiedOpenAIEmbedding({"emb_model_name": "test-embedding", "emb_size": 2})
+    try:
+        # under the recorder, swap the network for the mock
+        transport_registry._transports[API_BASE]._transport._transport = httpx.MockTransport(
+            handler
+        )
+        recorded = embedding(["news"])
+    finally:
+        embedding.close()
+        transport_registry.use_cassette(None)
+
+    transport_registry.use_cassette(Cassette(path, mode="replay"))
+    embedding = UnifiedOpenAIEmbedding({"emb_model_name": "test-embedding", "emb_size": 2})
+    try:
+        replayed = embedding(["news"])
+        cassette = transport_registry.cassette
+    finally:
+        embedding.close()
+        transport_registry.use_cassette(None)
+    np.testing.assert_array_equal(replayed, recorded)
+    assert len(calls) == 1
+    assert cassette.to_dict()["replayed"] == 1
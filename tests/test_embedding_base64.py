@@ -0,0 +1,63 @@
+"""
+Base64 embedding transport: float32 vectors decode bit-exactly into a
+contiguous array, no network.
+"""
+
+import base64
+import json
+
+import httpx
+import numpy as np
+
+from src.embedding_unified import UnifiedOpenAIEmbedding
+from src.transport import transport_registry
+
+API_BASE = "http://llm.test/v1"
+
+
+def encode(vector: np.ndarray) -> str:
+    return base64.b64encode(vector.astype("<f4").tobytes()).decode()
+
+
+def test_decode_embedding():
+    vector = np.array([0.1, -2.5, 1e-8, 3.4e38], dtype=np.float32)
+    decoded = UnifiedOpenAIEmbedding._decode_embedding(encode(vector))
+    assert decoded.dtype == np.float32
+    np.testing.assert_array_equal(decoded, vector)
+    # float lists from servers without base64 support
+    np.testing.assert_array_equal(
+        UnifiedOpenAIEmbedding._decode_embedding(vector.tolist()), vector
+    )
+
+
+def test_requests_base64_and_returns_float32_matrix():
+    vectors = np.random.default_rng(0).normal(size=(3, 8)).astype(np.float32)
+    requests = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(json.loads(request.content))
+        return httpx.Response(
+            200,
+            json={
+                "object": "list",
+                # out of order, the client sorts by index
+                "data": [
+                    {"object": "embedding", "index": i, "embedding": encode(vectors[i])}
+                    for i in (2, 0, 1)
+                ],
+                "model": "test-embedding",
+                "usage": {"prompt_tokens": 3, "total_tokens": 3},
+            },
+        )
+
+    embedding = UnifiedOpenAIEmbedding({"emb_model_name": "test-embedding", "emb_size": 8})
+    try:
+        embedding.encoding_format = "base64"
+        transport_registry._transports[API_BASE]._transport = httpx.MockTransport(handler)
+        result = embedding(["a", "b", "c"])
+    finally:
+        embedding.close()
+    assert requests[0]["encoding_format"] == "base64"
+    assert result.dtype == np.float32
+    assert result.flags["C_CONTIGUOUS"]
+    np.testing.assert_array_equal(result, vectors)
@@ -0,0 +1,106 @@
+"""
+OpenAI-compatible embedding client batching, no network: the pooled transport
+talks to an httpx.MockTransport.
+"""
+
+import json
+import threading
+import time
+
+import httpx
+import numpy as np
+import pytest
+
+from src.embedding_unified import UnifiedOpenAIEmbedding
+from src.transport import transport_registry
+from src.utils import estimate_tokens
+
+API_BASE = "http://llm.test/v1"
+
+
+def embedding_response(embeddings) -> httpx.Response:
+    return httpx.Response(
+        200,
+        json={
+            "object": "list",
+            "data": [
+                {"object": "embedding", "index": i, "embedding": e}
+                for i, e in enumerate(embeddings)
+            ],
+            "model": "test-embedding",
+            "usage": {"prompt_tokens": 1, "total_tokens": 1},
+        },
+    )
+
+
+@pytest.fixture
+def make_embedding():
+    created = []
+
+    def make(handler, max_concurrency=1):
+        embedding = UnifiedOpenAIEmbedding(
+            {
+                "emb_model_name": "test-embedding",
+                "emb_size": 2,
+                "embedding_max_concurrency": max_concurrency,
+            }
+        )
+        created.append(embedding)
+        transport_registry._transports[API_BASE]._transport = httpx.MockTransport(handler)
+        return embedding
+
+    yield make
+    for embedding in created:
+        embedding.close()
+
+
+def echo_handler(batches, delay=None):
+    """Embeds text "i" as [i, -i] (first 4 digits) and records every request's inputs."""
+    lock = threading.Lock()
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        texts = json.loads(request.content)["input"]
+        with lock:
+            batches.append(texts)
+        if delay is not None:
+            time.sleep(delay(texts))
+        return embedding_response([[float(t[:4]), -float(t[:4])] for t in texts])
+
+    return handler
+
+
+def test_batches_by_count_and_keeps_order(make_embedding):
+    batches = []
+    embedding = make_embedding(echo_handler(batches))
+    embedding.max_batch_size = 3
+    texts = [str(i) for i in range(8)]
+    result = embedding(texts)
+    assert [len(b) for b in batches] == [3, 3, 2]
+    assert result.dtype == np.float32
+    np.testing.assert_array_equal(result[:, 0], np.arange(8))
+
+
+def test_batches_by_estimated_tokens(make_embedding):
+    batches = []
+    embedding = make_embedding(echo_handler(batches))
+    texts = ["1" * 40, "2" * 40, "3", "4" * 200]
+    tokens = [estimate_tokens(t) for t in texts]
+    embedding.max_batch_tokens = tokens[0] + tokens[1] + tokens[2]
+    embedding(texts)
+    # the oversized last text goes alone rather than being dropped
+    assert batches == [texts[:3], texts[3:]]
+
+
+def test_concurrent_batches_keep_input_order(make_embedding):
+    batches = []
+    # earlier batches answer last
+    handler = echo_handler(batches, delay=lambda texts: 0.05 * (4 - int(texts[0]) // 2))
+    embedding = make_embedding(handler, max_concurrency=4)
+    embedding.max_batch_size = 2
+    start = time.perf_counter()
+    result = embedding([str(i) for i in range(8)])
+    # 0.5s one after another, the pool overlaps them
+    assert time.perf_counter() - start < 0.4
+    assert len(batches) == 4
+    np.testing.assert_array_equal(result[:, 0], np.arange(8))
+    np.testing.assert_array_equal(result[:, 1], -np.arange(8))
@@ -0,0 +1,86 @@
+"""
+Embedding projection fitting and persistence, on random embeddings.
+"""
+
+import numpy as np
+import pytest
+
+from src.embedding_projection import EmbeddingProjection
+
+
+def embeddings(num_rows: int, emb_size: int = 16) -> np.ndarray:
+    return np.random.default_rng(0).normal(size=(num_rows, emb_size)).astype(np.float32)
+
+
+def test_pca_on_small_corpus_is_bounded_by_rows():
+    corpus = embeddings(5)
+    projection = EmbeddingProjection.fit(corpus, method="pca", dim=5)
+    assert projection(corpus).shape == (5, 5)
+    with pytest.raises(ValueError, match="at most 5"):
+        EmbeddingProjection.fit(corpus, method="pca", dim=8)
+
+
+def test_dim_is_bounded_by_embedding_size():
+    corpus = embeddings(100)
+    for method in ("pca", "truncate"):
+        assert EmbeddingProjection.fit(corpus, method=method, dim=16)(corpus).shape == (100, 16)
+        with pytest.raises(ValueError, match="at most 16"):
+            EmbeddingProjection.fit(corpus, method=method, dim=32)
+
+
+def test_save_and_load(tmp_path):
+    corpus = embeddings(50)
+    projection = EmbeddingProjection.fit(corpus, method="pca", dim=4)
+    projection.save(str(tmp_path))
+    loaded = EmbeddingProjection.from_config(
+        {"method": "pca", "dim": 4, "path": str(tmp_path)}
+    )
+    np.testing.assert_allclose(loaded(corpus), projection(corpus))
+
+
+def test_checkpoint_keeps_its_own_projection(tmp_path):
+    from datetime import date
+
+    from src.memory_db import (
+        ConstantImportanceInitialization,
+        ConstantRecencyInitialization,
+        MemoryDB,
+    )
+
+    projection_dir = str(tmp_path / "projection")
+    EmbeddingProjection.fit(embeddings(20, 64), method="pca", dim=8).save(projection_dir)
+    emb_config = {
+        "emb_backend": "hashing",
+        "emb_model_name": "hashing-64",
+        "emb_size": 64,
+        "emb_projection": {"method": "pca", "dim": 8, "path": projection_dir},
+    }
+    memory_db = MemoryDB(
+        {"agent_name": "test-agent", "memory_db_config": {"memory_db_endpoint": ":memory:"}},
+        emb_config,
+    )
+    try:
+        memory_db.add_memory(
+            memory_input=[
+                {"id": 1, "symbol": "AAPL", "date": date(2024, 1, 1), "text": "record iPhone sales"}
+            ],
+            layer="short",
+            importance_init_func=ConstantImportanceInitialization(50.0),
+            recency_init_func=ConstantRecencyInitialization(),
+        )
+        memory_db.save_checkpoint(str(tmp_path / "checkpoint"))
+
+        # refit in place, the checkpoint must not pick this one up
+        EmbeddingProjection.fit(embeddings(30, 64) * 2, method="pca", dim=8).save(
+            projection_dir
+        )
+        loaded = MemoryDB.load_checkpoint(str(tmp_path / "checkpoint"))
+        try:
+            np.testing.assert_array_equal(
+                loaded.projection.components, memory_db.projection.components
+            )
+            assert loaded == memory_db
+        finally:
+            loaded.close()
+    finally:
+        memory_db.close()
@@ -0,0 +1,62 @@
+"""
+Filing chunker: section splitting, sentence overlap and the token budget.
+"""
+
+from src.filing_chunker import chunk_filing, split_sections
+from src.utils import estimate_tokens
+
+FILING = """# Item 1. Business
+We design phones.
+We sell services.
+
+# Item 7. Management's Discussion
+Revenue grew.
+"""
+
+
+def sentences(num: int) -> str:
+    return " ".join(f"Sentence number {i} talks about quarterly revenue." for i in range(num))
+
+
+def test_split_sections_at_headings():
+    assert split_sections(FILING) == [
+        "# Item 1. Business\nWe design phones.\nWe sell services.",
+        "# Item 7. Management's Discussion\nRevenue grew.",
+    ]
+    # small sections are packed together, large budgets keep one chunk
+    assert chunk_filing(FILING, max_chunk_tokens=512) == ["\n".join(split_sections(FILING))]
+    assert chunk_filing(FILING, max_chunk_tokens=16) == split_sections(FILING)
+
+
+def test_oversized_section_splits_at_sentences():
+    section = sentences(20)
+    chunks = chunk_filing(section, max_chunk_tokens=40)
+    assert len(chunks) > 1
+    assert all(estimate_tokens(c) <= 40 for c in chunks)
+    assert " ".join(chunks) == section
+    assert all(c.endswith(".") for c in chunks)
+
+
+def test_overlap_repeats_trailing_sentences():
+    section = sentences(20)
+    chunks = chunk_filing(section, max_chunk_tokens=40, overlap_tokens=15)
+    assert all(estimate_tokens(c) <= 40 for c in chunks)
+    for prev_chunk, cur_chunk in zip(chunks, chunks[1:]):
+        last_sentence = prev_chunk.split(". ")[-1]
+        assert cur_chunk.startswith(last_sentence)
+    # without overlap nothing repeats
+    chunks = chunk_filing(section, max_chunk_tokens=40)
+    assert sum(len(c) for c in chunks) + len(chunks) - 1 == len(section)
+
+
+def test_sentence_over_budget_is_hard_split():
+    table = "\n".join(f"| row {i} | 1,234 | 5,678 |" for i in range(50))
+    run_on = " ".join(["revenue"] * 300)
+    no_spaces = "x" * 1000
+    for text in (table, run_on, no_spaces):
+        chunks = chunk_filing(text, max_chunk_tokens=32)
+        assert len(chunks) > 1
+        assert all(estimate_tokens(c) <= 32 for c in chunks)
+        assert "".join(chunks).replace("\n", "").replace(" ", "") == text.replace(
+            "\n", ""
+        ).replace(" ", "")
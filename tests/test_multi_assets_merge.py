@@ -0,0 +1,79 @@
+"""
+Merging per-symbol structured responses of the multi-asset fan-out into one
+multi-asset response.
+"""
+
+from src.agent import FinMemAgent
+from src.chat.endpoint.base import (
+    MultiAssetsStructureGenerationFailure,
+    MultiAssetsStructureOutputResponse,
+)
+from src.portfolio import TradeAction
+
+merge = FinMemAgent._merge_multi_assets_responses
+
+
+def single_symbol_response(symbol: str, decision: TradeAction, ids, **others):
+    response = {
+        "investment_decision": {symbol: decision},
+        "summary_reason": {symbol: f"reason for {symbol}"},
+        "short_memory_ids": {symbol: ids},
+        "mid_memory_ids": {symbol: None},
+        "long_memory_ids": {},
+        "reflection_memory_ids": {},
+    }
+    for field, values in others.items():
+        response[field].update(values)
+    return MultiAssetsStructureOutputResponse(**response)
+
+
+def failure(symbol: str):
+    return MultiAssetsStructureGenerationFailure(investment_decision={symbol: TradeAction.HOLD})
+
+
+def test_merge_keeps_each_symbols_answer():
+    merged = merge(
+        {
+            "AAPL": single_symbol_response("AAPL", TradeAction.BUY, [1, 2]),
+            "TSLA": single_symbol_response("TSLA", TradeAction.SELL, [7]),
+        }
+    )
+    assert isinstance(merged, MultiAssetsStructureOutputResponse)
+    assert merged.investment_decision == {"AAPL": TradeAction.BUY, "TSLA": TradeAction.SELL}
+    assert merged.summary_reason == {"AAPL": "reason for AAPL", "TSLA": "reason for TSLA"}
+    assert merged.short_memory_ids == {"AAPL": [1, 2], "TSLA": [7]}
+    assert merged.mid_memory_ids == {"AAPL": None, "TSLA": None}
+    assert merged.long_memory_ids == {}
+
+
+def test_merge_ignores_other_symbols_in_a_response():
+    # a per-symbol request that also answered for another symbol
+    aapl = single_symbol_response(
+        "AAPL",
+        TradeAction.BUY,
+        [1],
+        investment_decision={"TSLA": TradeAction.BUY},
+        short_memory_ids={"TSLA": [99]},
+    )
+    merged = merge({"AAPL": aapl, "TSLA": single_symbol_response("TSLA", TradeAction.SELL, [7])})
+    assert merged.investment_decision["TSLA"] == TradeAction.SELL
+    assert merged.short_memory_ids["TSLA"] == [7]
+
+
+def test_failed_symbol_holds_and_cites_nothing():
+    merged = merge(
+        {
+            "AAPL": single_symbol_response("AAPL", TradeAction.BUY, [1]),
+            "TSLA": failure("TSLA"),
+        }
+    )
+    assert isinstance(merged, MultiAssetsStructureOutputResponse)
+    assert merged.investment_decision == {"AAPL": TradeAction.BUY, "TSLA": TradeAction.HOLD}
+    assert merged.summary_reason["TSLA"] == "Structure generation failure"
+    assert "TSLA" not in merged.short_memory_ids
+
+
+def test_all_failed_is_a_failure():
+    merged = merge({"AAPL": failure("AAPL"), "TSLA": failure("TSLA")})
+    assert isinstance(merged, MultiAssetsStructureGenerationFailure)
+    assert merged.investment_decision == {"AAPL": TradeAction.HOLD, "TSLA": TradeAction.HOLD}
@@ -0,0 +1,75 @@
+"""
+OpenAI-compatible endpoint response caching, no network: the pooled transport
+talks to an httpx.MockTransport.
+"""
+
+import json
+
+import httpx
+
+from src.chat.endpoint.base import SingleAssetStructureOutputResponse
+from src.chat.endpoint.openai_compatible import SingleAssetOpenAICompatibleGeneration
+from src.transport import transport_registry
+
+API_BASE = "http://llm.test/v1"
+
+
+def chat_config(cache_path: str):
+    return {
+        "chat_model": "test-llm",
+        "chat_max_new_token": 64,
+        "chat_response_cache": {"path": cache_path},
+    }
+
+
+def completion(content: str) -> httpx.Response:
+    return httpx.Response(
+        200,
+        json={
+            "id": "test",
+            "object": "chat.completion",
+            "created": 0,
+            "model": "test-llm",
+            "choices": [
+                {
+                    "index": 0,
+                    "finish_reason": "stop",
+                    "message": {"role": "assistant", "content": content},
+                }
+            ],
+        },
+    )
+
+
+def test_only_validated_responses_are_cached(tmp_path):
+    contents = [
+        # unparseable, answered with the fallback decision
+        "not json",
+        # parses, but the endpoint rejects it (no summary_reason)
+        json.dumps({"investment_decision": "buy"}),
+        json.dumps({"investment_decision": "buy", "summary_reason": "strong demand"}),
+    ]
+    calls = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        calls.append(request)
+        return completion(contents[min(len(calls), len(contents)) - 1])
+
+    endpoint = SingleAssetOpenAICompatibleGeneration(chat_config(str(tmp_path)))
+    try:
+        transport_registry._transports[API_BASE]._transport = httpx.MockTransport(handler)
+        endpoint("prompt", {})
+        endpoint("prompt", {})
+        assert endpoint.response_cache.writes == 0
+
+        response = endpoint("prompt", {})
+        assert isinstance(response, SingleAssetStructureOutputResponse)
+        assert response.summary_reason == "strong demand"
+        assert endpoint.response_cache.writes == 1
+
+        # served from the cache, no request and no second write
+        assert endpoint("prompt", {}) == response
+        assert len(calls) == 3
+        assert endpoint.response_cache.writes == 1
+    finally:
+        endpoint.close()
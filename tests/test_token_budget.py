@@ -0,0 +1,82 @@
+"""
+Prompt budget: water-filling across layers and per-memory truncation, with
+the byte heuristic tokenizer.
+"""
+
+from src.instrumentation import Instrumentation
+from src.token_budget import LAYERS, PromptBudget, TokenCounter
+from src.utils import estimate_tokens
+
+
+def make_budget(**budget_config) -> PromptBudget:
+    return PromptBudget({"tokenizer": "heuristic", **budget_config}, "test-llm")
+
+
+def memories(**layers):
+    queried = {}
+    for layer in LAYERS:
+        texts = layers.get(layer)
+        queried[f"{layer}_memory"] = texts
+        queried[f"{layer}_memory_id"] = list(range(len(texts))) if texts else None
+    return queried
+
+
+def test_heuristic_counter_truncates_within_limit():
+    counter = TokenCounter.load("heuristic", "test-llm")
+    text = "revenue " * 100
+    assert counter.count(text) == estimate_tokens(text)
+    assert counter.count(counter.truncate(text, 10)) <= 10
+
+
+def test_unused_share_goes_to_layers_that_need_more():
+    budget = make_budget(max_memory_tokens=100)
+    allocation = budget._allocate(100, {"short": 10, "mid": 200, "long": 200, "reflection": 0})
+    assert allocation == {"short": 10, "mid": 45, "long": 45, "reflection": 0}
+
+
+def test_rounding_leftover_is_handed_out():
+    budget = make_budget(max_memory_tokens=100)
+    demand = {layer: 100 for layer in LAYERS}
+    for total in (7, 11, 13, 99):
+        allocation = budget._allocate(total, demand)
+        assert sum(allocation.values()) == total
+    # the largest share takes the leftover
+    assert budget._allocate(7, demand) == {"short": 4, "mid": 1, "long": 1, "reflection": 1}
+    # never more than a layer needs
+    assert budget._allocate(50, {"short": 3, "mid": 4, "long": 0, "reflection": 0}) == {
+        "short": 3,
+        "mid": 4,
+        "long": 0,
+        "reflection": 0,
+    }
+
+
+def test_long_memories_are_truncated_per_item():
+    budget = make_budget(max_memory_tokens=1000, max_item_tokens=20, min_item_tokens=5)
+    stats = Instrumentation()
+    long_text = "x" * 400
+    fitted = budget(
+        {"AAPL": memories(short=[long_text, "short note"])}, stats
+    )["AAPL"]
+    assert fitted["short_memory_id"] == [0, 1]
+    assert estimate_tokens(fitted["short_memory"][0]) <= 20
+    assert fitted["short_memory"][1] == "short note"
+    assert stats.counters["prompt_budget_truncated"] == 1
+    assert stats.counters["prompt_budget_dropped"] == 0
+
+
+def test_memories_below_min_item_tokens_are_dropped():
+    budget = make_budget(max_memory_tokens=1000, max_item_tokens=100, min_item_tokens=10)
+    stats = Instrumentation()
+    texts = ["a" * 200, "b" * 200, "c"]
+    # 51 tokens each: the second memory would only get 9 tokens, below the minimum
+    kept_texts, kept_ids = budget._fit_layer(texts, [1, 2, 3], 60, stats)
+    assert kept_ids == [1]
+    assert kept_texts == [texts[0]]
+    # the lower-scored memory after it goes too, even though it would fit
+    assert stats.counters["prompt_budget_dropped"] == 2
+
+    # with enough left the crossing memory is truncated instead
+    kept_texts, kept_ids = budget._fit_layer(texts, [1, 2, 3], 70, stats)
+    assert kept_ids == [1, 2]
+    assert estimate_tokens(kept_texts[1]) <= 19